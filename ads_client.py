@@ -0,0 +1,183 @@
+"""
+Shared Google Ads client pool
+Keeps one GoogleAdsClient and KeywordPlanIdeaService per process so that the
+gRPC channel and OAuth access token are reused across Slack handler threads.
+The google-ads package (well over a thousand modules) is only imported when
+a client is first needed or warmed up, so the Slack apps start without it.
+"""
+
+import datetime
+import logging
+import os
+import threading
+import time
+from importlib import import_module
+
+import metrics
+from config import ADS_WARMUP, GOOGLE_ADS_API_VERSION, GOOGLE_ADS_CONFIG
+
+logger = logging.getLogger(__name__)
+
+# Refresh the access token this many seconds before it actually expires so a
+# call never goes out with a token that dies in flight.
+TOKEN_REFRESH_MARGIN = 60
+
+
+class AdsClientPool:
+    """Process-wide, fork-aware holder for the Google Ads client and services"""
+
+    def __init__(self, config=None):
+        self._config = config if config is not None else GOOGLE_ADS_CONFIG
+        self._lock = threading.Lock()
+        self._token_lock = threading.Lock()
+        self._pid = None
+        self._client = None
+        self._services = {}
+        # time.monotonic() until which the token needs no expiry check
+        self._token_fresh_until = 0.0
+        self._stats = {
+            'clients_built': 0,
+            'channels_built': 0,
+            'channel_reuses': 0,
+            'token_refreshes': 0,
+            'token_reuses': 0,
+        }
+
+    def _ensure_process(self):
+        """Drop anything inherited from a parent process (gunicorn fork)"""
+        pid = os.getpid()
+        if self._pid != pid:
+            if self._pid is not None:
+                logger.info(f"Process {pid} forked from {self._pid}; building a fresh Google Ads channel")
+            self._pid = pid
+            self._client = None
+            self._services = {}
+            self._token_fresh_until = 0.0
+
+    def get_client(self):
+        """Return the shared GoogleAdsClient, building it on first use"""
+        with self._lock:
+            self._ensure_process()
+            if self._client is None:
+                from google.ads.googleads.client import GoogleAdsClient
+                with metrics.timed('ads_client_build'):
+                    self._client = GoogleAdsClient.load_from_dict(self._config, version=GOOGLE_ADS_API_VERSION)
+                self._stats['clients_built'] += 1
+                # load_from_dict already exchanged the refresh token
+                self._stats['token_refreshes'] += 1
+            return self._client
+
+    def get_service(self, name="KeywordPlanIdeaService"):
+        """Return a shared service client (and its gRPC channel) by name"""
+        client = self.get_client()
+        with self._lock:
+            service = self._services.get(name)
+            if service is None:
+                service = client.get_service(name)
+                self._services[name] = service
+                self._stats['channels_built'] += 1
+            else:
+                self._stats['channel_reuses'] += 1
+            # Tokens last an hour; only look at the expiry once it draws near
+            token_fresh = time.monotonic() < self._token_fresh_until
+            if token_fresh:
+                self._stats['token_reuses'] += 1
+        if not token_fresh:
+            self.ensure_token()
+        return service
+
+    def ensure_token(self):
+        """Refresh the cached access token only when it is about to expire"""
+        credentials = self.get_client().credentials
+        with self._token_lock:
+            left = _token_seconds_left(credentials)
+            if left > 0:
+                self._stats['token_reuses'] += 1
+            else:
+                from google.auth.transport.requests import Request
+                with metrics.timed('ads_token_refresh'):
+                    credentials.refresh(Request())
+                self._stats['token_refreshes'] += 1
+                left = _token_seconds_left(credentials)
+            self._token_fresh_until = time.monotonic() + left
+
+    def _after_fork(self):
+        """Re-create locks in the child; a parent thread may have held them"""
+        self._lock = threading.Lock()
+        self._token_lock = threading.Lock()
+        self._ensure_process()
+
+    def reset(self):
+        """Forget the current client so the next call builds a new one"""
+        with self._lock:
+            self._client = None
+            self._services = {}
+            self._token_fresh_until = 0.0
+
+    def stats(self):
+        """Return a snapshot of build/reuse counters"""
+        with self._lock:
+            return dict(self._stats)
+
+
+def _token_seconds_left(credentials):
+    """Seconds until the token is due for a refresh (0 when it is due now)"""
+    if not credentials.token or credentials.expiry is None:
+        return 0
+    # google-auth stores expiry as a naive UTC datetime
+    now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+    return max(0, (credentials.expiry - now).total_seconds() - TOKEN_REFRESH_MARGIN)
+
+
+_pool = AdsClientPool()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_pool._after_fork)
+
+
+def get_client():
+    """Return the process-wide GoogleAdsClient"""
+    return _pool.get_client()
+
+
+def get_service(name="KeywordPlanIdeaService"):
+    """Return the process-wide service client for ``name``"""
+    return _pool.get_service(name)
+
+
+def import_google_ads(service="KeywordPlanIdeaService"):
+    """Import the Google Ads modules a lookup needs without building a client
+
+    Safe before a fork (no channel, no threads), so a preloading gunicorn
+    master can do it once and share the modules with every worker.
+    """
+    from google.ads.googleads import client, errors, util
+    from google.auth.transport import requests
+    # GoogleAdsClient.get_service imports the service module for this version
+    import_module(f"google.ads.googleads.{GOOGLE_ADS_API_VERSION}.services.services."
+                  f"{util.convert_upper_case_to_snake_case(service)}")
+
+
+def warm_up():
+    """Import google-ads, build the client and channel and fetch a token now"""
+    try:
+        with metrics.timed('ads_warmup'):
+            get_service()
+        logger.info("Google Ads client warmed up")
+    except Exception as e:
+        # The first lookup tries again and reports the error to the user
+        logger.warning(f"Google Ads warm-up failed: {str(e)}")
+
+
+def warm_up_in_background():
+    """Run warm_up on a daemon thread unless ADS_WARMUP is "off"; call after forking"""
+    if ADS_WARMUP == "off":
+        return None
+    thread = threading.Thread(target=warm_up, name="ads-warmup", daemon=True)
+    thread.start()
+    return thread
+
+
+def client_stats():
+    """Return channel and token reuse counters for the process-wide pool"""
+    return _pool.stats()
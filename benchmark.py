@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark for the Slack app
+Drives the app's /slack/events and /slack/command handlers with a mix of
+slash commands, mentions, DMs, multi-keyword and cluster requests while
+Google Ads and the Slack Web API are replaced by the local fakes in
+benchmark_fakes.py. Reports throughput, ack and time-to-result percentiles,
+per-stage means and peak memory, and saves each run as JSON so runs can be
+compared with --compare.
+"""
+
+import argparse
+import contextlib
+import io
+import itertools
+import json
+import logging
+import os
+import random
+import resource
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+# Request kinds and their default weights
+MIX = {'slash': 4, 'mention': 2, 'dm': 2, 'multi': 1, 'cluster': 1}
+
+# Headline numbers shown side by side by --compare
+COMPARED = [
+    ('throughput_rps', "Throughput (req/s)"),
+    ('ack_ms.p50', "Ack p50 (ms)"),
+    ('ack_ms.p99', "Ack p99 (ms)"),
+    ('result_ms.p50', "Result p50 (ms)"),
+    ('result_ms.p95', "Result p95 (ms)"),
+    ('result_ms.p99', "Result p99 (ms)"),
+    ('peak_rss_mb', "Peak RSS (MB)"),
+    ('errors', "Error replies"),
+    ('busy', "Busy replies"),
+    ('missing', "No result"),
+]
+
+
+def parse_mix(text):
+    """``'slash=4,mention=2'`` -> weights; kinds left out keep no weight"""
+    mix = {}
+    for part in text.split(','):
+        kind, _, weight = part.partition('=')
+        if kind.strip() not in MIX:
+            raise argparse.ArgumentTypeError(f"unknown request kind: {kind.strip()}")
+        mix[kind.strip()] = float(weight or 1)
+    return mix
+
+
+def vocabulary(size):
+    """Distinct keywords; popular ones first so the Zipf draw favours them"""
+    heads = ["villa", "apartment", "hotel", "office", "restaurant", "gym", "school", "clinic"]
+    places = ["dubai", "abu dhabi", "sharjah", "marina", "downtown", "jumeirah", "deira", "al ain"]
+    base = [f"{head} {place}" for place, head in itertools.product(places, heads)]
+    suffixes = itertools.chain([""], (f" {n}" for n in itertools.count(2)))
+    keywords = (f"{keyword}{suffix}" for suffix in suffixes for keyword in base)
+    return list(itertools.islice(keywords, size))
+
+
+class Workload:
+    """Deterministic stream of ``(kind, key, path, payload)`` requests"""
+
+    def __init__(self, keywords, mix, zipf, seed, response_url):
+        self.keywords = keywords
+        self.kinds = list(mix)
+        self.kind_weights = [mix[kind] for kind in self.kinds]
+        self.keyword_weights = [1 / (rank ** zipf) for rank in range(1, len(keywords) + 1)]
+        self.response_url = response_url
+        self._random = random.Random(seed)
+        self._seq = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def _pick(self, n=1):
+        return self._random.choices(self.keywords, self.keyword_weights, k=n)
+
+    def next(self):
+        with self._lock:
+            seq = next(self._seq)
+            kind = self._random.choices(self.kinds, self.kind_weights)[0]
+            keywords = self._pick(self._random.randint(2, 5) if kind in ('multi', 'cluster') else 1)
+        # One channel per request, so each result is matched to its request
+        key = f"C{seq:07d}"
+        text = ", ".join(keywords)
+        if kind == 'cluster':
+            text = f"cluster: {text}"
+        if kind in ('slash', 'multi', 'cluster'):
+            form = {'command': '/keyword-research', 'text': text, 'channel_id': key,
+                    'user_id': 'UBENCH', 'response_url': self.response_url(key)}
+            return kind, key, '/slack/command', form
+        event = {'type': 'app_mention', 'channel': key, 'user': 'UBENCH',
+                 'text': f"<@U0XXXXXXXX> {text}"}
+        if kind == 'dm':
+            event = {'type': 'message', 'channel_type': 'im', 'channel': key, 'user': 'UBENCH', 'text': text}
+        return kind, key, '/slack/events', {'type': 'event_callback', 'event_id': f"Ev{seq:07d}", 'event': event}
+
+
+def percentiles(values):
+    """p50/p95/p99/max (nearest rank) of ``values`` in milliseconds"""
+    if not values:
+        return {'count': 0, 'p50': None, 'p95': None, 'p99': None, 'max': None}
+    ordered = sorted(values)
+
+    def rank(p):
+        return round(ordered[min(len(ordered) - 1, max(0, int(len(ordered) * p + 0.5) - 1))] * 1000, 1)
+    return {'count': len(ordered), 'p50': rank(0.50), 'p95': rank(0.95), 'p99': rank(0.99),
+            'max': round(ordered[-1] * 1000, 1)}
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process (KiB on Linux, bytes on macOS)"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def configure_environment(args):
+    """Settings the app reads at import time; real persistence paths are never used"""
+    os.environ.setdefault('SLACK_BOT_TOKEN', 'xoxb-benchmark')
+    os.environ.setdefault('SLACK_SIGNING_SECRET', 'benchmark')
+    os.environ['RESEARCH_WORKERS'] = str(args.workers)
+    os.environ['RESEARCH_QUEUE_SIZE'] = str(args.queue_size)
+    os.environ['KEYWORD_LOOKUP_MODE'] = args.lookup_mode
+    for name in ('KEYWORD_STORE_PATH', 'EVENT_DEDUPE_PATH', 'METRICS_DIR'):
+        os.environ[name] = ''
+
+
+def load_app(name):
+    """Import the Flask module under test; returns the module"""
+    if name == 'legacy':
+        import slack_app as module
+    else:
+        import slack_app_manifest as module
+    return module
+
+
+def run(args):
+    """One benchmark run; returns the result dictionary that gets saved"""
+    configure_environment(args)
+    from slack_sdk import WebClient
+
+    import metrics
+    from benchmark_fakes import FakeIdeaService, FakeSlackServer, fake_google_ads, offline_client
+    from circuit_breaker import CircuitBreaker, set_breaker
+    from keyword_cache import get_cache
+    from quota_governor import QuotaGovernor, set_governor
+    from worker_pool import BUSY_MESSAGE
+
+    module = load_app(args.app)
+    logging.getLogger().setLevel(logging.ERROR)
+
+    slack = FakeSlackServer(latency=args.slack_latency).start()
+    module.outbox.client = WebClient(token='xoxb-benchmark', base_url=slack.api_url)
+    service = FakeIdeaService(offline_client(), latency=args.ads_latency, ideas=args.ideas,
+                              error_rate=args.error_rate, seed=args.seed)
+    # Quota pacing would dominate; it is benchmarked on its own terms elsewhere
+    set_governor(QuotaGovernor(rate=args.ads_rps, burst=max(1, int(args.ads_rps)), daily_budget=0))
+    set_breaker(CircuitBreaker())
+    get_cache().clear()
+
+    workload = Workload(vocabulary(args.vocabulary), args.mix, args.zipf, args.seed, slack.response_url)
+    baseline_rss = peak_rss_mb()
+    sent = {}
+    acks, statuses = [], {}
+    lock = threading.Lock()
+    remaining = itertools.count()
+
+    def client_loop():
+        client = module.app.test_client()
+        while next(remaining) < args.requests:
+            kind, key, path, payload = workload.next()
+            started = time.monotonic()
+            if path == '/slack/command':
+                response = client.post(path, data=payload)
+            else:
+                response = client.post(path, json=payload)
+            elapsed = time.monotonic() - started
+            body = response.get_json(silent=True) or {}
+            with lock:
+                acks.append(elapsed)
+                status = 'busy' if body.get('text') == BUSY_MESSAGE else str(response.status_code)
+                statuses[status] = statuses.get(status, 0) + 1
+                # A slash command refused in its HTTP response gets nothing more
+                if status == '200':
+                    sent[key] = (kind, started)
+            if args.think:
+                time.sleep(args.think)
+
+    threads = [threading.Thread(target=client_loop, name=f"bench-{i}") for i in range(args.concurrency)]
+    # The research path prints progress; keep it out of the report
+    with fake_google_ads(service), contextlib.redirect_stdout(io.StringIO()):
+        started = time.monotonic()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        missing = slack.wait_for(list(sent), args.drain_timeout)
+    slack.stop()
+
+    results, by_kind, errors, busy = [], {}, 0, statuses.get('busy', 0)
+    last_result = started
+    for key, (kind, sent_at) in sent.items():
+        arrival = slack.result_time(key)
+        if arrival is None:
+            continue
+        arrived_at, text = arrival
+        last_result = max(last_result, arrived_at)
+        if text == BUSY_MESSAGE:
+            busy += 1
+            continue
+        if "❌" in text:
+            errors += 1
+        results.append(arrived_at - sent_at)
+        by_kind.setdefault(kind, []).append(arrived_at - sent_at)
+
+    totals = metrics.totals()
+    stages = {}
+    for stage, values in sorted(totals['histograms'].items()):
+        count = sum(values[:-1])
+        stages[stage] = {'count': count, 'mean_ms': round(values[-1] / count * 1000, 2) if count else None}
+    return {
+        'label': args.label,
+        'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'config': {name: value for name, value in vars(args).items()
+                   if name not in ('compare', 'output_dir', 'label')},
+        'requests': len(acks),
+        'elapsed_s': round(last_result - started, 3),
+        'throughput_rps': round(len(results) / max(last_result - started, 1e-9), 2),
+        'ack_ms': percentiles(acks),
+        'result_ms': percentiles(results),
+        'result_ms_by_kind': {kind: percentiles(values) for kind, values in sorted(by_kind.items())},
+        'http_statuses': statuses,
+        'errors': errors,
+        'busy': busy,
+        'missing': len(missing),
+        'baseline_rss_mb': baseline_rss,
+        'peak_rss_mb': peak_rss_mb(),
+        'ads_calls': service.stats(),
+        'stages': stages,
+        'counters': totals['counters'],
+    }
+
+
+def _lookup(result, dotted):
+    for part in dotted.split('.'):
+        result = (result or {}).get(part)
+    return result
+
+
+def print_comparison(result, previous=None):
+    """Headline numbers, with deltas against ``previous`` when given"""
+    header = f"{'':<20}{'this run':>12}"
+    if previous:
+        header += f"{'previous':>12}{'change':>10}"
+    print(header)
+    for name, title in COMPARED:
+        value = _lookup(result, name)
+        line = f"{title:<20}{_fmt(value):>12}"
+        if previous:
+            before = _lookup(previous, name)
+            change = ''
+            if isinstance(value, (int, float)) and isinstance(before, (int, float)) and before:
+                change = f"{(value - before) / before:+.1%}"
+            line += f"{_fmt(before):>12}{change:>10}"
+        print(line)
+
+
+def print_report(result, previous=None):
+    """Human-readable summary, with deltas against ``previous`` when given"""
+    print(f"⏱️  {result['requests']} requests in {result['elapsed_s']}s "
+          f"({result['config']['app']} app, {result['config']['concurrency']} clients)")
+    print_comparison(result, previous)
+    print("\nPer-stage means:")
+    for stage, values in result['stages'].items():
+        print(f"  {stage:<18}{_fmt(values['mean_ms']):>10} ms  ({values['count']:,} samples)")
+
+
+def _fmt(value):
+    if value is None:
+        return '-'
+    return f"{value:,.1f}" if isinstance(value, float) else f"{value:,}"
+
+
+def save(result, directory):
+    """Write the result next to earlier runs; returns the path"""
+    os.makedirs(directory, exist_ok=True)
+    stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+    path = os.path.join(directory, f"{stamp}_{result['label']}.json")
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(result, f, indent=2)
+    return path
+
+
+def main():
+    """Command line interface for the offline benchmark"""
+    parser = argparse.ArgumentParser(description="Benchmark the Slack app against fake Google Ads and Slack")
+    parser.add_argument('--app', choices=['manifest', 'legacy'], default='manifest',
+                        help="slack_app_manifest.py or the older slack_app.py")
+    parser.add_argument('-n', '--requests', type=int, default=200, help="requests to send")
+    parser.add_argument('-c', '--concurrency', type=int, default=8, help="clients sending at once")
+    parser.add_argument('--think', type=float, default=0.0, help="seconds each client waits between requests")
+    parser.add_argument('--mix', type=parse_mix, default=MIX,
+                        help="request kinds and weights, e.g. slash=4,mention=2,dm=2,multi=1,cluster=1")
+    parser.add_argument('--vocabulary', type=int, default=500, help="distinct keywords to draw from")
+    parser.add_argument('--zipf', type=float, default=1.1, help="popularity skew of the keyword draw")
+    parser.add_argument('--ads-latency', type=float, default=0.3, help="mean fake Google Ads latency (s)")
+    parser.add_argument('--ideas', type=int, default=300, help="ideas per fake GenerateKeywordIdeas response")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="share of fake Google Ads calls that fail")
+    parser.add_argument('--ads-rps', type=float, default=1000.0, help="quota governor rate during the run")
+    parser.add_argument('--slack-latency', type=float, default=0.02, help="fake Slack API latency (s)")
+    parser.add_argument('--lookup-mode', choices=['historical', 'ideas'], default='historical',
+                        help="KEYWORD_LOOKUP_MODE for the run")
+    parser.add_argument('--workers', type=int, default=4, help="RESEARCH_WORKERS for the run")
+    parser.add_argument('--queue-size', type=int, default=100, help="RESEARCH_QUEUE_SIZE for the run")
+    parser.add_argument('--drain-timeout', type=float, default=120, help="seconds to wait for late results")
+    parser.add_argument('--seed', type=int, default=1, help="random seed for the workload and the fakes")
+    parser.add_argument('--label', default='run', help="name saved with the results")
+    parser.add_argument('--output-dir', default='benchmark_results', help="where results are saved")
+    parser.add_argument('--compare', metavar='RESULT_JSON', help="earlier result to show deltas against")
+    args = parser.parse_args()
+
+    previous = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            previous = json.load(f)
+
+    result = run(args)
+    print_report(result, previous)
+    print(f"\n💾 Saved to {save(result, args.output_dir)}")
+
+
+if __name__ == "__main__":
+    main()
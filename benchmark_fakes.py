@@ -0,0 +1,245 @@
+"""
+Local stand-ins for Google Ads and Slack
+FakeIdeaService answers KeywordPlanIdeaService calls with real protobuf
+messages after a configurable delay, failing a configurable share of them.
+FakeSlackServer is a small HTTP server speaking enough of the Slack Web API
+(chat.postMessage) and of slash-command response_urls to record when each
+message arrived. Used by benchmark.py, by replay.py and by gunicorn workers
+started with gunicorn.bench.conf.py; nothing here talks to the network
+beyond localhost.
+"""
+
+import json
+import logging
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+from google.ads.googleads.client import GoogleAdsClient
+
+import keyword_research
+from config import FAKE_GOOGLE_ADS_ERROR_RATE, FAKE_GOOGLE_ADS_IDEAS, FAKE_GOOGLE_ADS_LATENCY, GOOGLE_ADS_API_VERSION
+from keyword_result import raw
+
+logger = logging.getLogger(__name__)
+
+# Prefixes of the interim messages sent before results are ready
+ACK_PREFIXES = ("🔍 Researching", "🧩 Clustering")
+
+
+class FakeIdeaService:
+    """KeywordPlanIdeaService stand-in with settable latency, size and error rate
+
+    ``latency`` is the mean delay in seconds (each call varies by +/-50%),
+    ``ideas`` the number of ideas per response and ``error_rate`` the share of
+    calls that fail the way an unreachable Google Ads does.
+    """
+
+    def __init__(self, client, latency=0.3, ideas=300, error_rate=0.0, seed=1):
+        self.client = client
+        self.latency = latency
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.failures = 0
+        # Built once; responses reuse them around the seed keywords' own rows
+        self._filler = [self._idea(f"related idea {i}", 10 + (i * 7919) % 5000) for i in range(ideas)]
+
+    def _idea(self, text, searches):
+        idea = raw(self.client.get_type("GenerateKeywordIdeaResult"))
+        idea.text = text
+        self._fill_metrics(idea.keyword_idea_metrics, searches, 12)
+        return idea
+
+    def _fill_metrics(self, metrics, searches, months):
+        metrics.avg_monthly_searches = searches
+        metrics.competition = 2 + searches % 3
+        for offset in range(months):
+            volume = metrics.monthly_search_volumes.add()
+            volume.year = 2024 + (offset + 9) // 12
+            volume.month = 2 + (offset + 9) % 12
+            volume.monthly_searches = searches + offset
+
+    def _wait(self, timeout):
+        """Sleep like a remote call; raise like gRPC on timeout or failure"""
+        with self._lock:
+            self.calls += 1
+            delay = self.latency * self._random.uniform(0.5, 1.5)
+            fail = self._random.random() < self.error_rate
+            if fail:
+                self.failures += 1
+        if timeout is not None and delay > timeout:
+            time.sleep(max(0, timeout))
+            raise TimeoutError("fake Google Ads DEADLINE_EXCEEDED")
+        time.sleep(delay)
+        if fail:
+            raise ConnectionError("fake Google Ads UNAVAILABLE")
+
+    def _searches(self, keyword):
+        return 100 + sum(map(ord, keyword)) % 9900
+
+    def generate_keyword_ideas(self, request=None, timeout=None, **kwargs):
+        """One page of ideas; ``page_size`` and ``page_token`` work like the API's"""
+        self._wait(timeout)
+        request = raw(request)
+        seed_keywords = list(request.keyword_seed.keywords)
+        seeds = [self._idea(keyword, self._searches(keyword)) for keyword in seed_keywords]
+        # The seeds' own rows show up somewhere in the middle of the list,
+        # at the same place on every page of one request
+        position = sum(map(self._searches, seed_keywords)) % (len(self._filler) + 1)
+        ideas = self._filler[:position] + seeds + self._filler[position:]
+        start = int(request.page_token or 0)
+        end = start + request.page_size if request.page_size else len(ideas)
+        response = raw(self.client.get_type("GenerateKeywordIdeaResponse"))
+        response.results.extend(ideas[start:end])
+        if end < len(ideas):
+            response.next_page_token = str(end)
+        return response
+
+    def generate_keyword_historical_metrics(self, request=None, timeout=None, **kwargs):
+        self._wait(timeout)
+        response = raw(self.client.get_type("GenerateKeywordHistoricalMetricsResponse"))
+        for keyword in raw(request).keywords:
+            row = response.results.add()
+            row.text = keyword
+            self._fill_metrics(row.keyword_metrics, self._searches(keyword), 24)
+        return response
+
+    def stats(self):
+        with self._lock:
+            return {'calls': self.calls, 'failures': self.failures}
+
+
+def offline_client():
+    """A GoogleAdsClient that can build requests but holds no credentials"""
+    return GoogleAdsClient(credentials=None, developer_token="benchmark", use_proto_plus=True,
+                           version=GOOGLE_ADS_API_VERSION)
+
+
+def install_google_ads(service):
+    """Route keyword_research's Google Ads calls to ``service``; returns an undo function"""
+    originals = keyword_research.get_client, keyword_research.get_service
+    keyword_research.get_client = lambda: service.client
+    keyword_research.get_service = lambda name="KeywordPlanIdeaService": service
+
+    def restore():
+        keyword_research.get_client, keyword_research.get_service = originals
+    return restore
+
+
+@contextmanager
+def fake_google_ads(service):
+    """Route keyword_research's Google Ads calls to ``service`` inside the block"""
+    restore = install_google_ads(service)
+    try:
+        yield service
+    finally:
+        restore()
+
+
+def install_from_config():
+    """Serve Google Ads from a FakeIdeaService when FAKE_GOOGLE_ADS_LATENCY is set"""
+    if not FAKE_GOOGLE_ADS_LATENCY:
+        return None
+    service = FakeIdeaService(offline_client(), latency=float(FAKE_GOOGLE_ADS_LATENCY),
+                              ideas=FAKE_GOOGLE_ADS_IDEAS, error_rate=FAKE_GOOGLE_ADS_ERROR_RATE,
+                              seed=os.getpid())
+    install_google_ads(service)
+    logger.warning(f"Google Ads replaced by a local fake ({FAKE_GOOGLE_ADS_LATENCY}s latency, "
+                   f"{FAKE_GOOGLE_ADS_ERROR_RATE:.0%} errors); load testing only")
+    return service
+
+
+class FakeSlackServer:
+    """Localhost Slack Web API and response_url endpoint that records messages
+
+    Messages are keyed by channel (chat.postMessage) or by the last path
+    segment of a ``/response/<id>`` URL, each with its arrival time on the
+    ``time.monotonic()`` clock and its text.
+    """
+
+    def __init__(self, latency=0.0, host='127.0.0.1', port=0):
+        self.latency = latency
+        self._lock = threading.Lock()
+        self._arrived = threading.Condition(self._lock)
+        self.messages = {}
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length') or 0)).decode('utf-8')
+                if 'json' in (self.headers.get('Content-Type') or ''):
+                    payload = json.loads(body or '{}')
+                else:
+                    payload = {key: values[0] for key, values in parse_qs(body).items()}
+                if self.path.startswith('/response/'):
+                    key = self.path.rsplit('/', 1)[-1]
+                    reply = b'ok'
+                    content_type = 'text/plain'
+                else:
+                    key = payload.get('channel', '')
+                    reply = json.dumps({'ok': True, 'channel': key, 'ts': f"{time.time():.6f}"}).encode()
+                    content_type = 'application/json'
+                if server.latency:
+                    time.sleep(server.latency)
+                server.record(key, payload.get('text', ''))
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(reply)))
+                self.end_headers()
+                self.wfile.write(reply)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self.url = f"http://{host}:{self._server.server_address[1]}"
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, name="fake-slack", daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    @property
+    def api_url(self):
+        """base_url for slack_sdk's WebClient"""
+        return f"{self.url}/api/"
+
+    def response_url(self, key):
+        return f"{self.url}/response/{key}"
+
+    def record(self, key, text):
+        with self._arrived:
+            self.messages.setdefault(key, []).append((time.monotonic(), text))
+            self._arrived.notify_all()
+
+    def result_time(self, key):
+        """Arrival time of the first non-interim message for ``key``, or None"""
+        with self._lock:
+            for arrived_at, text in self.messages.get(key, ()):
+                if not text.startswith(ACK_PREFIXES):
+                    return arrived_at, text
+        return None
+
+    def wait_for(self, keys, timeout):
+        """Block until every key has a result message or ``timeout`` passes"""
+        deadline = time.monotonic() + timeout
+        with self._arrived:
+            while True:
+                missing = [key for key in keys
+                           if not any(not text.startswith(ACK_PREFIXES) for _, text in self.messages.get(key, ()))]
+                left = deadline - time.monotonic()
+                if not missing or left <= 0:
+                    return missing
+                self._arrived.wait(min(left, 0.5))
@@ -0,0 +1,204 @@
+"""
+Bulk keyword research
+Reads keywords from a file or stdin, researches them with a bounded number
+of lookups in flight (through the same cache, batcher and quota governor as
+the Slack bot) and streams each result to JSONL or CSV as soon as it lands.
+Keywords already answered in the output file are skipped, so an interrupted
+run picks up where it stopped.
+"""
+
+import contextlib
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import ALL_COMPLETED, FIRST_COMPLETED, wait
+
+from config import BULK_QUOTA_MAX_WAIT, BULK_WORKERS
+from keyword_cache import normalize_keyword
+from keyword_research import batch_stats, get_keyword_data_future
+from quota_governor import get_governor
+
+CSV_FIELDS = ['keyword', 'avg_monthly_searches', 'competition', 'exact_match',
+              'top_suggestion', 'top_suggestion_searches', 'error']
+
+# Print a progress line to stderr every this many results
+PROGRESS_EVERY = 500
+
+
+def read_keywords(lines):
+    """Yield distinct non-empty keywords from an iterable of lines"""
+    seen = set()
+    for line in lines:
+        keyword = line.strip()
+        normalized = normalize_keyword(keyword)
+        if normalized and normalized not in seen:
+            seen.add(normalized)
+            yield keyword
+
+
+def completed_keywords(path, fmt):
+    """Normalized keywords already answered without error in ``path``"""
+    done = set()
+    if path == '-' or not os.path.exists(path):
+        return done
+    with open(path, newline='', encoding='utf-8') as f:
+        if fmt == 'csv':
+            rows = csv.DictReader(f)
+        else:
+            rows = (_parse_json_line(line) for line in f)
+        for row in rows:
+            # A half-written last line from a crash is simply redone
+            if row and row.get('keyword') and not row.get('error'):
+                done.add(normalize_keyword(row['keyword']))
+    return done
+
+
+def drop_partial_line(path):
+    """Cut off a last line that a crash left without its newline
+
+    Appending after it would glue the next row onto it. Returns whether a
+    line was dropped.
+    """
+    if path == '-' or not os.path.exists(path):
+        return False
+    with open(path, 'rb+') as f:
+        end = position = f.seek(0, os.SEEK_END)
+        while position > 0:
+            step = min(4096, position)
+            f.seek(position - step)
+            chunk = f.read(step)
+            if position == end and chunk.endswith(b'\n'):
+                return False
+            newline = chunk.rfind(b'\n')
+            if newline != -1:
+                f.truncate(position - step + newline + 1)
+                return True
+            position -= step
+        f.truncate(0)
+        return end > 0
+
+
+def _parse_json_line(line):
+    try:
+        return json.loads(line)
+    except ValueError:
+        return None
+
+
+class ResultWriter:
+    """Append one row per keyword to a JSONL or CSV stream, flushing each"""
+
+    def __init__(self, stream, fmt, write_header):
+        self.stream = stream
+        self.fmt = fmt
+        self._csv = None
+        if fmt == 'csv':
+            self._csv = csv.DictWriter(stream, fieldnames=CSV_FIELDS)
+            if write_header:
+                self._csv.writeheader()
+
+    def write(self, keyword, data=None, error=None):
+        if self._csv is not None:
+            self._csv.writerow(_csv_row(keyword, data, error))
+        else:
+            row = {'keyword': keyword, 'result': data.to_dict() if data is not None else None,
+                   'error': str(error) if error is not None else None}
+            self.stream.write(json.dumps(row, separators=(',', ':')) + '\n')
+        self.stream.flush()
+
+
+def _csv_row(keyword, data, error):
+    row = {'keyword': keyword, 'error': str(error) if error is not None else ''}
+    if data:
+        row['exact_match'] = data.exact_match
+        row['avg_monthly_searches'] = data.avg_monthly_searches if data.exact_match else ''
+        row['competition'] = data.competition or ''
+        if data.suggestions:
+            row['top_suggestion'] = data.suggestions[0].keyword
+            row['top_suggestion_searches'] = data.suggestions[0].avg_monthly_searches
+    return row
+
+
+def run_bulk(lines, output='-', fmt='jsonl', workers=BULK_WORKERS, log=sys.stderr):
+    """Research every keyword in ``lines`` and stream results to ``output``
+
+    Returns the summary dictionary that is also printed to ``log``.
+    """
+    if drop_partial_line(output):
+        print(f"✂️ Dropped a half-written last line from {output}; it will be redone", file=log)
+    done = completed_keywords(output, fmt)
+    appending = output != '-' and os.path.exists(output) and os.path.getsize(output) > 0
+    governor = get_governor()
+    # A bulk run would rather wait for quota than fail its keywords; the
+    # governor is shared, so its own limit comes back when the run ends
+    max_wait = governor.max_wait
+    governor.max_wait = max(max_wait, BULK_QUOTA_MAX_WAIT)
+    calls_before = batch_stats()['batches']
+
+    try:
+        summary = {'submitted': 0, 'succeeded': 0, 'failed': 0, 'skipped': 0, 'stopped_early': False}
+        started = time.monotonic()
+        if output == '-':
+            out = contextlib.nullcontext(sys.stdout)
+        else:
+            out = open(output, 'a', newline='', encoding='utf-8')
+        # The research code narrates every call on stdout; keep that out of the results
+        with out as stream, contextlib.redirect_stdout(log):
+            writer = ResultWriter(stream, fmt, write_header=not appending)
+            pending = {}
+
+            def drain(return_when):
+                finished, _ = wait(pending, return_when=return_when)
+                for future in finished:
+                    keyword = pending.pop(future)
+                    error = future.exception()
+                    if error is None:
+                        writer.write(keyword, future.result())
+                        summary['succeeded'] += 1
+                    else:
+                        writer.write(keyword, error=error)
+                        summary['failed'] += 1
+                    finished_count = summary['succeeded'] + summary['failed']
+                    if finished_count % PROGRESS_EVERY == 0:
+                        rate = finished_count / max(time.monotonic() - started, 1e-9)
+                        print(f"… {finished_count} done ({rate:.1f}/s)", file=log)
+
+            for keyword in read_keywords(lines):
+                if normalize_keyword(keyword) in done:
+                    summary['skipped'] += 1
+                    continue
+                if governor.remaining_today() == 0:
+                    # Everything else would fail; resume this run tomorrow
+                    summary['stopped_early'] = True
+                    break
+                while len(pending) >= workers:
+                    drain(FIRST_COMPLETED)
+                pending[get_keyword_data_future(keyword)] = keyword
+                summary['submitted'] += 1
+            if pending:
+                drain(ALL_COMPLETED)
+    finally:
+        governor.max_wait = max_wait
+
+    elapsed = time.monotonic() - started
+    summary['elapsed_seconds'] = round(elapsed, 2)
+    summary['keywords_per_second'] = round(summary['submitted'] / elapsed, 2) if elapsed else 0
+    summary['api_batches'] = batch_stats()['batches'] - calls_before
+    summary['error_rate'] = round(summary['failed'] / summary['submitted'], 4) if summary['submitted'] else 0
+    summary['quota_remaining_today'] = governor.remaining_today()
+    print_summary(summary, log)
+    return summary
+
+
+def print_summary(summary, log=sys.stderr):
+    """Print throughput and error counts for a finished run"""
+    print(f"\n📊 Researched {summary['submitted']} keyword(s) in {summary['elapsed_seconds']}s "
+          f"({summary['keywords_per_second']}/s, {summary['api_batches']} API batch(es))", file=log)
+    print(f"✅ {summary['succeeded']} succeeded, ❌ {summary['failed']} failed "
+          f"({summary['error_rate']:.1%}), ⏭️ {summary['skipped']} already in the output", file=log)
+    if summary['quota_remaining_today'] is not None:
+        print(f"📉 Google Ads budget left today: {summary['quota_remaining_today']}", file=log)
+    if summary['stopped_early']:
+        print("⏹️ Daily budget used up; run the same command again tomorrow to resume", file=log)
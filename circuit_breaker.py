@@ -0,0 +1,178 @@
+"""
+Circuit breaker for Google Ads calls
+After repeated upstream failures the breaker opens and calls fail at once
+(callers may serve stale results instead) rather than tying up a worker
+thread each. After a cool-down one probe call is let through; its outcome
+closes the breaker again or re-opens it.
+"""
+
+import logging
+import os
+import threading
+import time
+
+import metrics
+from config import BREAKER_FAILURE_THRESHOLD, BREAKER_RESET_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+# gRPC status codes that mean Google Ads itself is unhealthy or too slow;
+# quota errors are left to the quota governor
+UPSTREAM_FAILURE_CODES = ('DEADLINE_EXCEEDED', 'UNAVAILABLE', 'INTERNAL', 'UNKNOWN')
+
+
+class CircuitOpen(Exception):
+    """Raised instead of calling Google Ads while the breaker is open"""
+
+
+class CircuitBreaker:
+    """Thread-safe closed / open / half-open breaker"""
+
+    def __init__(self, failure_threshold=BREAKER_FAILURE_THRESHOLD,
+                 reset_timeout=BREAKER_RESET_TIMEOUT, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._stats = {
+            'successes': 0,
+            'failures': 0,
+            'opened': 0,
+            'rejected': 0,
+            'probes': 0,
+        }
+
+    def call(self, fn, *args, **kwargs):
+        """Run ``fn`` if the breaker allows it and record the outcome"""
+        self.allow()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            if is_upstream_failure(e):
+                self.record_failure()
+            else:
+                self._end_probe()
+            raise
+        self.record_success()
+        return result
+
+    def allow(self):
+        """Raise CircuitOpen unless a call may go out now"""
+        with self._lock:
+            if self._state == OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+                self._state = HALF_OPEN
+            if self._state == CLOSED:
+                return
+            if self._state == HALF_OPEN and not self._probing:
+                self._probing = True
+                self._stats['probes'] += 1
+                logger.info("Google Ads circuit half-open; sending a probe request")
+                return
+            self._stats['rejected'] += 1
+            metrics.inc('ads_breaker_rejected')
+            error = self._open_error()
+        raise error
+
+    def is_open(self):
+        """Whether calls would be refused right now (no state change)"""
+        with self._lock:
+            if self._state == OPEN:
+                return self._clock() - self._opened_at < self.reset_timeout
+            return self._state == HALF_OPEN and self._probing
+
+    def reject(self):
+        """Count a call refused before it was queued and return its error"""
+        with self._lock:
+            self._stats['rejected'] += 1
+            metrics.inc('ads_breaker_rejected')
+            return self._open_error()
+
+    def _open_error(self):
+        retry_in = max(0, self.reset_timeout - (self._clock() - self._opened_at))
+        return CircuitOpen(f"Google Ads is failing; not retrying for another {retry_in:.0f}s")
+
+    def record_success(self):
+        with self._lock:
+            if self._state != CLOSED:
+                logger.info("Google Ads circuit closed again")
+            self._state = CLOSED
+            self._failures = 0
+            self._probing = False
+            self._stats['successes'] += 1
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._stats['failures'] += 1
+            metrics.inc('ads_failures')
+            if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != OPEN:
+                    self._stats['opened'] += 1
+                    metrics.inc('ads_breaker_opened')
+                    logger.warning(f"Google Ads circuit opened after {self._failures} failure(s)")
+                self._state = OPEN
+                self._opened_at = self._clock()
+            self._probing = False
+
+    def _end_probe(self):
+        """A call failed for a reason that says nothing about upstream health"""
+        with self._lock:
+            self._probing = False
+
+    def _after_fork(self):
+        """Re-create the lock in the child; a parent thread may have held it"""
+        self._lock = threading.Lock()
+        self._probing = False
+
+    def stats(self):
+        """Return state and counters"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['state'] = self._state
+            stats['consecutive_failures'] = self._failures
+        return stats
+
+
+def is_upstream_failure(error):
+    """Whether ``error`` says Google Ads is unavailable or too slow"""
+    call = getattr(error, 'error', error)
+    code = getattr(call, 'code', None)
+    if callable(code):
+        try:
+            name = getattr(code(), 'name', None)
+        except Exception:
+            name = None
+        if name is not None:
+            return name in UPSTREAM_FAILURE_CODES
+    # Transport errors (connection resets, token endpoint outages) carry no code
+    return isinstance(error, (ConnectionError, TimeoutError, OSError))
+
+
+_breaker = CircuitBreaker()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_breaker._after_fork)
+
+
+def get_breaker():
+    """Return the process-wide Google Ads circuit breaker"""
+    return _breaker
+
+
+def set_breaker(breaker):
+    """Replace the process-wide breaker, e.g. to start a benchmark run closed"""
+    global _breaker
+    _breaker = breaker
+
+
+def breaker_stats():
+    """Return state and counters for the process-wide breaker"""
+    return _breaker.stats()
@@ -21,6 +21,11 @@ GOOGLE_ADS_CONFIG = {
     "use_proto_plus": True
 }
 
+# Google Ads API version the client and the preloaded service modules use.
+# Pinned here rather than taken from the google-ads release; keep it one the
+# installed google-ads ships (google/ads/googleads/vNN)
+GOOGLE_ADS_API_VERSION = os.getenv("GOOGLE_ADS_API_VERSION", "v21")
+
 # OAuth2 Configuration for refresh token generation
 OAUTH_CONFIG = {
     "client_id": os.getenv("GOOGLE_ADS_CLIENT_ID"),
@@ -35,3 +40,108 @@ LANGUAGE_CODE = "languageConstants/1000"  # English
 LOCATION_CODE = "geoTargetConstants/2840"  # United Arab Emirates
 NETWORK_TYPE = "GOOGLE_SEARCH"
 SCOPES = ["https://www.googleapis.com/auth/adwords"]
+
+# Result cache for get_keyword_data
+CACHE_TTL_SECONDS = int(os.getenv("KEYWORD_CACHE_TTL", "21600"))  # 6 hours fresh
+CACHE_STALE_SECONDS = int(os.getenv("KEYWORD_CACHE_STALE_TTL", "86400"))  # served stale while refreshing
+CACHE_MAX_ENTRIES = int(os.getenv("KEYWORD_CACHE_MAX_ENTRIES", "1000"))
+
+# Micro-batching of seed keywords into one GenerateKeywordIdeas request
+BATCH_WINDOW_SECONDS = float(os.getenv("KEYWORD_BATCH_WINDOW", "0.1"))
+BATCH_MAX_SEEDS = int(os.getenv("KEYWORD_BATCH_MAX_SEEDS", "20"))  # API accepts up to 20 seeds
+BATCH_MAX_CONCURRENCY = int(os.getenv("KEYWORD_BATCH_CONCURRENCY", "4"))
+
+# "historical" asks for the exact phrase's metrics first and only generates
+# ideas when suggestions are needed; "ideas" always generates keyword ideas
+KEYWORD_LOOKUP_MODE = os.getenv("KEYWORD_LOOKUP_MODE", "historical")
+
+# Keyword idea scanning
+SUGGESTION_COUNT = int(os.getenv("KEYWORD_SUGGESTION_COUNT", "5"))
+IDEAS_SCAN_LIMIT = int(os.getenv("KEYWORD_IDEAS_SCAN_LIMIT", "2000"))  # stop reading (and requesting) pages after this many ideas
+IDEAS_PAGE_SIZE = int(os.getenv("KEYWORD_IDEAS_PAGE_SIZE", "0"))  # 0 keeps the API default; each page is its own quota-governed request
+
+# Research worker pool shared by the Slack handlers
+RESEARCH_WORKERS = int(os.getenv("RESEARCH_WORKERS", "4"))
+RESEARCH_QUEUE_SIZE = int(os.getenv("RESEARCH_QUEUE_SIZE", "100"))
+RESEARCH_OVERLOAD_POLICY = os.getenv("RESEARCH_OVERLOAD_POLICY", "reject")  # "reject" or "shed_oldest"
+
+# Slack event retry de-duplication
+EVENT_DEDUPE_TTL = int(os.getenv("EVENT_DEDUPE_TTL", "900"))  # Slack retries within a few minutes
+EVENT_DEDUPE_MAX_ENTRIES = int(os.getenv("EVENT_DEDUPE_MAX_ENTRIES", "10000"))
+EVENT_DEDUPE_PATH = os.getenv("EVENT_DEDUPE_PATH", "")  # SQLite file shared by workers; empty keeps it in memory
+
+# Outbound Slack message queue
+SLACK_OUTBOX_WORKERS = int(os.getenv("SLACK_OUTBOX_WORKERS", "2"))
+SLACK_CHANNEL_RATE = float(os.getenv("SLACK_CHANNEL_RATE", "1.0"))  # messages per second per channel
+SLACK_CHANNEL_BURST = int(os.getenv("SLACK_CHANNEL_BURST", "3"))
+SLACK_OUTBOX_MAX_ATTEMPTS = int(os.getenv("SLACK_OUTBOX_MAX_ATTEMPTS", "5"))
+
+# Serving mode: "sync" (Flask, slack_app_manifest) or "async" (aiohttp, slack_app_async);
+# gunicorn.conf.py reads it to pick the entry point and worker class
+SERVING_MODE = os.getenv("SERVING_MODE", "sync")
+ASYNC_MAX_IN_FLIGHT = int(os.getenv("ASYNC_MAX_IN_FLIGHT", "5000"))
+
+# Persistent on-disk result store shared by workers (SQLite); empty path disables it
+KEYWORD_STORE_PATH = os.getenv("KEYWORD_STORE_PATH", "")
+KEYWORD_STORE_TTL = int(os.getenv("KEYWORD_STORE_TTL", "86400"))  # served without calling the API
+KEYWORD_STORE_MAX_AGE = int(os.getenv("KEYWORD_STORE_MAX_AGE", "2592000"))  # removed by compaction
+KEYWORD_STORE_MAX_ENTRIES = int(os.getenv("KEYWORD_STORE_MAX_ENTRIES", "50000"))
+
+# Google Ads quota governor (limits apply per worker process)
+ADS_QUOTA_RPS = float(os.getenv("ADS_QUOTA_RPS", "1.0"))  # KeywordPlanIdeaService requests per second
+ADS_QUOTA_BURST = int(os.getenv("ADS_QUOTA_BURST", "2"))
+ADS_DAILY_BUDGET = int(os.getenv("ADS_DAILY_BUDGET", "15000"))  # requests per UTC day; 0 disables the budget
+ADS_QUOTA_MAX_WAIT = float(os.getenv("ADS_QUOTA_MAX_WAIT", "30"))  # seconds a call may queue before failing
+ADS_QUOTA_MAX_RETRIES = int(os.getenv("ADS_QUOTA_MAX_RETRIES", "3"))  # retries after RESOURCE_EXHAUSTED
+ADS_BACKOFF_BASE = float(os.getenv("ADS_BACKOFF_BASE", "2.0"))
+ADS_BACKOFF_MAX = float(os.getenv("ADS_BACKOFF_MAX", "60"))
+
+# Request deadlines by Slack entry point (seconds from when the request arrives)
+DEADLINE_SLASH_COMMAND = float(os.getenv("DEADLINE_SLASH_COMMAND", "10"))
+DEADLINE_APP_MENTION = float(os.getenv("DEADLINE_APP_MENTION", "30"))
+DEADLINE_DIRECT_MESSAGE = float(os.getenv("DEADLINE_DIRECT_MESSAGE", "60"))
+ADS_CALL_TIMEOUT = float(os.getenv("ADS_CALL_TIMEOUT", "60"))  # cap on any single Google Ads call
+
+# Circuit breaker in front of Google Ads
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))  # consecutive failures
+BREAKER_RESET_TIMEOUT = float(os.getenv("BREAKER_RESET_TIMEOUT", "30"))  # seconds before a probe
+
+# Keywords accepted in one Slack request (comma- or newline-separated)
+MAX_KEYWORDS_PER_REQUEST = int(os.getenv("MAX_KEYWORDS_PER_REQUEST", "20"))
+
+# Bulk command line runs (python keyword_research.py --input keywords.txt)
+BULK_WORKERS = int(os.getenv("BULK_WORKERS", "40"))  # lookups in flight; two full batches by default
+BULK_QUOTA_MAX_WAIT = float(os.getenv("BULK_QUOTA_MAX_WAIT", "600"))  # bulk runs wait longer for quota
+
+# Related-keyword expansion crawler (keyword_expansion.py)
+EXPAND_MAX_DEPTH = int(os.getenv("EXPAND_MAX_DEPTH", "2"))
+EXPAND_MAX_KEYWORDS = int(os.getenv("EXPAND_MAX_KEYWORDS", "10000"))
+EXPAND_MAX_API_CALLS = int(os.getenv("EXPAND_MAX_API_CALLS", "100"))
+EXPAND_MIN_SEARCHES = int(os.getenv("EXPAND_MIN_SEARCHES", "0"))  # ideas below this volume are not followed
+EXPAND_MAX_SECONDS = float(os.getenv("EXPAND_MAX_SECONDS", "0"))  # 0 means no time limit
+
+# Keyword idea clustering (MinHash + LSH over word and character 3-gram shingles)
+CLUSTER_SIMILARITY = float(os.getenv("CLUSTER_SIMILARITY", "0.5"))  # estimated Jaccard needed to merge
+CLUSTER_PERMUTATIONS = int(os.getenv("CLUSTER_PERMUTATIONS", "64"))
+CLUSTER_BANDS = int(os.getenv("CLUSTER_BANDS", "16"))  # more bands find more candidates
+CLUSTER_SLACK_TOP = int(os.getenv("CLUSTER_SLACK_TOP", "8"))  # clusters shown in a Slack reply
+
+# Startup
+ADS_WARMUP = os.getenv("ADS_WARMUP", "background")  # "background" builds the Google Ads client once a worker starts; "off" waits for the first lookup
+
+# Metrics (/metrics, Prometheus text format)
+METRICS_DIR = os.getenv("METRICS_DIR", "")  # shared by gunicorn workers so /metrics covers them all
+METRICS_FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL", "10"))  # seconds between worker snapshots
+
+# Load testing (see replay.py)
+SLACK_API_BASE_URL = os.getenv("SLACK_API_BASE_URL", "https://slack.com/api/")  # point at a fake Slack to load test
+FAKE_GOOGLE_ADS_LATENCY = os.getenv("FAKE_GOOGLE_ADS_LATENCY", "")  # mean seconds; set only to load test against a fake Google Ads
+FAKE_GOOGLE_ADS_IDEAS = int(os.getenv("FAKE_GOOGLE_ADS_IDEAS", "300"))  # ideas per fake response
+FAKE_GOOGLE_ADS_ERROR_RATE = float(os.getenv("FAKE_GOOGLE_ADS_ERROR_RATE", "0"))  # share of fake calls that fail
+
+# Profiling of individual research jobs (see request_profiler.py)
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))  # share of jobs profiled from the start
+PROFILE_SLOW_SECONDS = float(os.getenv("PROFILE_SLOW_SECONDS", "0"))  # sample stacks of jobs running longer; 0 disables
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.01"))  # seconds between stack samples
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "200"))  # newest profile files kept in PROFILE_DIR
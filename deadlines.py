@@ -0,0 +1,50 @@
+"""
+Request deadlines
+A deadline is an absolute ``time.monotonic()`` value fixed where a Slack
+request enters the app and carried down to the Google Ads call, so work for
+a request that can no longer be answered in time is cut short. ``None``
+means no deadline.
+"""
+
+import time
+from concurrent.futures import TimeoutError as FutureTimeout
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a request's deadline passes before its lookup finished"""
+
+
+def deadline_after(seconds):
+    """Return the deadline ``seconds`` from now (None for no deadline)"""
+    if not seconds:
+        return None
+    return time.monotonic() + seconds
+
+
+def time_left(deadline):
+    """Seconds until ``deadline`` (negative once passed), or None"""
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def check(deadline, what="the request"):
+    """Raise DeadlineExceeded if ``deadline`` has passed; return the time left"""
+    left = time_left(deadline)
+    if left is not None and left <= 0:
+        raise DeadlineExceeded(f"Ran out of time for {what}")
+    return left
+
+
+def earliest(*deadlines):
+    """The tightest of several deadlines, ignoring None"""
+    known = [deadline for deadline in deadlines if deadline is not None]
+    return min(known) if known else None
+
+
+def wait_result(future, deadline, what="Google Ads"):
+    """``future.result()`` bounded by ``deadline``"""
+    try:
+        return future.result(check(deadline, what))
+    except FutureTimeout:
+        raise DeadlineExceeded(f"{what} did not answer in time") from None
@@ -0,0 +1,146 @@
+"""
+De-duplication of Slack event deliveries
+Slack redelivers an event (same event_id, X-Slack-Retry-Num header) when it
+thinks we were too slow. Remembering recently seen event IDs for a while
+turns those retries into cheap no-ops.
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+import metrics
+from config import EVENT_DEDUPE_MAX_ENTRIES, EVENT_DEDUPE_PATH, EVENT_DEDUPE_TTL
+
+logger = logging.getLogger(__name__)
+
+
+class SeenEvents(ABC):
+    """Base class for time-bounded stores of seen Slack event IDs"""
+
+    def __init__(self, ttl=EVENT_DEDUPE_TTL):
+        self.ttl = ttl
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            'checked': 0,
+            'suppressed': 0,
+            'retries_received': 0,
+            'retries_suppressed': 0,
+        }
+
+    def first_delivery(self, event_id, retry=False):
+        """Record ``event_id`` and return True unless it was already seen"""
+        if not event_id:
+            return True
+        first = self._mark(event_id, time.time())
+        with self._stats_lock:
+            self._stats['checked'] += 1
+            if retry:
+                self._stats['retries_received'] += 1
+            if not first:
+                self._stats['suppressed'] += 1
+                if retry:
+                    self._stats['retries_suppressed'] += 1
+        if not first:
+            metrics.inc('slack_retries_suppressed' if retry else 'slack_duplicates_suppressed')
+        return first
+
+    @abstractmethod
+    def _mark(self, event_id, now):
+        """Record ``event_id`` at ``now``; return True unless it was seen within the TTL"""
+
+    def stats(self):
+        """Return counters for checked and suppressed deliveries"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats['backend'] = self.backend
+        return stats
+
+
+class MemorySeenEvents(SeenEvents):
+    """Per-process store; enough for a single gunicorn worker"""
+
+    backend = 'memory'
+
+    def __init__(self, ttl=EVENT_DEDUPE_TTL, max_entries=EVENT_DEDUPE_MAX_ENTRIES):
+        super().__init__(ttl)
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._seen = OrderedDict()  # event_id -> first seen (oldest first)
+
+    def _mark(self, event_id, now):
+        with self._lock:
+            while self._seen:
+                oldest_id, seen_at = next(iter(self._seen.items()))
+                if now - seen_at <= self.ttl and len(self._seen) < self.max_entries:
+                    break
+                del self._seen[oldest_id]
+            if event_id in self._seen:
+                return False
+            self._seen[event_id] = now
+            return True
+
+
+class SqliteSeenEvents(SeenEvents):
+    """On-disk store that several gunicorn workers on one host can share"""
+
+    backend = 'sqlite'
+
+    # Delete expired rows roughly once every this many inserts
+    PRUNE_EVERY = 200
+
+    def __init__(self, path, ttl=EVENT_DEDUPE_TTL):
+        super().__init__(ttl)
+        self.path = path
+        self._local = threading.local()
+        self._inserts = 0
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS seen_events ("
+                "event_id TEXT PRIMARY KEY, seen_at REAL NOT NULL)"
+            )
+
+    def _connect(self):
+        """One connection per thread and process; never reuse one across fork"""
+        pid = os.getpid()
+        if getattr(self._local, 'pid', None) != pid:
+            self._local.conn = sqlite3.connect(self.path, timeout=5)
+            self._local.pid = pid
+        return self._local.conn
+
+    def _mark(self, event_id, now):
+        try:
+            return self._insert(event_id, now)
+        except sqlite3.Error as e:
+            # Fail open: handling a retry twice beats dropping a new event
+            logger.error(f"Event de-duplication store error: {str(e)}")
+            return True
+
+    def _insert(self, event_id, now):
+        conn = self._connect()
+        with conn:
+            # An expired row is replaced, so a very late redelivery counts as new
+            conn.execute("DELETE FROM seen_events WHERE event_id = ? AND seen_at < ?",
+                         (event_id, now - self.ttl))
+            cursor = conn.execute("INSERT OR IGNORE INTO seen_events (event_id, seen_at) VALUES (?, ?)",
+                                  (event_id, now))
+            first = cursor.rowcount == 1
+            self._inserts += 1
+            if self._inserts % self.PRUNE_EVERY == 0:
+                conn.execute("DELETE FROM seen_events WHERE seen_at < ?", (now - self.ttl,))
+        return first
+
+
+def create_seen_events(path=EVENT_DEDUPE_PATH):
+    """Build the configured seen-events store, falling back to memory"""
+    if path:
+        try:
+            return SqliteSeenEvents(path)
+        except sqlite3.Error as e:
+            logger.error(f"Cannot open event de-duplication store {path!r}: {str(e)}; using memory")
+    return MemorySeenEvents()
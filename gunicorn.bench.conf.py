@@ -0,0 +1,20 @@
+# Gunicorn configuration for load tests (replay.py): gunicorn.conf.py with
+# Google Ads answered by a local fake in every worker. Never deploy with it.
+import os
+import runpy
+
+# Read by config.py, which the workers import after this file runs
+os.environ.setdefault("FAKE_GOOGLE_ADS_LATENCY", "0.3")
+
+_production = runpy.run_path(os.path.join(os.path.dirname(os.path.abspath(__file__)), "gunicorn.conf.py"))
+globals().update({name: value for name, value in _production.items() if not name.startswith("__")})
+
+
+def post_fork(server, worker):
+    """Answer Google Ads calls from a local fake (FAKE_GOOGLE_ADS_* settings)"""
+    import benchmark_fakes
+    benchmark_fakes.install_from_config()
+
+
+def post_worker_init(worker):
+    """Nothing to warm up: the fake needs no client"""
@@ -1,8 +1,62 @@
 # Gunicorn configuration file
+import gc
+import os
+
 bind = "0.0.0.0:1000"
 workers = 1
-worker_class = "sync"
 timeout = 120
 keepalive = 2
 max_requests = 1000
 max_requests_jitter = 100
+
+# GUNICORN_PRELOAD=true imports the app (and google-ads, unless ADS_WARMUP is
+# "off") once in the master; workers share those pages copy-on-write
+preload_app = os.getenv("GUNICORN_PRELOAD", "false").lower() == "true"
+
+# SERVING_MODE (see config.py) picks the entry point: "sync" runs the Flask
+# app on sync workers, "async" runs the aiohttp app on aiohttp's worker
+if os.getenv("SERVING_MODE", "sync") == "async":
+    wsgi_app = "slack_app_async:app"
+    worker_class = "aiohttp.GunicornWebWorker"
+else:
+    wsgi_app = "slack_app_manifest:app"
+    worker_class = "sync"
+
+
+def on_starting(server):
+    """Start /metrics from zero: drop worker snapshots left by an earlier run"""
+    directory = os.getenv("METRICS_DIR", "")
+    if directory and os.path.isdir(directory):
+        for name in os.listdir(directory):
+            if name.startswith("metrics-"):
+                os.remove(os.path.join(directory, name))
+
+
+def when_ready(server):
+    """Preloading: import google-ads before forking, then keep GC off the shared pages"""
+    if not server.cfg.preload_app:
+        return
+    if os.getenv("ADS_WARMUP", "background") != "off":
+        import ads_client
+        ads_client.import_google_ads()
+    # Collections would touch every preloaded object and copy its page per worker
+    gc.freeze()
+
+
+def post_worker_init(worker):
+    """Build the Google Ads client in the background so the first lookup finds it ready"""
+    import ads_client
+    ads_client.warm_up_in_background()
+
+
+def worker_exit(server, worker):
+    """Write the exiting worker's final totals so /metrics keeps counting them"""
+    import metrics
+    metrics.flush()
+
+
+def child_exit(server, worker):
+    """Fold the reaped worker's metrics file into the dead-worker totals (runs in the master)"""
+    if os.getenv("METRICS_DIR", ""):
+        import metrics
+        metrics.mark_process_dead(worker.pid)
@@ -0,0 +1,158 @@
+"""
+Micro-batching of keyword lookups
+Collects lookups that arrive within a short window and sends them to the API
+as one multi-seed request, routing each result back to its caller.
+"""
+
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import metrics
+from config import BATCH_MAX_CONCURRENCY, BATCH_MAX_SEEDS, BATCH_WINDOW_SECONDS
+from deadlines import DeadlineExceeded, wait_result
+from keyword_cache import normalize_keyword
+
+logger = logging.getLogger(__name__)
+
+
+class KeywordBatcher:
+    """Group keyword lookups into batches of up to ``max_size`` seeds
+
+    ``fetch_batch`` receives a list of keywords and the batch deadline (the
+    latest of its callers' deadlines, or None) and must return a dict that
+    maps each normalized keyword to its result.
+    """
+
+    def __init__(self, fetch_batch, window=BATCH_WINDOW_SECONDS,
+                 max_size=BATCH_MAX_SEEDS, max_concurrency=BATCH_MAX_CONCURRENCY):
+        self.fetch_batch = fetch_batch
+        self.window = window
+        self.max_size = max_size
+        self.max_concurrency = max_concurrency
+        self._cond = threading.Condition()
+        self._pending = []  # (normalized keyword, keyword, future, enqueued_at, deadline)
+        self._pid = None
+        self._executor = None
+        self._stats = {
+            'lookups': 0,
+            'batches': 0,
+            'seeds': 0,
+            'largest_batch': 0,
+            'api_calls_saved': 0,
+            'wait_seconds_total': 0.0,
+        }
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def submit(self, keyword, deadline=None):
+        """Queue ``keyword`` for the next batch and return a Future"""
+        future = Future()
+        if deadline is not None and deadline <= time.monotonic():
+            # Out of time already; don't hold a batch slot for it
+            future.set_exception(DeadlineExceeded("Ran out of time before the Google Ads batch"))
+            return future
+        with self._cond:
+            self._ensure_started()
+            self._pending.append((normalize_keyword(keyword), keyword, future, time.monotonic(), deadline))
+            self._stats['lookups'] += 1
+            self._cond.notify()
+        return future
+
+    def lookup(self, keyword, deadline=None):
+        """Submit ``keyword`` and block until its batch has been answered"""
+        return wait_result(self.submit(keyword, deadline), deadline)
+
+    def _ensure_started(self):
+        """Start the dispatcher in this process (again, after a fork)"""
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        self._pid = pid
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency,
+                                            thread_name_prefix="keyword-batch")
+        threading.Thread(target=self._dispatch, name="keyword-batcher", daemon=True).start()
+
+    def _after_fork(self):
+        """Lookups queued in the parent belong to the parent; start clean"""
+        self._cond = threading.Condition()
+        self._pending = []
+
+    def _dispatch(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                deadline = self._pending[0][3] + self.window
+                while len(self._distinct_pending()) < self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch = self._take_batch()
+            self._executor.submit(self._run_batch, batch)
+
+    def _distinct_pending(self):
+        return {item[0] for item in self._pending}
+
+    def _take_batch(self):
+        """Pop pending lookups covering at most ``max_size`` distinct seeds"""
+        seeds = set()
+        batch, rest = [], []
+        for item in self._pending:
+            if item[0] in seeds or len(seeds) < self.max_size:
+                seeds.add(item[0])
+                batch.append(item)
+            else:
+                rest.append(item)
+        self._pending = rest
+        return batch
+
+    def _run_batch(self, batch):
+        # Callers whose deadline passed while queued get no API call
+        now = time.monotonic()
+        expired = [item for item in batch if item[4] is not None and item[4] <= now]
+        for item in expired:
+            item[2].set_exception(DeadlineExceeded("Ran out of time waiting for a Google Ads batch"))
+        batch = [item for item in batch if item not in expired]
+        if not batch:
+            return
+
+        keywords = {}
+        for normalized, keyword, _, _, _ in batch:
+            keywords.setdefault(normalized, keyword)
+        deadlines = [item[4] for item in batch]
+        deadline = None if None in deadlines else max(deadlines)
+        for item in batch:
+            metrics.observe('batch_wait', now - item[3])
+        metrics.inc('ads_batches')
+
+        with self._cond:
+            self._stats['batches'] += 1
+            self._stats['seeds'] += len(keywords)
+            self._stats['largest_batch'] = max(self._stats['largest_batch'], len(keywords))
+            self._stats['api_calls_saved'] += len(keywords) - 1
+            self._stats['wait_seconds_total'] += sum(now - item[3] for item in batch)
+
+        try:
+            results = self.fetch_batch(list(keywords.values()), deadline)
+        except BaseException as e:
+            for _, _, future, _, _ in batch:
+                future.set_exception(e)
+            return
+
+        for normalized, _, future, _, _ in batch:
+            future.set_result(results.get(normalized))
+
+    def stats(self):
+        """Return batch size, window and API-call savings counters"""
+        with self._cond:
+            stats = dict(self._stats)
+            stats['pending'] = len(self._pending)
+        stats['window_seconds'] = self.window
+        stats['max_batch_size'] = self.max_size
+        stats['avg_batch_size'] = round(stats['seeds'] / stats['batches'], 2) if stats['batches'] else 0
+        stats['avg_wait_seconds'] = round(stats['wait_seconds_total'] / stats['lookups'], 4) if stats['lookups'] else 0
+        return stats
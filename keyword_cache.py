@@ -0,0 +1,151 @@
+"""
+In-memory result cache for keyword research
+Bounded LRU with a TTL and stale-while-revalidate, keyed on the normalized
+keyword plus the customer/language/geo/network the lookup was scoped to.
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+import metrics
+from config import (CACHE_MAX_ENTRIES, CACHE_STALE_SECONDS, CACHE_TTL_SECONDS,
+                    CUSTOMER_ID, LANGUAGE_CODE, LOCATION_CODE, NETWORK_TYPE)
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_keyword(keyword):
+    """Casefold and collapse whitespace so equivalent asks share one entry"""
+    return " ".join(keyword.casefold().split())
+
+
+def cache_key(keyword, customer_id=CUSTOMER_ID, language=LANGUAGE_CODE,
+              location=LOCATION_CODE, network=NETWORK_TYPE):
+    """Build the cache key for a keyword lookup"""
+    return (customer_id, language, location, network, normalize_keyword(keyword))
+
+
+class KeywordCache:
+    """Thread-safe TTL + LRU cache with stale-while-revalidate"""
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL_SECONDS,
+                 stale_ttl=CACHE_STALE_SECONDS, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (stored_at, value)
+        self._refreshing = set()
+        self._stats = {
+            'hits': 0,
+            'stale_hits': 0,
+            'misses': 0,
+            'evictions': 0,
+            'refreshes': 0,
+            'refresh_errors': 0,
+        }
+
+    def get(self, key):
+        """Return ``(value, age)`` for a usable entry, or ``None``"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            age = self._clock() - entry[0]
+            if age > self.ttl + self.stale_ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1], age
+
+    def set(self, key, value):
+        """Store ``value`` and evict least recently used entries over the cap"""
+        with self._lock:
+            self._entries[key] = (self._clock(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def get_or_load(self, key, loader):
+        """Return the cached value for ``key`` or call ``loader`` to fill it
+
+        A stale entry is returned immediately and refreshed in the background.
+        """
+        found = self.lookup(key, lambda: self.set(key, loader()))
+        if found is not None:
+            return found[0]
+        value = loader()
+        self.set(key, value)
+        return value
+
+    def lookup(self, key, refresh):
+        """Return ``(value,)`` on a hit or stale hit, or ``None`` on a miss
+
+        Counts the outcome and, for a stale hit, runs ``refresh`` in the
+        background; it must ``set`` the new value itself, just as callers that
+        miss must.
+        """
+        found = self.get(key)
+        if found is None:
+            self._count('misses')
+            return None
+        value, age = found
+        if age <= self.ttl:
+            self._count('hits')
+        else:
+            self._count('stale_hits')
+            self._refresh_in_background(key, refresh)
+        return (value,)
+
+    def _refresh_in_background(self, key, refresh):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def run():
+            try:
+                refresh()
+                self._count('refreshes')
+            except Exception as e:
+                self._count('refresh_errors')
+                logger.warning(f"Background refresh failed for {key[-1]!r}: {str(e)}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def _count(self, name):
+        metrics.inc(f"keyword_cache_{name}")
+        with self._lock:
+            self._stats[name] += 1
+
+    def clear(self):
+        """Drop every entry (counters are kept)"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Return hit/miss/eviction counters and current size"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = len(self._entries)
+        return stats
+
+
+_cache = KeywordCache()
+
+
+def get_cache():
+    """Return the process-wide keyword result cache"""
+    return _cache
+
+
+def cache_stats():
+    """Return counters for the process-wide keyword result cache"""
+    return _cache.stats()
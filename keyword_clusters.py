@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Keyword idea clustering
+Groups near-duplicate keywords ("seo dubai" / "dubai seo services") without
+comparing every pair. Each keyword becomes a set of word and character
+3-gram shingles (so word order does not matter), the sets are MinHashed in
+one vectorized NumPy pass, and locality-sensitive hashing over bands of the
+signatures proposes candidate pairs. Candidates whose estimated similarity
+clears the threshold are merged, and each cluster is reported with its total
+avg_monthly_searches and a head term (its highest-volume keyword).
+"""
+
+import argparse
+import csv
+import json
+import os
+
+import numpy as np
+
+from config import CLUSTER_BANDS, CLUSTER_PERMUTATIONS, CLUSTER_SIMILARITY
+from keyword_cache import normalize_keyword
+
+# Mersenne prime for the universal hash family h(x) = (a * x + b) mod p
+_PRIME = (1 << 31) - 1
+
+# Hash functions evaluated per pass; bounds the temporary array size
+_HASH_CHUNK = 8
+
+
+def shingles(keyword):
+    """Words plus padded character 3-grams of each word"""
+    words = normalize_keyword(keyword).split()
+    grams = set(words)
+    for word in words:
+        padded = f" {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def minhash_signatures(keywords, permutations=CLUSTER_PERMUTATIONS, seed=1):
+    """Return an ``(len(keywords), permutations)`` array of MinHash values"""
+    # Any distinct integer per shingle will do; numbering them is cheapest
+    vocabulary = {}
+    ids, counts = [], []
+    for keyword in keywords:
+        grams = shingles(keyword)
+        ids.extend([vocabulary.setdefault(gram, len(vocabulary)) for gram in grams])
+        counts.append(len(grams))
+    x = np.array(ids, dtype=np.int64)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1])).astype(np.intp)
+
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, _PRIME, size=permutations, dtype=np.int64)
+    b = rng.integers(0, _PRIME, size=permutations, dtype=np.int64)
+    signatures = np.empty((len(counts), permutations), dtype=np.int64)
+    for start in range(0, permutations, _HASH_CHUNK):
+        stop = min(start + _HASH_CHUNK, permutations)
+        hashed = (x[:, None] * a[None, start:stop] + b[None, start:stop]) % _PRIME
+        # Minimum over each keyword's run of shingles
+        signatures[:, start:stop] = np.minimum.reduceat(hashed, starts, axis=0)
+    return signatures
+
+
+def candidate_pairs(signatures, bands=CLUSTER_BANDS):
+    """Pairs of rows that agree on every value of at least one band
+
+    Within a bucket every member is paired with the bucket's first member
+    only, which keeps the pair count linear; merging is transitive anyway.
+    """
+    rows = signatures.shape[1] // bands
+    # Fold each band's values into one integer (wrapping arithmetic); rare
+    # accidental collisions are weeded out by the similarity check
+    weights = np.random.default_rng(0).integers(1, _PRIME, size=rows, dtype=np.int64) | 1
+    pairs = []
+    for band in range(bands):
+        bucket = signatures[:, band * rows:(band + 1) * rows] @ weights
+        order = np.argsort(bucket, kind='stable')
+        ordered = bucket[order]
+        leader = order[np.searchsorted(ordered, ordered)]
+        followers = leader != order
+        pairs.append(np.stack([leader[followers], order[followers]], axis=1))
+    if not pairs:
+        return np.empty((0, 2), dtype=np.intp)
+    return np.unique(np.concatenate(pairs), axis=0)
+
+
+def connected_labels(count, pairs):
+    """Label each of ``count`` items with the smallest index in its component"""
+    labels = np.arange(count)
+    if len(pairs) == 0:
+        return labels
+    left, right = pairs[:, 0], pairs[:, 1]
+    while True:
+        low = np.minimum(labels[left], labels[right])
+        merged = labels.copy()
+        np.minimum.at(merged, left, low)
+        np.minimum.at(merged, right, low)
+        # Pointer jumping: follow labels to their own labels
+        merged = merged[merged]
+        if np.array_equal(merged, labels):
+            return labels
+        labels = merged
+
+
+def cluster_keywords(items, threshold=CLUSTER_SIMILARITY, permutations=CLUSTER_PERMUTATIONS,
+                     bands=CLUSTER_BANDS):
+    """
+    Cluster ``(keyword, avg_monthly_searches)`` pairs.
+    Returns clusters sorted by total searches, each a dictionary with
+    ``head``, ``total_searches``, ``size`` and ``members`` (highest volume first).
+    """
+    volumes_by_keyword = {}
+    for keyword, searches in items:
+        normalized = normalize_keyword(keyword)
+        if normalized:
+            searches = int(searches or 0)
+            if searches >= volumes_by_keyword.get(normalized, (None, -1))[1]:
+                volumes_by_keyword[normalized] = (keyword, searches)
+    if not volumes_by_keyword:
+        return []
+    keywords = [keyword for keyword, _ in volumes_by_keyword.values()]
+    volumes = np.array([searches for _, searches in volumes_by_keyword.values()], dtype=np.int64)
+
+    signatures = minhash_signatures(keywords, permutations)
+    pairs = candidate_pairs(signatures, bands)
+    if len(pairs):
+        # Fraction of agreeing MinHash values estimates Jaccard similarity
+        similarity = (signatures[pairs[:, 0]] == signatures[pairs[:, 1]]).mean(axis=1)
+        pairs = pairs[similarity >= threshold]
+    _, cluster_of = np.unique(connected_labels(len(keywords), pairs), return_inverse=True)
+
+    totals = np.bincount(cluster_of, weights=volumes).astype(np.int64)
+    lengths = np.array([len(keyword) for keyword in keywords])
+    # Group members by cluster, highest volume first, shorter text on ties
+    order = np.lexsort((lengths, -volumes, cluster_of))
+    boundaries = np.flatnonzero(np.diff(cluster_of[order])) + 1
+    clusters = []
+    for members in np.split(order, boundaries):
+        clusters.append({
+            'head': keywords[members[0]],
+            'total_searches': int(totals[cluster_of[members[0]]]),
+            'size': len(members),
+            'members': [{'keyword': keywords[i], 'avg_monthly_searches': int(volumes[i])} for i in members],
+        })
+    clusters.sort(key=lambda cluster: (-cluster['total_searches'], cluster['head']))
+    return clusters
+
+
+def load_ideas(path):
+    """
+    Read ``(keyword, avg_monthly_searches)`` pairs from a bulk JSONL/CSV
+    export, an expansion graph JSON file or plain text (one keyword per line,
+    optionally followed by a tab and its volume).
+    """
+    _, extension = os.path.splitext(path)
+    with open(path, newline='', encoding='utf-8') as f:
+        if extension == '.json':
+            for node in json.load(f).get('nodes', []):
+                yield node['keyword'], node.get('avg_monthly_searches')
+        elif extension == '.jsonl':
+            for line in f:
+                row = json.loads(line) if line.strip() else None
+                result = (row or {}).get('result') or {}
+                if row and not row.get('error'):
+                    yield row['keyword'], result.get('avg_monthly_searches')
+                    for suggestion in result.get('suggestions', []):
+                        yield suggestion['keyword'], suggestion['avg_monthly_searches']
+        elif extension == '.csv':
+            for row in csv.DictReader(f):
+                if not row.get('error'):
+                    yield row['keyword'], row.get('avg_monthly_searches') or 0
+        else:
+            for line in f:
+                keyword, _, searches = line.rstrip('\n').partition('\t')
+                yield keyword, searches.strip() or 0
+
+
+def write_clusters(path, clusters):
+    """Write every cluster as JSON, or one CSV row per member"""
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        if path.endswith('.csv'):
+            writer = csv.writer(f)
+            writer.writerow(['cluster', 'head', 'total_searches', 'keyword', 'avg_monthly_searches'])
+            for number, cluster in enumerate(clusters, 1):
+                for member in cluster['members']:
+                    writer.writerow([number, cluster['head'], cluster['total_searches'],
+                                     member['keyword'], member['avg_monthly_searches']])
+        else:
+            json.dump(clusters, f, ensure_ascii=False, indent=1)
+
+
+def main():
+    """Command line interface for keyword clustering"""
+    parser = argparse.ArgumentParser(description="Group near-duplicate keyword ideas")
+    parser.add_argument('input', help="bulk results (.jsonl/.csv), expansion graph (.json) or keyword list")
+    parser.add_argument('-o', '--output', help="write all clusters to this .json or .csv file")
+    parser.add_argument('--threshold', type=float, default=CLUSTER_SIMILARITY, help="similarity needed to merge (0-1)")
+    parser.add_argument('--top', type=int, default=20, help="clusters to print")
+    args = parser.parse_args()
+
+    clusters = cluster_keywords(load_ideas(args.input), args.threshold)
+    keywords = sum(cluster['size'] for cluster in clusters)
+    print(f"🧩 {keywords} keywords in {len(clusters)} clusters")
+    for cluster in clusters[:args.top]:
+        print(f"{cluster['total_searches']:>12,}  {cluster['head']}  ({cluster['size']} keywords)")
+    if args.output:
+        write_clusters(args.output, clusters)
+        print(f"💾 Clusters written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
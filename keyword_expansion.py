@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Related-keyword expansion
+Crawls Google Ads keyword ideas breadth-first from a few seeds: each level's
+new keywords become the next level's seeds, sent up to 20 per request. The
+crawl stops at a depth, keyword count, API-call or time budget and writes the
+keyword graph (nodes with volumes, parent -> child edges) to a JSON file.
+"""
+
+import argparse
+import json
+import os
+import time
+
+from config import (BATCH_MAX_SEEDS, EXPAND_MAX_API_CALLS, EXPAND_MAX_DEPTH, EXPAND_MAX_KEYWORDS,
+                    EXPAND_MAX_SECONDS, EXPAND_MIN_SEARCHES)
+from deadlines import deadline_after, time_left
+from keyword_cache import normalize_keyword
+from keyword_research import iter_keyword_ideas
+
+
+class KeywordGraph:
+    """Keywords keyed by normalized text, plus parent -> child edges"""
+
+    def __init__(self):
+        self.nodes = {}  # normalized -> {'keyword', 'depth', 'avg_monthly_searches', 'competition'}
+        self.edges = set()  # (parent, child) normalized pairs
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def __contains__(self, normalized):
+        return normalized in self.nodes
+
+    def add(self, keyword, depth, searches=None, competition=None):
+        """Add a keyword the first time it is seen; returns its normalized form"""
+        normalized = normalize_keyword(keyword)
+        node = self.nodes.get(normalized)
+        if node is None:
+            self.nodes[normalized] = {
+                'keyword': keyword,
+                'depth': depth,
+                'avg_monthly_searches': searches,
+                'competition': competition,
+            }
+        elif node['avg_monthly_searches'] is None and searches is not None:
+            # Seeds only learn their own volume when they come back as an idea
+            node['avg_monthly_searches'] = searches
+            node['competition'] = competition
+        return normalized
+
+    def link(self, parent, child):
+        if parent != child:
+            self.edges.add((parent, child))
+
+    def volume(self, normalized):
+        return self.nodes[normalized]['avg_monthly_searches'] or 0
+
+    def to_dict(self):
+        return {
+            'nodes': sorted(self.nodes.values(), key=lambda node: (node['depth'], -(node['avg_monthly_searches'] or 0))),
+            'edges': [[self.nodes[parent]['keyword'], self.nodes[child]['keyword']]
+                      for parent, child in sorted(self.edges)],
+        }
+
+
+def expand(seeds, max_depth=EXPAND_MAX_DEPTH, max_keywords=EXPAND_MAX_KEYWORDS,
+           max_calls=EXPAND_MAX_API_CALLS, batch_size=BATCH_MAX_SEEDS, min_searches=EXPAND_MIN_SEARCHES,
+           deadline=None):
+    """
+    Crawl keyword ideas breadth-first from ``seeds`` until the budgets or
+    ``deadline`` (a time.monotonic() value) run out.
+    Returns ``(graph, stats)``.
+    """
+    graph = KeywordGraph()
+    frontier = []
+    for seed in seeds:
+        normalized = normalize_keyword(seed)
+        if normalized and normalized not in graph:
+            frontier.append(graph.add(seed, 0))
+
+    stats = {'api_calls': 0, 'errors': 0, 'depth_reached': 0, 'stop_reason': 'exhausted'}
+    started = time.monotonic()
+    for depth in range(max_depth):
+        if not frontier:
+            break
+        # Strongest keywords first, so a budget cut drops the weakest branches
+        frontier.sort(key=graph.volume, reverse=True)
+        print(f"🌱 Depth {depth + 1}: expanding {len(frontier)} keyword(s)")
+        next_frontier = []
+        for start in range(0, len(frontier), batch_size):
+            if stats['api_calls'] >= max_calls:
+                stats['stop_reason'] = 'api_call_budget'
+                break
+            if len(graph) >= max_keywords:
+                stats['stop_reason'] = 'keyword_budget'
+                break
+            left = time_left(deadline)
+            if left is not None and left <= 0:
+                stats['stop_reason'] = 'deadline'
+                break
+            batch = frontier[start:start + batch_size]
+            stats['api_calls'] += 1
+            try:
+                ideas = list(iter_keyword_ideas([graph.nodes[normalized]['keyword'] for normalized in batch],
+                                                deadline))
+            except Exception as e:
+                # The breaker and quota governor already waited; skip this batch
+                stats['errors'] += 1
+                print(f"❌ Expansion request failed: {str(e)}")
+                continue
+            next_frontier.extend(_absorb(graph, batch, ideas, depth + 1, max_keywords, min_searches))
+        stats['depth_reached'] = depth + 1
+        frontier = next_frontier
+        if stats['stop_reason'] != 'exhausted':
+            break
+    else:
+        if len(graph) >= max_keywords:
+            stats['stop_reason'] = 'keyword_budget'
+        elif frontier:
+            stats['stop_reason'] = 'max_depth'
+
+    stats['keywords'] = len(graph)
+    stats['edges'] = len(graph.edges)
+    stats['elapsed_seconds'] = round(time.monotonic() - started, 2)
+    return graph, stats
+
+
+def _absorb(graph, batch, ideas, depth, max_keywords, min_searches):
+    """Add one response's ideas to the graph; returns the newly found keywords"""
+    batch_words = {normalized: set(normalized.split()) for normalized in batch}
+    found = []
+    for text, searches, competition in ideas:
+        child = normalize_keyword(text)
+        if child not in graph:
+            if searches < min_searches or len(graph) >= max_keywords:
+                continue
+            found.append(child)
+        graph.add(text, depth, searches, competition)
+        # Credit the seeds that share a word with the idea; ideas that share
+        # none are related to the request's seeds as a whole
+        words = set(child.split())
+        parents = [seed for seed in batch if batch_words[seed] & words] or batch
+        for parent in parents:
+            graph.link(parent, child)
+    return found
+
+
+def write_graph(path, seeds, graph, stats):
+    """Write the graph as JSON, replacing ``path`` only once fully written"""
+    document = {'seeds': list(seeds), 'stats': stats, **graph.to_dict()}
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(document, f, ensure_ascii=False, indent=1)
+    os.replace(tmp_path, path)
+
+
+def main():
+    """Command line interface for keyword expansion"""
+    parser = argparse.ArgumentParser(description="Expand seed keywords into a related-keyword graph")
+    parser.add_argument('seeds', nargs='*', help="seed keywords")
+    parser.add_argument('-i', '--input', help="file with one seed keyword per line")
+    parser.add_argument('-o', '--output', default='keyword_graph.json', help="graph file to write")
+    parser.add_argument('--depth', type=int, default=EXPAND_MAX_DEPTH, help="levels of ideas to follow")
+    parser.add_argument('--max-keywords', type=int, default=EXPAND_MAX_KEYWORDS, help="stop after this many keywords")
+    parser.add_argument('--max-calls', type=int, default=EXPAND_MAX_API_CALLS, help="stop after this many API requests")
+    parser.add_argument('--batch-size', type=int, default=BATCH_MAX_SEEDS, help="seeds per API request (max 20)")
+    parser.add_argument('--min-searches', type=int, default=EXPAND_MIN_SEARCHES, help="ignore ideas below this volume")
+    parser.add_argument('--max-seconds', type=float, default=EXPAND_MAX_SECONDS, help="stop after this many seconds (0: no limit)")
+    args = parser.parse_args()
+
+    seeds = list(args.seeds)
+    if args.input:
+        with open(args.input, encoding='utf-8') as f:
+            seeds.extend(line.strip() for line in f if line.strip())
+    if not seeds:
+        parser.error("give at least one seed keyword")
+
+    graph, stats = expand(seeds, args.depth, args.max_keywords, args.max_calls,
+                          min(args.batch_size, BATCH_MAX_SEEDS), args.min_searches,
+                          deadline_after(args.max_seconds))
+    write_graph(args.output, seeds, graph, stats)
+    print(f"📊 {stats['keywords']} keywords, {stats['edges']} edges from {len(seeds)} seed(s) "
+          f"in {stats['elapsed_seconds']}s using {stats['api_calls']} API call(s)")
+    print(f"⏹️ Stopped: {stats['stop_reason']} (depth {stats['depth_reached']}); graph written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,83 +1,189 @@
-from google.ads.googleads.client import GoogleAdsClient
-from google.ads.googleads.errors import GoogleAdsException
+import argparse
+import heapq
+import os
 import sys
-from config import CUSTOMER_ID, DEFAULT_KEYWORD, GOOGLE_ADS_CONFIG, LANGUAGE_CODE, LOCATION_CODE, NETWORK_TYPE
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from ads_client import get_client, get_service
+import metrics
+from keyword_batcher import KeywordBatcher
+from keyword_cache import cache_key, get_cache, normalize_keyword
+from keyword_store import create_keyword_store
+from keyword_result import KeywordResult, competition_name, raw
+from monthly_series import MONTH_NAMES
+from circuit_breaker import CircuitOpen, get_breaker
+from deadlines import DeadlineExceeded, wait_result
+from quota_governor import QuotaExhausted, get_governor
+from singleflight import SingleFlight, chain
+from config import (ADS_CALL_TIMEOUT, BULK_WORKERS, CUSTOMER_ID, DEFAULT_KEYWORD, IDEAS_PAGE_SIZE, IDEAS_SCAN_LIMIT, KEYWORD_LOOKUP_MODE,
+                    LANGUAGE_CODE, LOCATION_CODE, NETWORK_TYPE, SUGGESTION_COUNT)
 
-def get_keyword_data(keyword):
+# Identical lookups that miss the cache at the same time share one API call
+_inflight = SingleFlight()
+
+# Results shared with other workers and kept across restarts (optional)
+_store = create_keyword_store()
+
+def get_keyword_data(keyword, deadline=None):
     """
     Get keyword research data for a given keyword.
-    Returns a dictionary with keyword metrics or None if error.
+    Answers from the result cache or on-disk store when possible, otherwise
+    calls the API, giving up with DeadlineExceeded once ``deadline`` (a
+    time.monotonic() value) passes.
+    """
+    key = cache_key(keyword)
+    # Background refreshes of stale entries are not bound to this request;
+    # the shared load stores the fresh result in the cache
+    found = get_cache().lookup(key, lambda: _load(keyword, key))
+    if found is not None:
+        return found[0]
+    return _load(keyword, key, deadline)
+
+def get_keyword_data_future(keyword):
+    """
+    Non-blocking variant of get_keyword_data for event-loop callers.
+    Returns a concurrent.futures.Future; no thread waits on the lookup, and
+    callers bound their own wait by their deadline.
+    """
+    key = cache_key(keyword)
+    found = get_cache().lookup(key, lambda: _load(keyword, key))
+    if found is not None:
+        return _resolved(found[0])
+    return _shared_load(keyword, key)
+
+def _load(keyword, key, deadline=None):
+    """Blocking lookup shared by concurrent callers of the same key"""
+    return wait_result(_shared_load(keyword, key), deadline)
+
+def _shared_load(keyword, key):
+    """
+    The one lookup concurrent callers of ``key`` share, as a Future.
+    It carries no caller's deadline (ADS_CALL_TIMEOUT still caps the API
+    call): each caller applies its own while waiting, so a caller with a
+    long deadline is not failed by one with a short deadline that started
+    the lookup. A result that lands after every caller gave up still fills
+    the cache and the store.
     """
+    def start():
+        future = _load_future(keyword, key)
+        def store(done):
+            if done.exception() is None:
+                get_cache().set(key, done.result())
+        future.add_done_callback(store)
+        return future
+    return _inflight.do_future(key, start)
+
+def _load_future(keyword, key):
+    """Read through the on-disk store, then queue an API lookup on the batcher
+
+    The store is read on a store thread, never the caller's: on the async
+    app the caller is the event loop.
+    """
+    if _store is None:
+        return _query(keyword)
+    future = Future()
+
+    def read_through():
+        try:
+            chain(_read_through(keyword, key), future)
+        except BaseException as e:
+            future.set_exception(e)
+    _store_reader().submit(read_through)
+    return future
+
+def _read_through(keyword, key):
+    stored = _store.get(key)
+    if stored is not None:
+        return _resolved(stored)
+
+    if get_breaker().is_open():
+        # Google Ads is down: an old answer beats no answer
+        stale = _store.get(key, ttl=_store.max_age)
+        if stale is not None:
+            return _resolved(stale)
+
+    future = _query(keyword)
+    def persist(done):
+        if done.exception() is None:
+            _store.set(key, done.result())
+    future.add_done_callback(persist)
+    return future
+
+def _query(keyword):
+    """Queue an API lookup on the batcher, unless the circuit breaker is open"""
+    if get_breaker().is_open():
+        future = Future()
+        future.set_exception(get_breaker().reject())
+        return future
+    return _batcher.submit(keyword)
+
+_store_lock = threading.Lock()
+_store_pool = None  # (pid, executor) for on-disk store reads
+
+def _store_reader():
+    """Threads for store reads, started (again, after a fork) on first use"""
+    global _store_pool
+    with _store_lock:
+        if _store_pool is None or _store_pool[0] != os.getpid():
+            _store_pool = (os.getpid(), ThreadPoolExecutor(max_workers=4, thread_name_prefix="keyword-store"))
+        return _store_pool[1]
+
+def _resolved(value):
+    future = Future()
+    future.set_result(value)
+    return future
+
+def inflight_stats():
+    """Return single-flight counters for keyword lookups"""
+    return _inflight.stats()
+
+def batch_stats():
+    """Return micro-batching counters for keyword lookups"""
+    return _batcher.stats()
+
+def store_stats():
+    """Return on-disk store counters, or None when the store is disabled"""
+    return _store.stats() if _store is not None else None
+
+def fetch_keyword_data(keyword):
+    """
+    Fetch keyword research data for a given keyword from the Google Ads API.
+    Returns a KeywordResult, or None if Google Ads had nothing for it.
+    """
+    return fetch_keyword_batch([keyword]).get(normalize_keyword(keyword))
+
+def fetch_keyword_batch(keywords, deadline=None):
+    """
+    Fetch keyword research data for several keywords with as few API
+    requests as possible, within ``deadline`` when one is given.
+    Returns a dictionary mapping each normalized keyword to its KeywordResult.
+    """
+    # Imported on first use so the Slack apps can start without google-ads
+    from google.ads.googleads.errors import GoogleAdsException
+
     try:
-        print(f"🔍 Researching keyword: {keyword}")
+        print(f"🔍 Researching {len(keywords)} keyword(s): {', '.join(keywords)}")
         print(f"📍 Location: UAE (geoTargetConstants/2840)")
         print(f"🌐 Language: English (languageConstants/1000)")
         
-        client = GoogleAdsClient.load_from_dict(GOOGLE_ADS_CONFIG)
-
-        service = client.get_service("KeywordPlanIdeaService")
+        # Shared per process: reuses the gRPC channel and cached access token
+        client = get_client()
+        service = get_service("KeywordPlanIdeaService")
 
-        request = client.get_type("GenerateKeywordIdeasRequest")
-        request.customer_id = CUSTOMER_ID
-        request.language = LANGUAGE_CODE
-        # Add UAE geo targeting using the correct resource name format
-        request.geo_target_constants.append(LOCATION_CODE)
-        request.keyword_plan_network = client.enums.KeywordPlanNetworkEnum[NETWORK_TYPE]
-        request.keyword_seed.keywords.append(keyword)
-
-        print(f"📡 Making API request...")
-        response = service.generate_keyword_ideas(request=request)
-        
-        # Convert to list to check length
-        ideas_list = list(response)
-        print(f"📊 Received {len(ideas_list)} keyword ideas")
-        
-        for idea in ideas_list:
-            print(f"🔍 Checking idea: '{idea.text}' (target: '{keyword}')")
-            if idea.text.lower() == keyword.lower():
-                metrics = idea.keyword_idea_metrics
-                print(f"✅ Found exact match! Avg searches: {metrics.avg_monthly_searches}")
-                
-                # Prepare monthly breakdown data
-                monthly_breakdown = {}
-                if metrics.monthly_search_volumes:
-                    month_names = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", 
-                                 "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
-                    
-                    for mv in metrics.monthly_search_volumes:
-                        # Handle the special case where 13 = January
-                        if mv.month == 13:
-                            month_name = "Jan"
-                        elif 1 <= mv.month <= 12:
-                            month_name = month_names[mv.month - 1]
-                        else:
-                            month_name = f"Unknown({mv.month})"
-                        
-                        monthly_breakdown[month_name] = mv.monthly_searches
-                
-                return {
-                    'keyword': idea.text,
-                    'avg_monthly_searches': metrics.avg_monthly_searches,
-                    'competition': metrics.competition.name,
-                    'monthly_breakdown': monthly_breakdown
-                }
-        
-        print(f"❌ No exact match found for '{keyword}'")
+        seeds = {normalize_keyword(keyword): keyword for keyword in keywords}
+        results = {}
+        if KEYWORD_LOOKUP_MODE == "historical":
+            # Ask for the exact phrases' metrics directly; cheap and small
+            results.update(_fetch_historical_metrics(client, service, seeds, deadline))
         
-        # If exact keyword not found, return the first few suggestions
-        suggestions = []
-        for idea in ideas_list[:5]:
-            suggestions.append({
-                'keyword': idea.text,
-                'avg_monthly_searches': idea.keyword_idea_metrics.avg_monthly_searches
-            })
+        # Only generate ideas for keywords that still need suggestions
+        remaining = {normalized: keyword for normalized, keyword in seeds.items()
+                     if normalized not in results}
+        if remaining:
+            results.update(_fetch_keyword_ideas(client, service, remaining, deadline))
         
-        print(f"💡 Found {len(suggestions)} suggestions")
-        return {
-            'keyword': keyword,
-            'exact_match': False,
-            'suggestions': suggestions
-        }
+        return results
 
     except GoogleAdsException as ex:
         print(f"❌ Google Ads API Error:")
@@ -88,31 +194,218 @@ def get_keyword_data(keyword):
         for error in ex.failure.errors:
             error_messages.append(f"{error.error_code}: {error.message}")
         raise Exception(f"Google Ads API error: {'; '.join(error_messages)}")
+    except (QuotaExhausted, CircuitOpen, DeadlineExceeded):
+        raise
     except Exception as e:
         print(f"❌ Unexpected error: {str(e)}")
         raise Exception(f"Error researching keyword: {str(e)}")
 
+def _call_api(method, request, deadline):
+    """Send one KeywordPlanIdeaService request through the breaker and quota governor
+
+    Waiting for quota is bounded by ``deadline`` and the governor's max_wait;
+    no request, whoever is waiting for it, may run longer than ADS_CALL_TIMEOUT.
+    """
+    return get_breaker().call(get_governor().call, _timed_call, method, request=request,
+                              deadline=deadline, call_timeout=ADS_CALL_TIMEOUT)
+
+def _timed_call(method, **kwargs):
+    """The API call itself, timed apart from any quota wait"""
+    with metrics.timed('ads_api_call'):
+        return method(**kwargs)
+
+def _fetch_historical_metrics(client, service, seeds, deadline=None):
+    """
+    Look up historical metrics for the exact seed phrases.
+    Returns results only for seeds that Google Ads has metrics for.
+    """
+    request = client.get_type("GenerateKeywordHistoricalMetricsRequest")
+    request.customer_id = CUSTOMER_ID
+    request.language = LANGUAGE_CODE
+    request.geo_target_constants.append(LOCATION_CODE)
+    request.keyword_plan_network = client.enums.KeywordPlanNetworkEnum[NETWORK_TYPE]
+    request.keywords.extend(seeds.values())
+
+    print(f"📡 Requesting historical metrics...")
+    response = _call_api(service.generate_keyword_historical_metrics, request, deadline)
+    
+    results = {}
+    with metrics.timed('ads_decode'):
+        for row in raw(response).results:
+            if not row.HasField("keyword_metrics"):
+                continue
+            # Google Ads folds close variants ("seo service") into one row
+            for text in [row.text, *row.close_variants]:
+                normalized = normalize_keyword(text)
+                if normalized in seeds and normalized not in results:
+                    results[normalized] = KeywordResult.from_metrics(row.text, row.keyword_metrics)
+                    print(f"✅ Found metrics for '{seeds[normalized]}'! Avg searches: {row.keyword_metrics.avg_monthly_searches}")
+    return results
+
+def _fetch_keyword_ideas(client, service, seeds, deadline=None):
+    """
+    Generate keyword ideas for the seeds, using an exact idea when there is one
+    and related suggestions otherwise.
+    """
+    request = _ideas_request(client, seeds.values())
+
+    print(f"📡 Making API request...")
+    response = _keyword_ideas(service, request, deadline)
+    
+    # Consume the pages lazily: pages are only fetched while we still need
+    # an exact match, and suggestions are kept in bounded heaps by volume
+    results = {}
+    related = {normalized: _TopIdeas(SUGGESTION_COUNT) for normalized in seeds}
+    fallback = _TopIdeas(SUGGESTION_COUNT)
+    seed_words = {normalized: set(normalized.split()) for normalized in seeds}
+    scanned = 0
+    # Includes fetching any further pages of the response
+    decode_started = time.perf_counter()
+    for idea in response:
+        scanned += 1
+        normalized = normalize_keyword(idea.text)
+        if normalized in seeds and normalized not in results:
+            results[normalized] = KeywordResult.from_metrics(idea.text, idea.keyword_idea_metrics)
+            related.pop(normalized, None)
+            print(f"✅ Found exact match for '{idea.text}'! Avg searches: {results[normalized].avg_monthly_searches}")
+            if not related:
+                break
+            continue
+        
+        volume = idea.keyword_idea_metrics.avg_monthly_searches
+        fallback.push(idea.text, volume)
+        words = set(normalized.split())
+        for seed, heap in related.items():
+            if len(seeds) == 1 or seed_words[seed] & words:
+                heap.push(idea.text, volume)
+        if scanned >= IDEAS_SCAN_LIMIT:
+            print(f"⏹️ Stopped after scanning {scanned} keyword ideas")
+            break
+    print(f"📊 Scanned {scanned} keyword ideas")
+    
+    for normalized, heap in related.items():
+        print(f"❌ No exact match found for '{seeds[normalized]}'")
+        
+        # If exact keyword not found, return the highest-volume related ideas
+        results[normalized] = KeywordResult.related(seeds[normalized], heap.items() or fallback.items())
+        print(f"💡 Found {len(results[normalized].suggestions)} suggestions")
+    metrics.observe('ads_decode', time.perf_counter() - decode_started)
+    
+    return results
+
+def _ideas_request(client, keywords):
+    """Build a GenerateKeywordIdeasRequest seeded with ``keywords``"""
+    request = client.get_type("GenerateKeywordIdeasRequest")
+    request.customer_id = CUSTOMER_ID
+    request.language = LANGUAGE_CODE
+    # Add UAE geo targeting using the correct resource name format
+    request.geo_target_constants.append(LOCATION_CODE)
+    request.keyword_plan_network = client.enums.KeywordPlanNetworkEnum[NETWORK_TYPE]
+    request.keyword_seed.keywords.extend(keywords)
+    if IDEAS_PAGE_SIZE:
+        request.page_size = IDEAS_PAGE_SIZE
+    return request
+
+def iter_keyword_ideas(keywords, deadline=None, limit=IDEAS_SCAN_LIMIT):
+    """
+    Yield every idea Google Ads generates for up to 20 seed keywords as
+    ``(text, avg_monthly_searches, competition)``, stopping after ``limit``.
+    One request per page, each sent through the circuit breaker and quota governor.
+    """
+    client = get_client()
+    service = get_service("KeywordPlanIdeaService")
+    response = _keyword_ideas(service, _ideas_request(client, keywords), deadline)
+    for scanned, idea in enumerate(response, 1):
+        idea_metrics = idea.keyword_idea_metrics
+        yield idea.text, idea_metrics.avg_monthly_searches, competition_name(idea_metrics.competition)
+        if scanned >= limit:
+            break
+
+def _keyword_ideas(service, request, deadline):
+    """
+    Send a GenerateKeywordIdeas request and return an iterator over the raw
+    ideas of every page. Further pages are requested with their page_token
+    only as the iterator reaches them, each through _call_api, so every
+    page waits for quota, passes the breaker and gets its own timeout.
+    """
+    return _pages(_call_api(service.generate_keyword_ideas, request, deadline), service, request, deadline)
+
+def _pages(page, service, request, deadline):
+    while True:
+        # Read the raw messages; proto-plus would wrap every nested field
+        for idea in page.results:
+            yield raw(idea)
+        if not page.next_page_token:
+            return
+        request.page_token = page.next_page_token
+        page = _call_api(service.generate_keyword_ideas, request, deadline)
+
+class _TopIdeas:
+    """Bounded min-heap keeping the ``size`` highest-volume ideas seen"""
+
+    def __init__(self, size):
+        self.size = size
+        self._heap = []
+        self._pushed = 0
+
+    def push(self, text, volume):
+        if len(self._heap) >= self.size and volume <= self._heap[0][0]:
+            return
+        if any(entry[2] == text for entry in self._heap):
+            return
+        # The push counter keeps ties in arrival order
+        self._pushed += 1
+        entry = (volume, -self._pushed, text)
+        if len(self._heap) < self.size:
+            heapq.heappush(self._heap, entry)
+        else:
+            heapq.heapreplace(self._heap, entry)
+
+    def items(self):
+        """Return ``(text, volume)`` pairs, highest volume first"""
+        return [(text, volume) for volume, _, text in sorted(self._heap, reverse=True)]
+
+# Lookups arriving within a short window share one multi-seed API request
+_batcher = KeywordBatcher(fetch_keyword_batch)
+metrics.gauge('batch_pending', lambda: _batcher.stats()['pending'])
+
 def main():
     """Command line interface for keyword research"""
-    # Get keyword from command line argument or use default
-    keyword = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_KEYWORD
+    parser = argparse.ArgumentParser(description="Google Ads keyword research")
+    parser.add_argument('keyword', nargs='?', default=DEFAULT_KEYWORD, help="keyword to research")
+    parser.add_argument('-i', '--input', help="research every keyword in this file, one per line ('-' for stdin)")
+    parser.add_argument('-o', '--output', default='-', help="bulk results file; re-running resumes it (default: stdout)")
+    parser.add_argument('-f', '--format', choices=('jsonl', 'csv'), help="bulk output format (default: from --output, else jsonl)")
+    parser.add_argument('-w', '--workers', type=int, default=BULK_WORKERS, help="lookups in flight in bulk mode")
+    args = parser.parse_args()
+    
+    if args.input:
+        from bulk_research import run_bulk
+        fmt = args.format or ('csv' if args.output.endswith('.csv') else 'jsonl')
+        if args.input == '-':
+            run_bulk(sys.stdin, args.output, fmt, args.workers)
+        else:
+            with open(args.input, encoding='utf-8') as lines:
+                run_bulk(lines, args.output, fmt, args.workers)
+        return
     
+    keyword = args.keyword
     try:
         data = get_keyword_data(keyword)
         
-        if data.get('exact_match', True):
-            print(f"Keyword: {data['keyword']}")
-            print(f"Avg monthly searches: {data['avg_monthly_searches']}")
-            print(f"Competition: {data['competition']}")
+        if data.exact_match:
+            print(f"Keyword: {data.keyword}")
+            print(f"Avg monthly searches: {data.avg_monthly_searches}")
+            print(f"Competition: {data.competition}")
             
-            if data.get('monthly_breakdown'):
+            if data.monthly is not None:
                 print("\nMonthly breakdown:")
-                for month, searches in data['monthly_breakdown'].items():
-                    print(f"{month}: {searches}")
+                for year, month, searches in data.monthly.months():
+                    print(f"{MONTH_NAMES[month - 1]} {year}: {searches}")
         else:
             print(f"Exact keyword '{keyword}' not returned. Here are some close ideas:")
-            for suggestion in data.get('suggestions', []):
-                print(f"{suggestion['keyword']}: {suggestion['avg_monthly_searches']}")
+            for suggestion in data.suggestions:
+                print(f"{suggestion.keyword}: {suggestion.avg_monthly_searches}")
     
     except Exception as e:
         print(f"Error: {str(e)}")
@@ -0,0 +1,119 @@
+"""
+Keyword research result model
+One compact, slotted object per researched keyword, shared by the Slack
+apps, the CLI, the in-memory cache and the on-disk store. It is built
+straight from the raw protobuf messages behind the proto-plus wrappers, so a
+response is read field by field without wrapping every nested message, and
+it keeps monthly volumes as an array rather than per-month objects.
+"""
+
+from collections import namedtuple
+
+from monthly_series import MonthlySeries, month_label, parse_month
+
+# KeywordPlanCompetitionLevelEnum values, indexed by number
+COMPETITION_LEVELS = ('UNSPECIFIED', 'UNKNOWN', 'LOW', 'MEDIUM', 'HIGH')
+
+Suggestion = namedtuple('Suggestion', ['keyword', 'avg_monthly_searches'])
+
+
+def raw(message):
+    """The protobuf message behind a proto-plus wrapper (or ``message`` itself)"""
+    pb = getattr(type(message), 'pb', None)
+    return pb(message) if pb is not None else message
+
+
+def competition_name(level):
+    """Name for a KeywordPlanCompetitionLevelEnum number"""
+    level = int(level)
+    return COMPETITION_LEVELS[level] if 0 <= level < len(COMPETITION_LEVELS) else 'UNKNOWN'
+
+
+class KeywordResult:
+    """
+    Research result for one keyword.
+    With ``exact_match`` the keyword's own metrics are set; otherwise only
+    ``suggestions`` (related ideas, highest volume first) are.
+    """
+
+    __slots__ = ('keyword', 'exact_match', 'avg_monthly_searches', 'competition', 'monthly', 'suggestions')
+
+    def __init__(self, keyword, exact_match=True, avg_monthly_searches=None, competition=None,
+                 monthly=None, suggestions=()):
+        self.keyword = keyword
+        self.exact_match = exact_match
+        self.avg_monthly_searches = avg_monthly_searches
+        self.competition = competition
+        self.monthly = monthly
+        self.suggestions = tuple(suggestions)
+
+    @classmethod
+    def from_metrics(cls, text, metrics):
+        """Build from a KeywordPlanHistoricalMetrics message (proto-plus or raw)"""
+        metrics = raw(metrics)
+        return cls(text, True, metrics.avg_monthly_searches, competition_name(metrics.competition),
+                   MonthlySeries.from_volumes(metrics.monthly_search_volumes))
+
+    @classmethod
+    def related(cls, keyword, ideas):
+        """Result for a keyword without metrics of its own: ``(text, volume)`` ideas"""
+        return cls(keyword, False, suggestions=(Suggestion(text, volume) for text, volume in ideas))
+
+    def __eq__(self, other):
+        if not isinstance(other, KeywordResult):
+            return NotImplemented
+        return self.to_row() == other.to_row()
+
+    def __repr__(self):
+        if self.exact_match:
+            return f"KeywordResult({self.keyword!r}, avg_monthly_searches={self.avg_monthly_searches})"
+        return f"KeywordResult({self.keyword!r}, suggestions={len(self.suggestions)})"
+
+    def to_dict(self):
+        """Readable form for JSON output files"""
+        if not self.exact_match:
+            return {
+                'keyword': self.keyword,
+                'exact_match': False,
+                'suggestions': [suggestion._asdict() for suggestion in self.suggestions],
+            }
+        return {
+            'keyword': self.keyword,
+            'exact_match': True,
+            'avg_monthly_searches': self.avg_monthly_searches,
+            'competition': self.competition,
+            'monthly_searches': self.monthly.to_dict() if self.monthly is not None else None,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """Inverse of to_dict; also reads results written before this model existed"""
+        if data.get('exact_match', True) is False:
+            return cls.related(data['keyword'], ((suggestion['keyword'], suggestion['avg_monthly_searches'])
+                                                 for suggestion in data.get('suggestions', [])))
+        monthly = data.get('monthly_searches')
+        return cls(data['keyword'], True, data.get('avg_monthly_searches'), data.get('competition'),
+                   MonthlySeries.from_dict(monthly) if monthly else None)
+
+    def to_row(self):
+        """Positional list for the on-disk store; cheaper to encode than to_dict"""
+        monthly = self.monthly
+        return [self.keyword, self.exact_match, self.avg_monthly_searches, self.competition,
+                month_label(monthly.start) if monthly is not None else None,
+                monthly.counts.tolist() if monthly is not None else None,
+                [list(suggestion) for suggestion in self.suggestions]]
+
+    @classmethod
+    def from_row(cls, row):
+        """Inverse of to_row"""
+        keyword, exact_match, searches, competition, start, counts, suggestions = row
+        monthly = MonthlySeries(parse_month(start), counts) if start is not None else None
+        return cls(keyword, exact_match, searches, competition, monthly,
+                   (Suggestion(text, volume) for text, volume in suggestions))
+
+
+def decode(value):
+    """Result from a decoded JSON store value: a to_row list or an older dict"""
+    if isinstance(value, list):
+        return KeywordResult.from_row(value)
+    return KeywordResult.from_dict(value)
@@ -0,0 +1,182 @@
+"""
+Persistent keyword result store
+SQLite (WAL mode) file holding KeywordResult rows (compact JSON lists) with
+the time they were fetched, so every gunicorn worker and every restart can reuse
+lookups already paid for. Compaction keeps the file bounded.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+import keyword_result
+import metrics
+from config import (KEYWORD_STORE_MAX_AGE, KEYWORD_STORE_MAX_ENTRIES, KEYWORD_STORE_PATH,
+                    KEYWORD_STORE_TTL)
+
+logger = logging.getLogger(__name__)
+
+
+class KeywordStore:
+    """On-disk map of cache key -> result with per-entry freshness"""
+
+    # Compact roughly once every this many writes
+    COMPACT_EVERY = 500
+
+    def __init__(self, path, ttl=KEYWORD_STORE_TTL, max_age=KEYWORD_STORE_MAX_AGE,
+                 max_entries=KEYWORD_STORE_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_age = max_age
+        self.max_entries = max_entries
+        self.started_at = time.time()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._stats = {
+            'reads': 0,
+            'hits': 0,
+            'warm_start_hits': 0,
+            'expired': 0,
+            'misses': 0,
+            'writes': 0,
+            'compactions': 0,
+            'errors': 0,
+        }
+        conn = self._connect()
+        # auto_vacuum must be chosen before the first table is created
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("PRAGMA journal_mode=WAL")
+        with conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS keyword_results ("
+                "key TEXT PRIMARY KEY, keyword TEXT NOT NULL, result TEXT NOT NULL, "
+                "fetched_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS keyword_results_accessed ON keyword_results (accessed_at)")
+
+    def _connect(self):
+        """One connection per thread and process; never reuse one across fork"""
+        pid = os.getpid()
+        if getattr(self._local, 'pid', None) != pid:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = pid
+        return self._local.conn
+
+    def get(self, key, ttl=None):
+        """Return the stored result for ``key`` if it is still fresh, else None
+
+        A larger ``ttl`` than the store's own lets callers accept stale results.
+        """
+        ttl = self.ttl if ttl is None else ttl
+        now = time.time()
+        try:
+            conn = self._connect()
+            row = conn.execute("SELECT result, fetched_at, accessed_at FROM keyword_results WHERE key = ?",
+                               (_key_text(key),)).fetchone()
+            # Touch for LRU compaction, but at most hourly so reads stay reads
+            if row is not None and now - row[1] <= ttl and now - row[2] > 3600:
+                with conn:
+                    conn.execute("UPDATE keyword_results SET accessed_at = ? WHERE key = ?",
+                                 (now, _key_text(key)))
+        except sqlite3.Error as e:
+            self._count('errors')
+            logger.error(f"Keyword store read failed: {str(e)}")
+            return None
+
+        self._count('reads')
+        if row is None:
+            self._count('misses')
+            return None
+        if now - row[1] > ttl:
+            self._count('expired')
+            return None
+        self._count('hits')
+        if row[1] < self.started_at:
+            self._count('warm_start_hits')
+        return keyword_result.decode(json.loads(row[0]))
+
+    def set(self, key, result):
+        """Store ``result`` for ``key`` (ignores None results)"""
+        if result is None:
+            return
+        now = time.time()
+        try:
+            conn = self._connect()
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO keyword_results (key, keyword, result, fetched_at, accessed_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (_key_text(key), key[-1], json.dumps(result.to_row(), separators=(',', ':')), now, now)
+                )
+        except sqlite3.Error as e:
+            self._count('errors')
+            logger.error(f"Keyword store write failed: {str(e)}")
+            return
+
+        with self._lock:
+            self._stats['writes'] += 1
+            self._writes += 1
+            compact = self._writes % self.COMPACT_EVERY == 0
+        if compact:
+            self.compact()
+
+    def compact(self):
+        """Drop entries past max_age, trim to max_entries and release free pages"""
+        now = time.time()
+        try:
+            conn = self._connect()
+            with conn:
+                expired = conn.execute("DELETE FROM keyword_results WHERE fetched_at < ?",
+                                       (now - self.max_age,)).rowcount
+                trimmed = conn.execute(
+                    "DELETE FROM keyword_results WHERE key IN ("
+                    "SELECT key FROM keyword_results ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,)
+                ).rowcount
+            conn.execute("PRAGMA incremental_vacuum")
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        except sqlite3.Error as e:
+            self._count('errors')
+            logger.error(f"Keyword store compaction failed: {str(e)}")
+            return
+        self._count('compactions')
+        logger.info(f"Compacted keyword store: {expired} expired, {trimmed} over the {self.max_entries} cap")
+
+    def _count(self, name):
+        metrics.inc(f"keyword_store_{name}")
+        with self._lock:
+            self._stats[name] += 1
+
+    def stats(self):
+        """Return read/write counters and the warm-start hit rate"""
+        with self._lock:
+            stats = dict(self._stats)
+        stats['hit_rate'] = round(stats['hits'] / stats['reads'], 4) if stats['reads'] else 0
+        stats['warm_start_hit_rate'] = round(stats['warm_start_hits'] / stats['reads'], 4) if stats['reads'] else 0
+        try:
+            stats['entries'] = self._connect().execute("SELECT COUNT(*) FROM keyword_results").fetchone()[0]
+        except sqlite3.Error:
+            stats['entries'] = None
+        return stats
+
+
+def _key_text(key):
+    """Cache keys are tuples; store them as one delimited string"""
+    return "|".join(key)
+
+
+def create_keyword_store(path=KEYWORD_STORE_PATH):
+    """Open the configured store, or return None when it is disabled"""
+    if not path:
+        return None
+    try:
+        return KeywordStore(path)
+    except sqlite3.Error as e:
+        logger.error(f"Cannot open keyword store {path!r}: {str(e)}; continuing without it")
+        return None
@@ -0,0 +1,329 @@
+"""
+Hot-path metrics
+Per-stage latency histograms, counters and gauges, exported in the
+Prometheus text format on /metrics. Every thread writes to its own shard, so
+recording a value takes no lock. Shards are summed when a snapshot is taken.
+With METRICS_DIR set, each worker process also writes its snapshot to a file
+there, and /metrics adds up the files of every gunicorn worker. When a
+worker exits, the gunicorn master folds its file into one file of dead-worker
+totals and removes it.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from config import METRICS_DIR, METRICS_FLUSH_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+PREFIX = 'keyword_bot'
+
+# Totals of exited workers, written by the gunicorn master (child_exit)
+DEAD_FILE = 'metrics-dead.json'
+
+
+class _Shard:
+    """One thread's counters and histograms; only that thread writes to it"""
+
+    __slots__ = ('thread', 'counters', 'histograms')
+
+    def __init__(self, thread):
+        self.thread = thread
+        self.counters = {}
+        # stage -> per-bucket counts, the +Inf count, then the sum of seconds
+        self.histograms = {}
+
+
+class Metrics:
+    """Lock-free recording, snapshot on demand, optional cross-process files"""
+
+    def __init__(self, directory=METRICS_DIR, flush_interval=METRICS_FLUSH_INTERVAL,
+                 buckets=LATENCY_BUCKETS):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.buckets = tuple(buckets)
+        self._gauges = {}
+        self._reset()
+
+    def _reset(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._shards = []
+        # Totals of threads that have exited
+        self._retired = _Shard(None)
+        self._pid = os.getpid()
+        # Part of the file name, so a worker that reuses a dead one's pid gets its own file
+        self._started = time.time_ns()
+        self._flusher_started = False
+
+    def _shard(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._local.shard = _Shard(threading.current_thread())
+            with self._lock:
+                self._shards.append(shard)
+                start_flusher = self.directory and not self._flusher_started
+                self._flusher_started = True
+            if start_flusher:
+                threading.Thread(target=self._flush_loop, name="metrics-flush", daemon=True).start()
+        return shard
+
+    def inc(self, name, amount=1):
+        """Add ``amount`` to counter ``name``"""
+        counters = self._shard().counters
+        counters[name] = counters.get(name, 0) + amount
+
+    def observe(self, stage, seconds):
+        """Record one ``stage`` duration"""
+        histograms = self._shard().histograms
+        histogram = histograms.get(stage)
+        if histogram is None:
+            histogram = histograms[stage] = [0] * (len(self.buckets) + 1) + [0.0]
+        histogram[bisect_left(self.buckets, seconds)] += 1
+        histogram[-1] += seconds
+
+    @contextmanager
+    def timed(self, stage):
+        """Time the ``with`` block as one ``stage`` observation"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - started)
+
+    def gauge(self, name, read):
+        """Report ``read()`` as gauge ``name`` whenever a snapshot is taken"""
+        self._gauges[name] = read
+
+    def snapshot(self):
+        """This process's totals: counters, histograms and current gauges"""
+        with self._lock:
+            live = []
+            for shard in self._shards:
+                if shard.thread.is_alive():
+                    live.append(shard)
+                else:
+                    _merge(self._retired.counters, self._retired.histograms,
+                           shard.counters, shard.histograms)
+            self._shards = live
+            counters = dict(self._retired.counters)
+            histograms = {stage: list(values) for stage, values in self._retired.histograms.items()}
+        for shard in live:
+            # dict() and list() copies are atomic under the GIL
+            _merge(counters, histograms, dict(shard.counters),
+                   {stage: list(values) for stage, values in dict(shard.histograms).items()})
+        gauges = {}
+        for name, read in list(self._gauges.items()):
+            try:
+                gauges[name] = read()
+            except Exception as e:
+                logger.debug(f"Gauge {name} failed: {str(e)}")
+        return {'pid': os.getpid(), 'buckets': self.buckets, 'counters': counters,
+                'histograms': histograms, 'gauges': gauges}
+
+    def flush(self):
+        """Write this process's snapshot to METRICS_DIR (no-op without one)"""
+        if not self.directory:
+            return
+        snapshot = self.snapshot()
+        self._write(f"metrics-{snapshot['pid']}-{self._started}.json", snapshot)
+
+    def _write(self, name, data):
+        path = os.path.join(self.directory, name)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(f"{path}.tmp", 'w', encoding='utf-8') as f:
+                json.dump(data, f, separators=(',', ':'))
+            os.replace(f"{path}.tmp", path)
+        except OSError as e:
+            logger.error(f"Could not write metrics to {path}: {str(e)}")
+
+    def _read(self, name):
+        """A snapshot file's contents, or None if it is gone, torn or has other buckets"""
+        try:
+            with open(os.path.join(self.directory, name), encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if tuple(data.get('buckets', ())) != self.buckets:
+            return None
+        return data
+
+    def _worker_files(self):
+        try:
+            return [name for name in os.listdir(self.directory)
+                    if name.startswith('metrics-') and name.endswith('.json') and name != DEAD_FILE]
+        except OSError:
+            return []
+
+    def mark_process_dead(self, pid):
+        """Fold an exited worker's files into the dead-worker totals, then remove them
+
+        Runs in the gunicorn master after the worker was reaped, so no new
+        worker can hold ``pid`` yet. The folded file names are kept with the
+        totals: a collect() that listed a file just before it was removed
+        skips it instead of counting it twice.
+        """
+        if not self.directory:
+            return
+        names = self._worker_files()
+        mine = [name for name in names if name.startswith(f"metrics-{pid}-")]
+        if not mine:
+            return
+        dead = self._read(DEAD_FILE) or {'counters': {}, 'histograms': {}, 'folded': [], 'generation': 0}
+        folded = set(dead['folded'])
+        for name in mine:
+            snapshot = self._read(name)
+            if name not in folded and snapshot is not None:
+                _merge(dead['counters'], dead['histograms'], snapshot['counters'], snapshot['histograms'])
+        # Names whose files are gone can no longer be double counted
+        dead['folded'] = [name for name in dead['folded'] if name in names] + \
+            [name for name in mine if name not in folded]
+        dead['generation'] += 1
+        dead['buckets'] = self.buckets
+        self._write(DEAD_FILE, dead)
+        for name in mine:
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def collect(self):
+        """Totals over every worker process that wrote to METRICS_DIR"""
+        if not self.directory:
+            snapshot = self.snapshot()
+            snapshot['processes'] = 1
+            return snapshot
+        self.flush()
+        for _ in range(3):
+            dead = self._read(DEAD_FILE) or {'counters': {}, 'histograms': {}, 'folded': [], 'generation': 0}
+            folded = set(dead['folded'])
+            snapshots = [self._read(name) for name in self._worker_files() if name not in folded]
+            # A worker folded in meanwhile may be missing from both; read again
+            again = self._read(DEAD_FILE)
+            if (again['generation'] if again else 0) == dead['generation']:
+                break
+        counters, histograms, gauges, processes = {}, {}, {}, 0
+        # Exited workers still count towards counters, which must never go down
+        _merge(counters, histograms, dead['counters'], dead['histograms'])
+        for snapshot in snapshots:
+            if snapshot is None:
+                continue
+            _merge(counters, histograms, snapshot['counters'], snapshot['histograms'])
+            if _alive(snapshot['pid']):
+                processes += 1
+                for gauge, value in snapshot['gauges'].items():
+                    gauges[gauge] = gauges.get(gauge, 0) + value
+        return {'buckets': self.buckets, 'counters': counters, 'histograms': histograms,
+                'gauges': gauges, 'processes': processes}
+
+    def _after_fork(self):
+        """A forked worker starts from zero; the parent keeps its own totals"""
+        self._reset()
+
+
+def _merge(counters, histograms, more_counters, more_histograms):
+    for name, value in more_counters.items():
+        counters[name] = counters.get(name, 0) + value
+    for stage, values in more_histograms.items():
+        total = histograms.get(stage)
+        if total is None:
+            histograms[stage] = list(values)
+        else:
+            for i, value in enumerate(values):
+                total[i] += value
+
+
+def _alive(pid):
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def render(snapshot):
+    """Prometheus text exposition of a snapshot or collect() result"""
+    lines = [f"# TYPE {PREFIX}_stage_seconds histogram"]
+    bounds = [str(bound) for bound in snapshot['buckets']] + ['+Inf']
+    for stage, values in sorted(snapshot['histograms'].items()):
+        cumulative = 0
+        for bound, count in zip(bounds, values):
+            cumulative += count
+            lines.append(f'{PREFIX}_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+        lines.append(f'{PREFIX}_stage_seconds_sum{{stage="{stage}"}} {values[-1]:.6f}')
+        lines.append(f'{PREFIX}_stage_seconds_count{{stage="{stage}"}} {cumulative}')
+    for name, value in sorted(snapshot['counters'].items()):
+        lines.append(f"# TYPE {PREFIX}_{name}_total counter")
+        lines.append(f"{PREFIX}_{name}_total {value}")
+    gauges = dict(snapshot['gauges'], processes=snapshot.get('processes', 1))
+    for name, value in sorted(gauges.items()):
+        lines.append(f"# TYPE {PREFIX}_{name} gauge")
+        lines.append(f"{PREFIX}_{name} {value}")
+    return "\n".join(lines) + "\n"
+
+
+_metrics = Metrics()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_metrics._after_fork)
+
+# Content type Prometheus expects from a text-format scrape
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def inc(name, amount=1):
+    """Add to a process-wide counter"""
+    _metrics.inc(name, amount)
+
+
+def observe(stage, seconds):
+    """Record a stage duration in the process-wide histograms"""
+    _metrics.observe(stage, seconds)
+
+
+def timed(stage):
+    """Context manager timing a block as one ``stage`` observation"""
+    return _metrics.timed(stage)
+
+
+def gauge(name, read):
+    """Register a callable reported as a gauge on every scrape"""
+    _metrics.gauge(name, read)
+
+
+def flush():
+    """Write this worker's totals to METRICS_DIR now (gunicorn worker_exit)"""
+    _metrics.flush()
+
+
+def mark_process_dead(pid):
+    """Fold a reaped worker's totals into METRICS_DIR's dead-worker file (gunicorn child_exit)"""
+    _metrics.mark_process_dead(pid)
+
+
+def totals():
+    """Totals over all workers as a dictionary (what /metrics renders)"""
+    return _metrics.collect()
+
+
+def metrics_text():
+    """The /metrics response body: totals over all workers"""
+    return render(_metrics.collect())
@@ -0,0 +1,105 @@
+"""
+Monthly search volume series
+Google Ads reports up to 24 months of volumes as (year, MonthOfYear) pairs.
+A MonthlySeries keeps them as one dense array of counts starting at a known
+year-month, so months of different years never collide and results stay
+small when cached or stored as JSON.
+"""
+
+from array import array
+
+MONTH_NAMES = ["Jan", "Feb", "Mar", "Apr", "May", "Jun",
+               "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
+
+# Count recorded for a month inside the series that Google Ads did not report
+MISSING = -1
+
+# MonthOfYearEnum: UNSPECIFIED = 0, UNKNOWN = 1, JANUARY = 2 ... DECEMBER = 13
+_ENUM_JANUARY = 2
+_ENUM_DECEMBER = 13
+
+
+def calendar_month(month_of_year):
+    """Calendar month (1-12) for a MonthOfYearEnum value, or None"""
+    value = int(month_of_year)
+    if _ENUM_JANUARY <= value <= _ENUM_DECEMBER:
+        return value - _ENUM_JANUARY + 1
+    return None
+
+
+def month_index(year, month):
+    """Months since year 0 for a calendar ``month`` (1-12); consecutive months differ by one"""
+    return year * 12 + month - 1
+
+
+def month_label(index):
+    """``'2025-01'`` style label for a month index"""
+    year, month = divmod(index, 12)
+    return f"{year:04d}-{month + 1:02d}"
+
+
+def parse_month(label):
+    """Month index for a ``'2025-01'`` style label"""
+    year, month = label.split('-')
+    return month_index(int(year), int(month))
+
+
+class MonthlySeries:
+    """Search counts for consecutive months starting at month index ``start``"""
+
+    __slots__ = ('start', 'counts')
+
+    def __init__(self, start, counts):
+        self.start = start
+        self.counts = array('q', counts)
+
+    @classmethod
+    def from_volumes(cls, monthly_search_volumes):
+        """Build from a repeated MonthlySearchVolume field; None when it has no usable months"""
+        by_month = {}
+        for volume in monthly_search_volumes:
+            month = calendar_month(volume.month)
+            if month is None or not volume.year:
+                continue
+            by_month[month_index(volume.year, month)] = volume.monthly_searches
+        if not by_month:
+            return None
+        start, end = min(by_month), max(by_month)
+        return cls(start, [by_month.get(index, MISSING) for index in range(start, end + 1)])
+
+    @classmethod
+    def from_dict(cls, data):
+        """Inverse of to_dict"""
+        return cls(parse_month(data['start']), data['counts'])
+
+    def to_dict(self):
+        """Compact JSON-safe form kept in results: first month and the counts"""
+        return {'start': month_label(self.start), 'counts': self.counts.tolist()}
+
+    @property
+    def end(self):
+        """Month index of the last month"""
+        return self.start + len(self.counts) - 1
+
+    def __len__(self):
+        return len(self.counts)
+
+    def __eq__(self, other):
+        if not isinstance(other, MonthlySeries):
+            return NotImplemented
+        return self.start == other.start and self.counts == other.counts
+
+    def __repr__(self):
+        return f"MonthlySeries({month_label(self.start)!r}, {self.counts.tolist()!r})"
+
+    def months(self):
+        """Yield ``(year, month, count)`` oldest first, skipping missing months"""
+        for offset, count in enumerate(self.counts):
+            if count != MISSING:
+                year, month = divmod(self.start + offset, 12)
+                yield year, month + 1, count
+
+    def last(self, n):
+        """The series cut down to its most recent ``n`` months"""
+        counts = self.counts[-n:] if n else self.counts[:0]
+        return MonthlySeries(self.end - len(counts) + 1, counts)
@@ -0,0 +1,257 @@
+"""
+Google Ads quota governor
+Every KeywordPlanIdeaService call goes through one per-process governor that
+enforces a requests-per-second token bucket and a daily request budget. Calls
+over the limit wait their turn instead of failing, and RESOURCE_EXHAUSTED
+answers pause all callers with a jittered, growing backoff while the rate is
+cut and then slowly restored.
+"""
+
+import logging
+import os
+import random
+import threading
+import time
+
+import metrics
+from config import (ADS_BACKOFF_BASE, ADS_BACKOFF_MAX, ADS_DAILY_BUDGET, ADS_QUOTA_BURST,
+                    ADS_QUOTA_MAX_RETRIES, ADS_QUOTA_MAX_WAIT, ADS_QUOTA_RPS)
+from deadlines import check
+
+logger = logging.getLogger(__name__)
+
+# The rate never drops below this fraction of the configured rate
+MIN_RATE_FACTOR = 0.1
+
+# Each successful call wins back this fraction of the configured rate
+RATE_RECOVERY_STEP = 0.05
+
+
+class QuotaExhausted(Exception):
+    """Raised when a call cannot be sent within the allowed wait"""
+
+
+class QuotaGovernor:
+    """Thread-safe token bucket + daily budget with adaptive backoff"""
+
+    def __init__(self, rate=ADS_QUOTA_RPS, burst=ADS_QUOTA_BURST, daily_budget=ADS_DAILY_BUDGET,
+                 max_wait=ADS_QUOTA_MAX_WAIT, max_retries=ADS_QUOTA_MAX_RETRIES,
+                 backoff_base=ADS_BACKOFF_BASE, backoff_max=ADS_BACKOFF_MAX,
+                 clock=time.monotonic, wall_clock=time.time):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.daily_budget = daily_budget
+        self.max_wait = max_wait
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._clock = clock
+        self._wall_clock = wall_clock
+        self._cond = threading.Condition()
+        self._current_rate = rate
+        self._tokens = float(self.burst)
+        self._refilled_at = clock()
+        self._paused_until = 0.0
+        self._day = self._today()
+        self._used_today = 0
+        self._waiting = 0
+        self._stats = {
+            'calls': 0,
+            'throttled': 0,
+            'quota_errors': 0,
+            'retries': 0,
+            'rejected': 0,
+            'wait_seconds_total': 0.0,
+        }
+
+    def call(self, fn, *args, deadline=None, call_timeout=None, **kwargs):
+        """Send ``fn(*args, **kwargs)`` under the quota, retrying quota errors
+
+        Waiting and sending have separate budgets. The wait for quota
+        (backoff after quota errors included) is bounded by ``max_wait`` and
+        by ``deadline``. The request itself gets ``call_timeout`` seconds as
+        its gRPC ``timeout``, cut short by whatever is left of ``deadline``.
+        """
+        for attempt in range(self.max_retries + 1):
+            left = check(deadline, "Google Ads quota")
+            self.acquire(self.max_wait if left is None else min(self.max_wait, left))
+            timeouts = [timeout for timeout in (check(deadline, "Google Ads"), call_timeout) if timeout]
+            if timeouts:
+                kwargs['timeout'] = min(timeouts)
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                if not is_quota_error(e):
+                    raise
+                delay = self._on_quota_error(attempt, retry_delay(e))
+                if attempt == self.max_retries:
+                    raise
+                metrics.inc('ads_quota_retries')
+                with self._cond:
+                    self._stats['retries'] += 1
+                logger.warning(f"Google Ads quota exhausted; retrying in {delay:.1f}s "
+                               f"(attempt {attempt + 1} of {self.max_retries})")
+                continue
+            self._on_success()
+            return result
+
+    def acquire(self, max_wait=None):
+        """Block until one request may be sent; raise QuotaExhausted on timeout"""
+        max_wait = self.max_wait if max_wait is None else max_wait
+        started = self._clock()
+        throttled = False
+        with self._cond:
+            self._waiting += 1
+            try:
+                while True:
+                    now = self._clock()
+                    wait = self._wait_needed(now)
+                    if wait <= 0:
+                        self._tokens -= 1
+                        self._used_today += 1
+                        self._stats['calls'] += 1
+                        self._stats['wait_seconds_total'] += now - started
+                        metrics.observe('ads_quota_wait', now - started)
+                        return
+                    if now + wait - started > max_wait:
+                        self._stats['rejected'] += 1
+                        metrics.inc('ads_quota_rejected')
+                        raise QuotaExhausted(self._exhausted_reason(wait))
+                    if not throttled:
+                        throttled = True
+                        self._stats['throttled'] += 1
+                    self._cond.wait(wait)
+            finally:
+                self._waiting -= 1
+
+    def _wait_needed(self, now):
+        """Seconds until a request may go out; 0 when one can go now (lock held)"""
+        today = self._today()
+        if today != self._day:
+            self._day = today
+            self._used_today = 0
+        if self.daily_budget and self._used_today >= self.daily_budget:
+            return self._seconds_until_reset()
+
+        self._tokens = min(self.burst, self._tokens + (now - self._refilled_at) * self._current_rate)
+        self._refilled_at = now
+        if now < self._paused_until:
+            return self._paused_until - now
+        if self._tokens >= 1:
+            return 0
+        return (1 - self._tokens) / self._current_rate
+
+    def _exhausted_reason(self, wait):
+        if self.daily_budget and self._used_today >= self.daily_budget:
+            return f"Google Ads daily budget of {self.daily_budget} requests is used up"
+        return f"Google Ads quota is busy; next request slot in {wait:.0f}s"
+
+    def _on_quota_error(self, attempt, server_delay=None):
+        """Pause every caller and cut the rate; returns the pause in seconds"""
+        backoff = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        # Equal jitter keeps some pause while spreading retries from many workers
+        delay = backoff / 2 + random.uniform(0, backoff / 2)
+        if server_delay:
+            delay = max(delay, server_delay)
+        metrics.inc('ads_quota_errors')
+        with self._cond:
+            self._stats['quota_errors'] += 1
+            self._paused_until = max(self._paused_until, self._clock() + delay)
+            self._current_rate = max(self.rate * MIN_RATE_FACTOR, self._current_rate / 2)
+            self._tokens = min(self._tokens, 0)
+        return delay
+
+    def _on_success(self):
+        with self._cond:
+            if self._current_rate < self.rate:
+                self._current_rate = min(self.rate, self._current_rate + self.rate * RATE_RECOVERY_STEP)
+
+    def _today(self):
+        """Budget day; resets at midnight UTC"""
+        return int(self._wall_clock() // 86400)
+
+    def _seconds_until_reset(self):
+        return (self._day + 1) * 86400 - self._wall_clock()
+
+    def remaining_today(self):
+        """Requests left in today's budget, or None when it is unlimited"""
+        with self._cond:
+            if not self.daily_budget:
+                return None
+            if self._today() != self._day:
+                return self.daily_budget
+            return max(0, self.daily_budget - self._used_today)
+
+    def _after_fork(self):
+        """Re-create the condition in the child; a parent thread may have held it"""
+        self._cond = threading.Condition()
+        self._waiting = 0
+
+    def stats(self):
+        """Return limits, remaining budget and throttling counters"""
+        remaining = self.remaining_today()
+        with self._cond:
+            stats = dict(self._stats)
+            stats['wait_seconds_total'] = round(stats['wait_seconds_total'], 3)
+            stats['rate'] = self.rate
+            stats['current_rate'] = round(self._current_rate, 3)
+            stats['daily_budget'] = self.daily_budget or None
+            stats['used_today'] = self._used_today if self._today() == self._day else 0
+            stats['remaining_today'] = remaining
+            stats['waiting'] = self._waiting
+            stats['paused_seconds'] = round(max(0.0, self._paused_until - self._clock()), 3)
+        return stats
+
+
+def is_quota_error(error):
+    """Whether ``error`` is a Google Ads / gRPC RESOURCE_EXHAUSTED failure"""
+    call = getattr(error, 'error', error)
+    code = getattr(call, 'code', None)
+    if callable(code):
+        try:
+            if getattr(code(), 'name', None) == 'RESOURCE_EXHAUSTED':
+                return True
+        except Exception:
+            pass
+    failure = getattr(error, 'failure', None)
+    for item in getattr(failure, 'errors', ()):
+        if 'quota_error' in item.error_code:
+            return True
+    return False
+
+
+def retry_delay(error):
+    """Seconds the API asked us to wait before retrying, if it said"""
+    failure = getattr(error, 'failure', None)
+    for item in getattr(failure, 'errors', ()):
+        try:
+            delay = item.details.quota_error_details.retry_delay
+        except AttributeError:
+            continue
+        # proto-plus surfaces Duration fields as timedelta
+        seconds = delay.total_seconds() if hasattr(delay, 'total_seconds') else delay.seconds + delay.nanos / 1e9
+        if seconds:
+            return seconds
+    return None
+
+
+_governor = QuotaGovernor()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_governor._after_fork)
+
+
+def get_governor():
+    """Return the process-wide Google Ads quota governor"""
+    return _governor
+
+
+def set_governor(governor):
+    """Replace the process-wide governor (benchmarks run without real quota)"""
+    global _governor
+    _governor = governor
+
+
+def quota_stats():
+    """Return limits and remaining budget for the process-wide governor"""
+    return _governor.stats()
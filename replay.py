@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+"""
+Replay Slack traffic against a running instance of the app
+A stream is a JSONL file with one request per line:
+
+    {"offset": 12.5, "path": "/slack/events", "body": {...}}
+
+``offset`` is seconds since the start of the recording, ``path`` is
+/slack/events (JSON body) or /slack/command (form body). ``anonymize`` turns
+captured payloads into such a stream and ``synth`` generates one. ``run``
+sends a stream at N times real-time speed, measures each HTTP ack, and
+times the result message that the app posts to a local fake Slack
+(SLACK_API_BASE_URL) or to the fake response_url written into each command.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from benchmark import MIX, Workload, parse_mix, percentiles, print_comparison, save, vocabulary
+
+# Fields that identify a person, workspace or secret; dropped or hashed
+_ID_FIELDS = {'user', 'user_id', 'team', 'team_id', 'channel', 'channel_id', 'enterprise_id',
+              'api_app_id', 'bot_id', 'client_msg_id'}
+_SECRET_FIELDS = {'token', 'trigger_id', 'response_url', 'authorizations', 'authed_users', 'blocks'}
+_MENTION = re.compile(r'<@([A-Z0-9]+)(\|[^>]*)?>')
+
+
+def load_stream(path):
+    """Requests of a stream file, oldest first"""
+    with open(path, encoding='utf-8') as f:
+        stream = [json.loads(line) for line in f if line.strip()]
+    return sorted(stream, key=lambda item: item['offset'])
+
+
+def write_stream(stream, path):
+    with open(path, 'w', encoding='utf-8') as f:
+        for item in stream:
+            f.write(json.dumps(item, ensure_ascii=False) + "\n")
+
+
+def anonymize(captured, salt):
+    """
+    Captured ``{"ts" or "offset", "path", "body"}`` lines to a replayable stream.
+    IDs become stable salted hashes, secrets are dropped, keyword text is kept.
+    """
+    def pseudonym(value):
+        digest = hashlib.sha256(f"{salt}:{value}".encode()).hexdigest()[:10].upper()
+        return f"{value[:1]}{digest}"
+
+    def scrub(value):
+        if isinstance(value, dict):
+            return {key: pseudonym(item) if key in _ID_FIELDS and isinstance(item, str) else scrub(item)
+                    for key, item in value.items() if key not in _SECRET_FIELDS}
+        if isinstance(value, list):
+            return [scrub(item) for item in value]
+        if isinstance(value, str):
+            return _MENTION.sub(lambda match: f"<@{pseudonym(match.group(1))}>", value)
+        return value
+
+    first = None
+    for item in captured:
+        when = float(item.get('offset', item.get('ts', 0)))
+        first = when if first is None else first
+        yield {'offset': round(when - first, 3), 'path': item['path'], 'body': scrub(item['body'])}
+
+
+def synthesize(count, rate, mix, vocabulary_size, zipf, seed):
+    """``count`` requests arriving as a Poisson process of ``rate`` per second"""
+    workload = Workload(vocabulary(vocabulary_size), mix, zipf, seed,
+                        response_url=lambda key: "https://hooks.slack.com/commands/replaced")
+    arrivals = random.Random(seed)
+    offset = 0.0
+    for _ in range(count):
+        offset += arrivals.expovariate(rate)
+        _, _, path, body = workload.next()
+        yield {'offset': round(offset, 3), 'path': path, 'body': body}
+
+
+def kind_of(item):
+    """``'slash'``, ``'mention'``, ``'dm'`` or ``'other'`` for a stream item"""
+    if item['path'] == '/slack/command':
+        return 'slash'
+    event = item['body'].get('event', {})
+    if event.get('bot_id') or event.get('subtype'):
+        return 'other'
+    if event.get('type') == 'app_mention':
+        return 'mention'
+    if event.get('type') == 'message' and event.get('channel_type') == 'im':
+        return 'dm'
+    return 'other'
+
+
+def addressed(item, key, response_url):
+    """Copy of ``item``'s body whose reply lands in the fake Slack under ``key``"""
+    body = json.loads(json.dumps(item['body']))
+    if item['path'] == '/slack/command':
+        body['channel_id'] = key
+        body['response_url'] = response_url
+    else:
+        body.get('event', {})['channel'] = key
+        # Unique per send, or the app's dedupe would drop repeated replays
+        body['event_id'] = f"{body.get('event_id', 'Ev')}-{key}"
+    return body
+
+
+def send(target, path, body, timeout):
+    """POST one request; returns ``(status, response text)``"""
+    if path == '/slack/command':
+        data = urllib.parse.urlencode(body).encode()
+        content_type = 'application/x-www-form-urlencoded'
+    else:
+        data = json.dumps(body).encode()
+        content_type = 'application/json'
+    request = urllib.request.Request(f"{target}{path}", data=data, headers={'Content-Type': content_type})
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return str(response.status), response.read().decode('utf-8', 'replace')
+    except urllib.error.HTTPError as e:
+        return str(e.code), ''
+    except urllib.error.URLError:
+        return 'unreachable', ''
+    except OSError:
+        return 'timeout', ''
+
+
+def run(args):
+    """Replay a stream; returns the result dictionary that gets saved"""
+    from benchmark_fakes import FakeSlackServer
+    from worker_pool import BUSY_MESSAGE
+
+    stream = load_stream(args.stream)
+    host, _, port = args.fake_slack.rpartition(':')
+    slack = FakeSlackServer(latency=args.slack_latency, host=host or '127.0.0.1', port=int(port)).start()
+    print(f"📡 Fake Slack on {slack.url}; start the app with SLACK_API_BASE_URL={slack.api_url} "
+          f"gunicorn -c gunicorn.bench.conf.py")
+    target = args.target.rstrip('/')
+
+    records = {}
+    lock = threading.Lock()
+
+    def fire(item, key, scheduled):
+        kind = kind_of(item)
+        body = addressed(item, key, slack.response_url(key))
+        started = time.monotonic()
+        status, text = send(target, item['path'], body, args.timeout)
+        acked = time.monotonic()
+        busy = BUSY_MESSAGE in text
+        with lock:
+            records[key] = {'kind': kind, 'scheduled': scheduled, 'lag': started - scheduled,
+                            'sent': started, 'ack': acked - started, 'status': 'busy' if busy else status}
+
+    with ThreadPoolExecutor(max_workers=args.connections, thread_name_prefix='replay') as pool:
+        begin = time.monotonic() + 0.5
+        for seq, item in enumerate(stream, 1):
+            scheduled = begin + item['offset'] / args.speed
+            delay = scheduled - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(fire, item, f"R{seq:07d}", scheduled)
+    expected = [key for key, record in records.items() if record['kind'] != 'other' and record['status'] == '200']
+    missing = slack.wait_for(expected, args.drain_timeout)
+    slack.stop()
+
+    statuses, errors, busy = {}, 0, 0
+    for record in records.values():
+        statuses[record['status']] = statuses.get(record['status'], 0) + 1
+        busy += record['status'] == 'busy'
+    last_result = begin
+    for key in expected:
+        arrival = slack.result_time(key)
+        if arrival is None:
+            continue
+        arrived_at, text = arrival
+        last_result = max(last_result, arrived_at)
+        if text == BUSY_MESSAGE:
+            busy += 1
+        else:
+            errors += "❌" in text
+            records[key]['result'] = arrived_at - records[key]['sent']
+
+    def summary(selected):
+        return {
+            'sent': len(selected),
+            'ack_ms': percentiles([record['ack'] for record in selected]),
+            'result_ms': percentiles([record['result'] for record in selected if 'result' in record]),
+        }
+
+    timeline = []
+    for start in range(0, int((last_result - begin) // args.window) + 1):
+        low, high = begin + start * args.window, begin + (start + 1) * args.window
+        selected = [record for record in records.values() if low <= record['scheduled'] < high]
+        if selected:
+            timeline.append(dict(summary(selected), second=start * args.window))
+    results = [record for record in records.values() if 'result' in record]
+    return {
+        'label': args.label,
+        'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'config': {name: value for name, value in vars(args).items()
+                   if name not in ('compare', 'output_dir', 'label', 'func', 'command')},
+        'requests': len(records),
+        'elapsed_s': round(last_result - begin, 3),
+        'throughput_rps': round(len(results) / max(last_result - begin, 1e-9), 2),
+        'send_lag_ms': percentiles([record['lag'] for record in records.values()]),
+        'ack_ms': percentiles([record['ack'] for record in records.values()]),
+        'result_ms': percentiles([record['result'] for record in results]),
+        'by_kind': {kind: summary([record for record in records.values() if record['kind'] == kind])
+                    for kind in sorted({record['kind'] for record in records.values()})},
+        'timeline': timeline,
+        'http_statuses': statuses,
+        'errors': errors,
+        'busy': busy,
+        'missing': len(missing),
+    }
+
+
+def print_timeline(result):
+    """Ack and result latency for each window of the replay"""
+    print(f"\n{'second':>8}{'sent':>7}{'ack p95':>11}{'result p50':>12}{'result p95':>12}")
+    for window in result['timeline']:
+        ack, done = window['ack_ms'], window['result_ms']
+        print(f"{window['second']:>8}{window['sent']:>7}{_ms(ack['p95']):>11}"
+              f"{_ms(done['p50']):>12}{_ms(done['p95']):>12}")
+
+
+def _ms(value):
+    return '-' if value is None else f"{value:,.0f}"
+
+
+def cmd_run(args):
+    previous = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            previous = json.load(f)
+    result = run(args)
+    print(f"⏱️  {result['requests']} requests replayed at {args.speed}x in {result['elapsed_s']}s "
+          f"(send lag p99 {_ms(result['send_lag_ms']['p99'])} ms)")
+    print_comparison(result, previous)
+    print_timeline(result)
+    print(f"\n💾 Saved to {save(result, args.output_dir)}")
+
+
+def cmd_synth(args):
+    stream = list(synthesize(args.requests, args.rate, args.mix, args.vocabulary, args.zipf, args.seed))
+    write_stream(stream, args.output)
+    print(f"✅ Wrote {len(stream)} requests over {stream[-1]['offset'] if stream else 0:.0f}s to {args.output}")
+
+
+def cmd_anonymize(args):
+    with open(args.input, encoding='utf-8') as f:
+        captured = [json.loads(line) for line in f if line.strip()]
+    stream = sorted(anonymize(captured, args.salt or os.urandom(8).hex()), key=lambda item: item['offset'])
+    write_stream(stream, args.output)
+    print(f"✅ Wrote {len(stream)} anonymized requests to {args.output}")
+
+
+def main():
+    """Command line interface for the replay tool"""
+    parser = argparse.ArgumentParser(description="Replay Slack traffic against a running app")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    replay = commands.add_parser('run', help="send a stream to a running app")
+    replay.add_argument('stream', help="stream file (.jsonl)")
+    replay.add_argument('--target', default='http://127.0.0.1:1000', help="base URL of the app")
+    replay.add_argument('--speed', type=float, default=1.0, help="replay at this multiple of real time")
+    replay.add_argument('--fake-slack', default='127.0.0.1:9000',
+                        help="host:port for the fake Slack API and response_urls")
+    replay.add_argument('--slack-latency', type=float, default=0.02, help="fake Slack API latency (s)")
+    replay.add_argument('--connections', type=int, default=64, help="requests in flight at most")
+    replay.add_argument('--timeout', type=float, default=10, help="seconds to wait for an ack")
+    replay.add_argument('--window', type=int, default=10, help="seconds per timeline row")
+    replay.add_argument('--drain-timeout', type=float, default=120, help="seconds to wait for late results")
+    replay.add_argument('--label', default='replay', help="name saved with the results")
+    replay.add_argument('--output-dir', default='benchmark_results', help="where results are saved")
+    replay.add_argument('--compare', metavar='RESULT_JSON', help="earlier result to show deltas against")
+    replay.set_defaults(func=cmd_run)
+
+    synth = commands.add_parser('synth', help="generate a stream with Poisson arrivals")
+    synth.add_argument('-o', '--output', required=True, help="stream file to write")
+    synth.add_argument('-n', '--requests', type=int, default=600, help="requests in the stream")
+    synth.add_argument('--rate', type=float, default=5.0, help="mean requests per second")
+    synth.add_argument('--mix', type=parse_mix, default=MIX, help="request kinds and weights")
+    synth.add_argument('--vocabulary', type=int, default=500, help="distinct keywords to draw from")
+    synth.add_argument('--zipf', type=float, default=1.1, help="popularity skew of the keyword draw")
+    synth.add_argument('--seed', type=int, default=1, help="random seed")
+    synth.set_defaults(func=cmd_synth)
+
+    scrub = commands.add_parser('anonymize', help="turn captured payloads into a stream")
+    scrub.add_argument('input', help='captured payloads: {"ts", "path", "body"} per line')
+    scrub.add_argument('-o', '--output', required=True, help="stream file to write")
+    scrub.add_argument('--salt', help="keep pseudonyms stable across files (default: random)")
+    scrub.set_defaults(func=cmd_anonymize)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
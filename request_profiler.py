@@ -0,0 +1,190 @@
+"""
+Opt-in profiling of individual research jobs
+A job is profiled from its start when it is sampled (PROFILE_SAMPLE_RATE)
+or asked for with the ``--profile`` flag: cProfile records the job's own
+thread and a stack sampler records every thread, so time spent in batcher
+threads, Google Ads calls and lock waits shows up as well. A job still
+running after PROFILE_SLOW_SECONDS has its stacks sampled from then on.
+Profiles are written to PROFILE_DIR named after the request's correlation
+ID: ``.prof`` files load in pstats or snakeviz, ``.folded`` files are
+collapsed stacks for flamegraph.pl or speedscope.
+"""
+
+import cProfile
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+
+import metrics
+from config import PROFILE_DIR, PROFILE_INTERVAL, PROFILE_KEEP, PROFILE_SAMPLE_RATE, PROFILE_SLOW_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+def new_request_id():
+    """Correlation ID for a request Slack did not give one"""
+    return uuid.uuid4().hex[:12]
+
+
+class _Session:
+    """One job's stack samples; filled by the sampler thread"""
+
+    __slots__ = ('started', 'sample_after', 'stacks', 'samples')
+
+    def __init__(self, sample_after):
+        self.started = time.monotonic()
+        self.sample_after = sample_after
+        self.stacks = Counter()
+        self.samples = 0
+
+
+class StackSampler:
+    """Samples every thread's stack for the jobs being profiled
+
+    One daemon thread serves all sessions and only runs while some session
+    is due for samples, so an idle or unprofiled process pays nothing.
+    """
+
+    def __init__(self, interval=PROFILE_INTERVAL):
+        self.interval = interval
+        self._reset()
+
+    def _reset(self):
+        self._cond = threading.Condition()
+        self._sessions = set()
+        self._thread = None
+
+    def start(self, sample_after=0.0):
+        """Register the calling job; samples begin ``sample_after`` seconds from now"""
+        session = _Session(sample_after)
+        with self._cond:
+            self._sessions.add(session)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        return session
+
+    def stop(self, session):
+        with self._cond:
+            self._sessions.discard(session)
+
+    def _run(self):
+        me = threading.get_ident()
+        while True:
+            with self._cond:
+                while not self._sessions:
+                    self._cond.wait()
+                now = time.monotonic()
+                due = [session for session in self._sessions if now - session.started >= session.sample_after]
+                if not due:
+                    wake = min(session.started + session.sample_after for session in self._sessions)
+                    self._cond.wait(wake - now)
+                    continue
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            stacks = [_collapse(names.get(ident, str(ident)), frame)
+                      for ident, frame in sys._current_frames().items() if ident != me]
+            with self._cond:
+                # A job may have finished (and be writing its profile) meanwhile
+                for session in due:
+                    if session in self._sessions:
+                        session.samples += 1
+                        session.stacks.update(stacks)
+            time.sleep(self.interval)
+
+    def _after_fork(self):
+        """The sampler thread does not survive a fork"""
+        self._reset()
+
+
+def _collapse(thread_name, frame):
+    """``thread;outer;...;inner`` stack, as flamegraph.pl reads it"""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+        frame = frame.f_back
+    names.append(thread_name.replace(';', ':'))
+    return ';'.join(reversed(names))
+
+
+_sampler = StackSampler()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_sampler._after_fork)
+
+
+def _trigger(requested):
+    """Why a job should be profiled from its start, if at all"""
+    if requested:
+        return 'flag'
+    if PROFILE_SAMPLE_RATE and random.random() < PROFILE_SAMPLE_RATE:
+        return 'sampled'
+    return None
+
+
+@contextmanager
+def profiled(request_id, source, requested=False, cprofile=True):
+    """
+    Profile the ``with`` block as one research job when a trigger applies.
+    ``requested`` is the ``--profile`` flag. Pass ``cprofile=False`` where
+    the job shares its thread with others (the asyncio event loop).
+    """
+    trigger = _trigger(requested)
+    if trigger is None and not PROFILE_SLOW_SECONDS:
+        yield
+        return
+    session = _sampler.start(0.0 if trigger else PROFILE_SLOW_SECONDS)
+    profiler = cProfile.Profile() if trigger and cprofile else None
+    if profiler is not None:
+        try:
+            profiler.enable()
+        except ValueError:
+            # Python 3.12+ allows one cProfile per process; stack samples still come
+            profiler = None
+    try:
+        yield
+    finally:
+        if profiler is not None:
+            profiler.disable()
+        _sampler.stop(session)
+        elapsed = time.monotonic() - session.started
+        if trigger is None and elapsed >= PROFILE_SLOW_SECONDS:
+            trigger = 'slow'
+        if trigger is not None:
+            _write(request_id, source, trigger, elapsed, session, profiler)
+
+
+def _write(request_id, source, trigger, elapsed, session, profiler):
+    """Write a job's profiles and log where they went"""
+    stamp = time.strftime('%Y%m%dT%H%M%S', time.gmtime())
+    base = os.path.join(PROFILE_DIR, f"{stamp}_{source}_{re.sub(r'[^A-Za-z0-9._-]', '_', request_id)}")
+    try:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        if profiler is not None:
+            profiler.dump_stats(f"{base}.prof")
+        if session.samples:
+            with open(f"{base}.folded", 'w', encoding='utf-8') as f:
+                for stack, count in session.stacks.most_common():
+                    f.write(f"{stack} {count}\n")
+        _prune(PROFILE_DIR, PROFILE_KEEP)
+    except OSError as e:
+        logger.error(f"Could not write profile {base}: {str(e)}")
+        return
+    metrics.inc(f"profiles_{trigger}")
+    logger.warning(f"Profiled {source} {request_id} ({trigger}, {elapsed:.1f}s, "
+                   f"{session.samples} stack samples): {base}.*")
+
+
+def _prune(directory, keep):
+    """Delete all but the newest ``keep`` profiles"""
+    profiles = sorted(name for name in os.listdir(directory) if name.endswith(('.prof', '.folded')))
+    for name in profiles[:max(0, len(profiles) - keep)]:
+        os.remove(os.path.join(directory, name))
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Seasonality analytics for many keywords at once
+Monthly series are stacked into one matrix on a shared month axis (NaN where
+a keyword has no count), and year-over-year growth, seasonal peaks and trend
+slope are computed for every row in a few NumPy passes. The CLI turns a bulk
+JSONL results file into a per-keyword trend report.
+"""
+
+import argparse
+import contextlib
+import csv
+import json
+import sys
+
+import numpy as np
+
+from monthly_series import MISSING, MONTH_NAMES, MonthlySeries
+
+
+def series_matrix(series_list):
+    """
+    Stack series (None allowed) onto a shared month axis.
+    Returns ``(start, matrix)``: the month index of column 0 and a float
+    array with one row per series and NaN for months without a count.
+    """
+    present = [series for series in series_list if series is not None and len(series)]
+    if not present:
+        return 0, np.full((len(series_list), 0), np.nan)
+    start = min(series.start for series in present)
+    end = max(series.end for series in present)
+    matrix = np.full((len(series_list), end - start + 1), np.nan)
+    for row, series in enumerate(series_list):
+        if series is None or not len(series):
+            continue
+        counts = np.frombuffer(series.counts, dtype=series.counts.typecode).astype(float)
+        counts[counts == MISSING] = np.nan
+        matrix[row, series.start - start:series.end - start + 1] = counts
+    return start, matrix
+
+
+def yoy_growth(matrix):
+    """
+    Growth of the latest 12 months over the 12 before, as a fraction.
+    NaN for rows without both full years or with no searches the year before.
+    """
+    if matrix.shape[1] < 24:
+        return np.full(matrix.shape[0], np.nan)
+    recent, prior = matrix[:, -12:], matrix[:, -24:-12]
+    complete = ~np.isnan(recent).any(axis=1) & ~np.isnan(prior).any(axis=1)
+    recent_total, prior_total = recent.sum(axis=1), prior.sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        growth = recent_total / prior_total - 1
+    return np.where(complete & (prior_total > 0), growth, np.nan)
+
+
+def seasonal_profile(start, matrix):
+    """Average searches per calendar month, shape ``(rows, 12)``; NaN where never seen"""
+    calendar = (start + np.arange(matrix.shape[1])) % 12
+    one_hot = (calendar[:, None] == np.arange(12)[None, :]).astype(float)
+    observed = ~np.isnan(matrix)
+    sums = np.where(observed, matrix, 0) @ one_hot
+    seen = observed.astype(float) @ one_hot
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(seen > 0, sums / seen, np.nan)
+
+
+def seasonality_peaks(start, matrix):
+    """
+    Peak calendar month (1-12, 0 when unknown) and seasonality index: the
+    peak month's average over the average month (1.0 means no seasonality).
+    """
+    profile = seasonal_profile(start, matrix)
+    known = ~np.isnan(profile).all(axis=1)
+    filled = np.where(np.isnan(profile), -np.inf, profile)
+    peak = np.where(known, filled.argmax(axis=1) + 1, 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = np.nanmean(np.where(known[:, None], profile, 0), axis=1)
+        index = np.where(known & (mean > 0), filled.max(axis=1) / mean, np.nan)
+    return peak, index
+
+
+def trend_slope(matrix):
+    """Least-squares slope in searches per month over each row's observed months"""
+    observed = ~np.isnan(matrix)
+    x = np.broadcast_to(np.arange(matrix.shape[1], dtype=float), matrix.shape)
+    n = observed.sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x_mean = np.where(observed, x, 0).sum(axis=1) / n
+        y_mean = np.where(observed, matrix, 0).sum(axis=1) / n
+        dx = np.where(observed, x - x_mean[:, None], 0)
+        dy = np.where(observed, matrix - y_mean[:, None], 0)
+        slope = (dx * dy).sum(axis=1) / (dx * dx).sum(axis=1)
+    return np.where(n >= 2, slope, np.nan)
+
+
+def analyze(series_list):
+    """YoY growth, peak month, seasonality index and trend slope for every series"""
+    start, matrix = series_matrix(series_list)
+    peak, index = seasonality_peaks(start, matrix)
+    return {
+        'months': (~np.isnan(matrix)).sum(axis=1),
+        'yoy_growth': yoy_growth(matrix),
+        'peak_month': peak,
+        'seasonality_index': index,
+        'trend_slope': trend_slope(matrix),
+    }
+
+
+def load_series(path):
+    """``(keyword, MonthlySeries)`` for every answered keyword in a bulk JSONL file"""
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            row = json.loads(line) if line.strip() else None
+            result = (row or {}).get('result') or {}
+            if result.get('monthly_searches'):
+                yield row['keyword'], MonthlySeries.from_dict(result['monthly_searches'])
+
+
+REPORT_FIELDS = ['keyword', 'months', 'yoy_growth', 'peak_month', 'seasonality_index', 'trend_slope']
+
+
+def report_rows(keywords, stats):
+    """One dictionary per keyword with rounded statistics, ready for CSV"""
+    for i, keyword in enumerate(keywords):
+        peak = int(stats['peak_month'][i])
+        yield {
+            'keyword': keyword,
+            'months': int(stats['months'][i]),
+            'yoy_growth': _rounded(stats['yoy_growth'][i], 4),
+            'peak_month': MONTH_NAMES[peak - 1] if peak else '',
+            'seasonality_index': _rounded(stats['seasonality_index'][i], 3),
+            'trend_slope': _rounded(stats['trend_slope'][i], 2),
+        }
+
+
+def _rounded(value, digits):
+    return '' if np.isnan(value) else round(float(value), digits)
+
+
+def main():
+    """Command line interface for the trend report"""
+    parser = argparse.ArgumentParser(description="YoY growth, seasonality and trend for bulk results")
+    parser.add_argument('input', help="bulk research results (.jsonl)")
+    parser.add_argument('-o', '--output', default='-', help="CSV report to write (default: stdout)")
+    parser.add_argument('--top', type=int, default=10, help="fastest growing keywords to print")
+    args = parser.parse_args()
+
+    loaded = list(load_series(args.input))
+    if not loaded:
+        parser.error("no monthly search volumes found in the input")
+    keywords = [keyword for keyword, _ in loaded]
+    stats = analyze([series for _, series in loaded])
+
+    if args.output == '-':
+        out = contextlib.nullcontext(sys.stdout)
+    else:
+        out = open(args.output, 'w', newline='', encoding='utf-8')
+    with out as stream:
+        writer = csv.DictWriter(stream, fieldnames=REPORT_FIELDS)
+        writer.writeheader()
+        writer.writerows(report_rows(keywords, stats))
+
+    growth = stats['yoy_growth']
+    ranked = [i for i in np.argsort(-np.nan_to_num(growth, nan=-np.inf)) if not np.isnan(growth[i])]
+    print(f"📈 {len(keywords)} keywords analysed; fastest growing year over year:", file=sys.stderr)
+    for i in ranked[:args.top]:
+        print(f"{growth[i]:>+9.1%}  {keywords[i]}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Single-flight request coalescing
+Concurrent callers asking for the same key share one underlying call; every
+waiter receives the same result (or the same exception) when it lands.
+"""
+
+import threading
+from concurrent.futures import Future
+
+from deadlines import wait_result
+
+
+class SingleFlight:
+    """Collapse concurrent calls with the same key into one execution"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}  # key -> Future of the in-flight call
+        self._stats = {
+            'executions': 0,
+            'coalesced': 0,
+        }
+
+    def do(self, key, fn, deadline=None):
+        """Run ``fn`` for ``key`` unless an identical call is already running
+
+        Callers that join a running call wait for it until their ``deadline``.
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                self._stats['coalesced'] += 1
+                leader = False
+            else:
+                future = Future()
+                self._calls[key] = future
+                self._stats['executions'] += 1
+                leader = True
+
+        if not leader:
+            return wait_result(future, deadline)
+
+        try:
+            future.set_result(fn())
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+        return future.result()
+
+    def do_future(self, key, start):
+        """Non-blocking variant of ``do`` for callers that await a Future
+
+        ``start`` must begin the work and return a Future for its result. It
+        runs outside the lock, so slow starts never hold up other keys.
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                self._stats['coalesced'] += 1
+                return future
+            self._stats['executions'] += 1
+            future = Future()
+            self._calls[key] = future
+
+        def forget(done):
+            with self._lock:
+                if self._calls.get(key) is done:
+                    del self._calls[key]
+        future.add_done_callback(forget)
+
+        try:
+            chain(start(), future)
+        except BaseException as e:
+            future.set_exception(e)
+        return future
+
+    def in_flight(self):
+        """Number of distinct keys currently being fetched"""
+        with self._lock:
+            return len(self._calls)
+
+    def stats(self):
+        """Return execution/coalesced counters"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['in_flight'] = len(self._calls)
+        return stats
+
+
+def chain(source, target):
+    """Complete ``target`` with ``source``'s result or exception once it lands"""
+    def copy(done):
+        if done.cancelled():
+            target.cancel()
+        elif done.exception() is not None:
+            target.set_exception(done.exception())
+        else:
+            target.set_result(done.result())
+    source.add_done_callback(copy)
@@ -7,12 +7,23 @@ This app provides keyword research functionality through Slack commands.
 import os
 import json
 import logging
-from flask import Flask, request, jsonify
-from slack_sdk import WebClient
-from slack_sdk.errors import SlackApiError
-from keyword_research import get_keyword_data
 import threading
+from flask import Flask, Response, request, jsonify
+import metrics
+from slack_sdk import WebClient
+from keyword_research import batch_stats, inflight_stats, store_stats
+from ads_client import client_stats, warm_up_in_background
+from keyword_cache import cache_stats
+from quota_governor import quota_stats
+from circuit_breaker import breaker_stats
+from slack_handlers import (cluster_reply, error_message, format_keyword_data, plan_command, plan_event,
+                            research_reply, researching_message)
+from request_profiler import profiled
+from config import SLACK_API_BASE_URL
 import time
+from worker_pool import BUSY_MESSAGE, get_research_pool
+from event_dedupe import create_seen_events
+from slack_outbox import SlackOutbox
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -27,206 +38,123 @@ SLACK_SIGNING_SECRET = os.getenv('SLACK_SIGNING_SECRET')
 SLACK_VERIFICATION_TOKEN = os.getenv('SLACK_VERIFICATION_TOKEN')
 
 # Initialize Slack client
-slack_client = WebClient(token=SLACK_BOT_TOKEN)
+slack_client = WebClient(token=SLACK_BOT_TOKEN, base_url=SLACK_API_BASE_URL)
 
-def format_keyword_data(keyword, data):
-    """Format keyword research data for Slack display"""
-    if not data:
-        return f"❌ No data found for keyword: *{keyword}*"
-    
-    # Create the main message
-    message = f"🔍 *Keyword Research Results for: {keyword}*\n\n"
-    
-    # Basic metrics
-    message += f"📊 *Average Monthly Searches:* {data['avg_monthly_searches']:,}\n"
-    message += f"🏆 *Competition Level:* {data['competition']}\n\n"
-    
-    # Monthly breakdown
-    if data.get('monthly_breakdown'):
-        message += "*📅 Monthly Search Volume Breakdown:*\n"
-        for month, searches in data['monthly_breakdown'].items():
-            message += f"• {month}: {searches:,}\n"
-    
-    return message
+# All outbound messages are queued here and sent by background threads
+outbox = SlackOutbox(slack_client)
 
-def get_keyword_data_safe(keyword):
-    """Safely get keyword data with error handling"""
-    try:
-        # Import the keyword research function
-        from keyword_research import get_keyword_data
-        return get_keyword_data(keyword)
-    except Exception as e:
-        logger.error(f"Error getting keyword data for '{keyword}': {str(e)}")
-        return None
+# Event IDs already handled, so Slack retries become no-ops
+seen_events = create_seen_events()
+
+# Bounded pool that runs the research jobs started by the handlers
+research_pool = get_research_pool()
+
+metrics.gauge('research_queue_depth', lambda: research_pool.stats()['queue_depth'])
+metrics.gauge('slack_outbox_pending', lambda: outbox.stats()['pending'])
+
+def post_busy_message(channel):
+    """Tell a channel its request was dropped because the bot is overloaded"""
+    outbox.post(channel=channel, text=BUSY_MESSAGE)
 
 @app.route('/slack/events', methods=['POST'])
 def slack_events():
     """Handle Slack events"""
     try:
+        started = time.perf_counter()
         data = request.get_json()
         
-        # Handle URL verification
-        if data.get('type') == 'url_verification':
-            return jsonify({'challenge': data.get('challenge')})
-        
-        # Handle app mentions
-        if data.get('type') == 'event_callback':
-            event = data.get('event', {})
-            
-            if event.get('type') == 'app_mention':
-                handle_app_mention(event)
-            elif event.get('type') == 'message' and event.get('channel_type') == 'im':
-                handle_direct_message(event)
-        
-        return jsonify({'status': 'ok'})
+        # URL verification, retries, mentions and DMs are decided in slack_handlers
+        body, action = plan_event(data, seen_events, request.headers.get('X-Slack-Retry-Num'))
+        metrics.observe('slack_parse', time.perf_counter() - started)
+        perform(action)
+        return jsonify(body)
     
     except Exception as e:
         logger.error(f"Error handling Slack event: {str(e)}")
         return jsonify({'error': 'Internal server error'}), 500
 
-def handle_app_mention(event):
-    """Handle @mentions of the bot"""
-    try:
-        text = event.get('text', '')
-        channel = event.get('channel')
-        user = event.get('user')
-        
-        # Extract keyword from mention text
-        # Remove bot mention and extract keyword
-        keyword = text.replace('<@U0XXXXXXXX>', '').strip()  # Replace with actual bot user ID
-        
-        if not keyword:
-            response = "👋 Hi! I can help you research keywords. Just mention me with a keyword like: `@keyword-research-bot digital marketing`"
-        else:
-            # Send initial response
-            slack_client.chat_postMessage(
-                channel=channel,
-                text=f"🔍 Researching keyword: *{keyword}*... This may take a few seconds."
-            )
-            
-            # Get keyword data in a separate thread to avoid timeout
-            def research_keyword():
-                try:
-                    data = get_keyword_data_safe(keyword)
-                    message = format_keyword_data(keyword, data)
-                    
-                    slack_client.chat_postMessage(
-                        channel=channel,
-                        text=message
-                    )
-                except Exception as e:
-                    slack_client.chat_postMessage(
-                        channel=channel,
-                        text=f"❌ Error researching keyword '{keyword}': {str(e)}"
-                    )
-            
-            # Run in background thread
-            thread = threading.Thread(target=research_keyword)
-            thread.start()
-    
-    except SlackApiError as e:
-        logger.error(f"Slack API error: {e.response['error']}")
-    except Exception as e:
-        logger.error(f"Error handling app mention: {str(e)}")
-
-def handle_direct_message(event):
-    """Handle direct messages to the bot"""
-    try:
-        text = event.get('text', '')
-        channel = event.get('channel')
-        
-        if not text:
-            response = "👋 Hi! I can help you research keywords. Just send me a keyword and I'll research it for you!"
-        else:
-            # Send initial response
-            slack_client.chat_postMessage(
-                channel=channel,
-                text=f"🔍 Researching keyword: *{text}*... This may take a few seconds."
-            )
-            
-            # Get keyword data in a separate thread
-            def research_keyword():
-                try:
-                    data = get_keyword_data_safe(text)
-                    message = format_keyword_data(text, data)
-                    
-                    slack_client.chat_postMessage(
-                        channel=channel,
-                        text=message
-                    )
-                except Exception as e:
-                    slack_client.chat_postMessage(
-                        channel=channel,
-                        text=f"❌ Error researching keyword '{text}': {str(e)}"
-                    )
-            
-            # Run in background thread
-            thread = threading.Thread(target=research_keyword)
-            thread.start()
-    
-    except SlackApiError as e:
-        logger.error(f"Slack API error: {e.response['error']}")
-    except Exception as e:
-        logger.error(f"Error handling direct message: {str(e)}")
-
 @app.route('/slack/command', methods=['POST'])
 def slack_command():
     """Handle slash commands"""
     try:
-        data = request.form
-        command = data.get('command')
-        text = data.get('text', '').strip()
-        channel_id = data.get('channel_id')
-        user_id = data.get('user_id')
-        
-        if command == '/keyword-research':
-            if not text:
-                return jsonify({
-                    'response_type': 'ephemeral',
-                    'text': 'Please provide a keyword to research. Usage: `/keyword-research digital marketing`'
-                })
-            
-            # Send initial response
-            slack_client.chat_postMessage(
-                channel=channel_id,
-                text=f"🔍 Researching keyword: *{text}*... This may take a few seconds."
-            )
-            
-            # Get keyword data in a separate thread
-            def research_keyword():
-                try:
-                    data = get_keyword_data_safe(text)
-                    message = format_keyword_data(text, data)
-                    
-                    slack_client.chat_postMessage(
-                        channel=channel_id,
-                        text=message
-                    )
-                except Exception as e:
-                    slack_client.chat_postMessage(
-                        channel=channel_id,
-                        text=f"❌ Error researching keyword '{text}': {str(e)}"
-                    )
-            
-            # Run in background thread
-            thread = threading.Thread(target=research_keyword)
-            thread.start()
-            
-            return jsonify({
-                'response_type': 'ephemeral',
-                'text': 'Keyword research started! Results will appear shortly.'
-            })
-        
-        return jsonify({'text': 'Unknown command'})
+        started = time.perf_counter()
+        body, action = plan_command(request.form)
+        metrics.observe('slack_parse', time.perf_counter() - started)
+        if not perform(action):
+            return jsonify({'response_type': 'ephemeral', 'text': BUSY_MESSAGE})
+        return jsonify(body)
     
     except Exception as e:
         logger.error(f"Error handling slash command: {str(e)}")
         return jsonify({'text': 'Error processing command'}), 500
 
+def perform(action):
+    """Carry out a planned Action; returns False if the worker pool was full"""
+    if action is None:
+        return True
+    if action.kind == 'reply':
+        outbox.post(channel=action.channel, text=action.text)
+        return True
+    
+    # Get keyword data on the worker pool; reply right away if it is full
+    acked = threading.Event()
+    job = research_pool.submit(research_keyword, action, acked, name=action.source,
+                               on_reject=lambda: post_busy_message(action.channel))
+    if job is None:
+        if not action.is_command:
+            post_busy_message(action.channel)
+        return False
+    
+    if not action.is_command:
+        # Queue initial response; the outbox sends it off the request thread
+        # (slash commands are acknowledged in the HTTP response)
+        outbox.post(
+            channel=action.channel,
+            text=researching_message(action.keywords, action.kind),
+            stage='ack_post'
+        )
+    acked.set()
+    return True
+
+def research_keyword(action, acked):
+    """Research an action's keywords and post the results to its channel"""
+    try:
+        with profiled(action.request_id, action.source, action.profile):
+            if action.kind == 'clusters':
+                message, _ = cluster_reply(action.keywords, action.deadline)
+            else:
+                message, _ = research_reply(action.keywords, action.deadline)
+    except Exception as e:
+        message = error_message(action.keyword, e)
+    # The interim message is queued right after submit; keep it first
+    acked.wait()
+    outbox.post(
+        channel=action.channel,
+        text=message
+    )
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Prometheus metrics, summed over every worker sharing METRICS_DIR"""
+    return Response(metrics.metrics_text(), content_type=metrics.CONTENT_TYPE)
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
-    return jsonify({'status': 'healthy', 'service': 'keyword-research-slack-app'})
+    return jsonify({
+        'status': 'healthy',
+        'service': 'keyword-research-slack-app',
+        'google_ads_client': client_stats(),
+        'google_ads_quota': quota_stats(),
+        'google_ads_breaker': breaker_stats(),
+        'keyword_cache': cache_stats(),
+        'inflight_lookups': inflight_stats(),
+        'keyword_batches': batch_stats(),
+        'keyword_store': store_stats(),
+        'research_pool': research_pool.stats(),
+        'slack_event_dedupe': seen_events.stats(),
+        'slack_outbox': outbox.stats()
+    })
 
 if __name__ == '__main__':
     # Validate required environment variables
@@ -239,4 +167,5 @@ if __name__ == '__main__':
     
     # Start the Flask app
     port = int(os.getenv('PORT', 5000))
+    warm_up_in_background()
     app.run(host='0.0.0.0', port=port, debug=True)
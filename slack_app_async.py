@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Slack App for Google Ads Keyword Research (asyncio Version)
+Serves the same endpoints as slack_app_manifest with aiohttp and slack_sdk's
+AsyncWebClient. Lookups are awaited as futures from the shared batcher, so
+thousands can be in flight without an OS thread each.
+"""
+
+import asyncio
+import logging
+import os
+import time
+
+from aiohttp import web
+from dotenv import load_dotenv
+from slack_sdk.http_retry.builtin_async_handlers import AsyncRateLimitErrorRetryHandler
+from slack_sdk.web.async_client import AsyncWebClient
+from slack_sdk.webhook.async_client import AsyncWebhookClient
+
+import metrics
+from ads_client import client_stats, warm_up_in_background
+from circuit_breaker import breaker_stats
+from config import ASYNC_MAX_IN_FLIGHT, SLACK_API_BASE_URL
+from deadlines import DeadlineExceeded, time_left
+from event_dedupe import create_seen_events
+from keyword_cache import cache_stats
+from keyword_research import batch_stats, get_keyword_data_future, inflight_stats, store_stats
+from quota_governor import quota_stats
+from request_profiler import profiled
+from slack_handlers import cluster_reply, plan_command, plan_event, reply_for_outcomes, researching_message
+from worker_pool import BUSY_MESSAGE
+
+# Load environment variables
+load_dotenv()
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Slack configuration
+SLACK_BOT_TOKEN = os.getenv('SLACK_BOT_TOKEN')
+
+# Event IDs already handled, so Slack retries become no-ops
+seen_events = create_seen_events()
+
+# Initialize Slack client; rate-limited calls wait out Retry-After and retry
+if not SLACK_BOT_TOKEN:
+    logger.error("SLACK_BOT_TOKEN is not set!")
+slack_client = AsyncWebClient(token=SLACK_BOT_TOKEN, base_url=SLACK_API_BASE_URL)
+slack_client.retry_handlers.append(AsyncRateLimitErrorRetryHandler(max_retry_count=3))
+
+# Running action tasks; holding references keeps them from being collected
+tasks = set()
+metrics.gauge('actions_in_flight', lambda: len(tasks))
+
+routes = web.RouteTableDef()
+
+
+@routes.post('/slack/events')
+async def slack_events(request):
+    """Handle Slack events"""
+    try:
+        started = time.perf_counter()
+        data = await request.json()
+        body, action = plan_event(data, seen_events, request.headers.get('X-Slack-Retry-Num'))
+        metrics.observe('slack_parse', time.perf_counter() - started)
+        start(action)
+        return web.json_response(body)
+    except Exception as e:
+        logger.error(f"Error handling Slack event: {str(e)}")
+        return web.json_response({'error': 'Internal server error'}, status=500)
+
+
+@routes.post('/slack/command')
+async def slack_command(request):
+    """Handle slash commands"""
+    try:
+        started = time.perf_counter()
+        form = await request.post()
+        body, action = plan_command(form)
+        metrics.observe('slack_parse', time.perf_counter() - started)
+        if not start(action):
+            return web.json_response({'response_type': 'ephemeral', 'text': BUSY_MESSAGE})
+        return web.json_response(body)
+    except Exception as e:
+        logger.error(f"Error handling slash command: {str(e)}")
+        return web.json_response({'text': 'Error processing command'}, status=500)
+
+
+def start(action):
+    """Run a planned Action as a task; returns False if too many are in flight"""
+    if action is None:
+        return True
+    if len(tasks) >= ASYNC_MAX_IN_FLIGHT:
+        logger.warning(f"{len(tasks)} actions in flight; rejecting {action.source}")
+        if not action.is_command:
+            _track(asyncio.create_task(post_message(action.channel, BUSY_MESSAGE)))
+        return False
+    _track(asyncio.create_task(carry_out(action)))
+    return True
+
+
+def _track(task):
+    tasks.add(task)
+    task.add_done_callback(tasks.discard)
+
+
+async def carry_out(action):
+    """Post replies for an Action, researching its keywords when asked to"""
+    if action.kind == 'reply':
+        await post_message(action.channel, action.text)
+        return
+
+    if not action.is_command:
+        await post_message(action.channel, researching_message(action.keywords, action.kind), 'ack_post')
+
+    # The event loop is shared, so only stacks are sampled, never cProfile
+    with profiled(action.request_id, action.source, action.profile, cprofile=False):
+        message, response_type = await research(action)
+    await deliver(action, message, response_type)
+
+
+async def research(action):
+    """Research an Action's keywords; returns the message and response type"""
+    if action.kind == 'clusters':
+        # One blocking idea request plus NumPy work; keep it off the event loop
+        return await asyncio.get_running_loop().run_in_executor(
+            None, cluster_reply, action.keywords, action.deadline)
+
+    # Start every lookup before awaiting any so they share one batch
+    lookups = [asyncio.wrap_future(get_keyword_data_future(keyword))
+               for keyword in action.keywords]
+    # asyncio.wait never cancels: other callers may be sharing a lookup
+    await asyncio.wait(lookups, timeout=time_left(action.deadline))
+    outcomes = []
+    for keyword, lookup in zip(action.keywords, lookups):
+        if not lookup.done():
+            outcomes.append((keyword, None, DeadlineExceeded("Google Ads did not answer in time")))
+        elif lookup.exception() is not None:
+            outcomes.append((keyword, None, lookup.exception()))
+        else:
+            outcomes.append((keyword, lookup.result(), None))
+    return reply_for_outcomes(outcomes)
+
+
+async def deliver(action, message, response_type):
+    """Answer via the slash command's response_url, or in the channel"""
+    if action.is_command and action.response_url:
+        await post_command_response(action.response_url, message, response_type)
+    else:
+        await post_message(action.channel, message)
+
+
+async def post_message(channel, text, stage='result_post'):
+    """Post a message to a channel, logging rather than raising on failure"""
+    try:
+        with metrics.timed(stage):
+            await slack_client.chat_postMessage(channel=channel, text=text)
+        metrics.inc('slack_messages_sent')
+    except Exception as e:
+        metrics.inc('slack_messages_failed')
+        logger.error(f"Error sending Slack message to {channel}: {str(e)}")
+
+
+async def post_command_response(response_url, text, response_type):
+    """Reply to a slash command via its response_url"""
+    try:
+        with metrics.timed('result_post'):
+            response = await AsyncWebhookClient(response_url).send(text=text, response_type=response_type)
+        metrics.inc('slack_messages_sent' if response.status_code == 200 else 'slack_messages_failed')
+        if response.status_code != 200:
+            logger.error(f"response_url returned {response.status_code}: {response.body}")
+    except Exception as e:
+        metrics.inc('slack_messages_failed')
+        logger.error(f"Error posting slash command response: {str(e)}")
+
+
+@routes.get('/health')
+async def health_check(request):
+    """Health check endpoint"""
+    return web.json_response({
+        'status': 'healthy',
+        'service': 'keyword-research-slack-app',
+        'version': '1.0.0',
+        'serving_mode': 'async',
+        'google_ads_client': client_stats(),
+        'google_ads_quota': quota_stats(),
+        'google_ads_breaker': breaker_stats(),
+        'keyword_cache': cache_stats(),
+        'inflight_lookups': inflight_stats(),
+        'keyword_batches': batch_stats(),
+        'keyword_store': store_stats(),
+        'actions_in_flight': len(tasks),
+        'slack_event_dedupe': seen_events.stats()
+    })
+
+
+@routes.get('/metrics')
+async def metrics_endpoint(request):
+    """Prometheus metrics, summed over every worker sharing METRICS_DIR"""
+    return web.Response(body=metrics.metrics_text().encode(), headers={'Content-Type': metrics.CONTENT_TYPE})
+
+
+@routes.get('/')
+async def home(request):
+    """Home endpoint"""
+    return web.json_response({
+        'message': 'Keyword Research Slack Bot is running!',
+        'endpoints': {
+            'health': '/health',
+            'metrics': '/metrics',
+            'slack_events': '/slack/events',
+            'slack_command': '/slack/command'
+        }
+    })
+
+
+app = web.Application()
+app.add_routes(routes)
+
+if __name__ == '__main__':
+    port = int(os.getenv('PORT', 1000))
+    logger.info(f"Starting Keyword Research Slack Bot (async) on port {port}")
+    warm_up_in_background()
+    web.run_app(app, host='0.0.0.0', port=port)
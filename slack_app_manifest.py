@@ -7,11 +7,22 @@ This version is optimized for deployment with app manifests.
 import os
 import json
 import logging
-from flask import Flask, request, jsonify
-from slack_sdk import WebClient
-from slack_sdk.errors import SlackApiError
-from keyword_research import get_keyword_data
 import threading
+import time
+from flask import Flask, Response, request, jsonify
+import metrics
+from slack_sdk import WebClient
+from keyword_research import batch_stats, inflight_stats, store_stats
+from ads_client import client_stats, warm_up_in_background
+from keyword_cache import cache_stats
+from quota_governor import quota_stats
+from circuit_breaker import breaker_stats
+from config import SLACK_API_BASE_URL
+from worker_pool import BUSY_MESSAGE, get_research_pool
+from event_dedupe import create_seen_events
+from slack_outbox import SlackOutbox
+from request_profiler import profiled
+from slack_handlers import cluster_reply, plan_command, plan_event, research_reply, researching_message
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -28,64 +39,37 @@ app = Flask(__name__)
 SLACK_BOT_TOKEN = os.getenv('SLACK_BOT_TOKEN')
 SLACK_SIGNING_SECRET = os.getenv('SLACK_SIGNING_SECRET')
 
+# Event IDs already handled, so Slack retries become no-ops
+seen_events = create_seen_events()
+
+# Bounded pool that runs research jobs so handlers can return at once
+research_pool = get_research_pool()
+
 # Initialize Slack client
 if not SLACK_BOT_TOKEN:
     logger.error("SLACK_BOT_TOKEN is not set!")
     slack_client = None
 else:
-    slack_client = WebClient(token=SLACK_BOT_TOKEN)
+    slack_client = WebClient(token=SLACK_BOT_TOKEN, base_url=SLACK_API_BASE_URL)
 
-def format_keyword_data(keyword, data):
-    """Format keyword research data for Slack display"""
-    if not data:
-        return f"❌ No data found for keyword: *{keyword}*"
-    
-    # Create the main message
-    message = f"🔍 *Keyword Research Results for: {keyword}*\n\n"
-    
-    # Basic metrics
-    message += f"📊 *Average Monthly Searches:* {data['avg_monthly_searches']:,}\n"
-    message += f"🏆 *Competition Level:* {data['competition']}\n\n"
-    
-    # Monthly breakdown
-    if data.get('monthly_breakdown'):
-        message += "*📅 Monthly Search Volume Breakdown:*\n"
-        for month, searches in data['monthly_breakdown'].items():
-            message += f"• {month}: {searches:,}\n"
-    
-    return message
+# All outbound messages are queued here and sent by background threads
+outbox = SlackOutbox(slack_client)
 
-def get_keyword_data_safe(keyword):
-    """Safely get keyword data with error handling"""
-    try:
-        return get_keyword_data(keyword)
-    except Exception as e:
-        logger.error(f"Error getting keyword data for '{keyword}': {str(e)}")
-        return None
+metrics.gauge('research_queue_depth', lambda: research_pool.stats()['queue_depth'])
+metrics.gauge('slack_outbox_pending', lambda: outbox.stats()['pending'])
 
 @app.route('/slack/events', methods=['POST'])
 def slack_events():
     """Handle Slack events"""
     try:
+        started = time.perf_counter()
         data = request.get_json()
         logger.info(f"Received Slack event: {data}")
         
-        # Handle URL verification
-        if data.get('type') == 'url_verification':
-            challenge = data.get('challenge')
-            logger.info(f"Responding to challenge: {challenge}")
-            return jsonify({'challenge': challenge})
-        
-        # Handle app mentions
-        if data.get('type') == 'event_callback':
-            event = data.get('event', {})
-            
-            if event.get('type') == 'app_mention':
-                handle_app_mention(event)
-            elif event.get('type') == 'message' and event.get('channel_type') == 'im':
-                handle_direct_message(event)
-        
-        return jsonify({'status': 'ok'})
+        body, action = plan_event(data, seen_events, request.headers.get('X-Slack-Retry-Num'))
+        metrics.observe('slack_parse', time.perf_counter() - started)
+        perform(action)
+        return jsonify(body)
     
     except Exception as e:
         logger.error(f"Error handling Slack event: {str(e)}")
@@ -96,85 +80,6 @@ def slack_events_get():
     """Handle GET requests to slack/events (for testing)"""
     return jsonify({'message': 'Slack events endpoint is working', 'status': 'ok'})
 
-def handle_app_mention(event):
-    """Handle @mentions of the bot"""
-    try:
-        text = event.get('text', '')
-        channel = event.get('channel')
-        
-        # Extract keyword from mention text (remove bot mention)
-        # The bot user ID will be in the format <@U0XXXXXXXX>
-        import re
-        keyword = re.sub(r'<@[A-Z0-9]+>', '', text).strip()
-        
-        if not keyword:
-            response = "👋 Hi! I can help you research keywords. Just mention me with a keyword like: `@keyword-research-bot digital marketing`"
-            slack_client.chat_postMessage(channel=channel, text=response)
-            return
-        
-        # Send initial response
-        slack_client.chat_postMessage(
-            channel=channel,
-            text=f"🔍 Researching keyword: *{keyword}*... This may take a few seconds."
-        )
-        
-        # Get keyword data in a separate thread
-        def research_keyword():
-            try:
-                data = get_keyword_data_safe(keyword)
-                message = format_keyword_data(keyword, data)
-                slack_client.chat_postMessage(channel=channel, text=message)
-            except Exception as e:
-                slack_client.chat_postMessage(
-                    channel=channel,
-                    text=f"❌ Error researching keyword '{keyword}': {str(e)}"
-                )
-        
-        thread = threading.Thread(target=research_keyword)
-        thread.start()
-    
-    except SlackApiError as e:
-        logger.error(f"Slack API error: {e.response['error']}")
-    except Exception as e:
-        logger.error(f"Error handling app mention: {str(e)}")
-
-def handle_direct_message(event):
-    """Handle direct messages to the bot"""
-    try:
-        text = event.get('text', '')
-        channel = event.get('channel')
-        
-        if not text:
-            response = "👋 Hi! I can help you research keywords. Just send me a keyword and I'll research it for you!"
-            slack_client.chat_postMessage(channel=channel, text=response)
-            return
-        
-        # Send initial response
-        slack_client.chat_postMessage(
-            channel=channel,
-            text=f"🔍 Researching keyword: *{text}*... This may take a few seconds."
-        )
-        
-        # Get keyword data in a separate thread
-        def research_keyword():
-            try:
-                data = get_keyword_data_safe(text)
-                message = format_keyword_data(text, data)
-                slack_client.chat_postMessage(channel=channel, text=message)
-            except Exception as e:
-                slack_client.chat_postMessage(
-                    channel=channel,
-                    text=f"❌ Error researching keyword '{text}': {str(e)}"
-                )
-        
-        thread = threading.Thread(target=research_keyword)
-        thread.start()
-    
-    except SlackApiError as e:
-        logger.error(f"Slack API error: {e.response['error']}")
-    except Exception as e:
-        logger.error(f"Error handling direct message: {str(e)}")
-
 @app.route('/slack/command', methods=['POST', 'GET'])
 def slack_command():
     """Handle slash commands"""
@@ -188,55 +93,98 @@ def slack_command():
             })
         
         # Handle POST requests (from Slack)
+        started = time.perf_counter()
         data = request.form
-        command = data.get('command')
-        text = data.get('text', '').strip()
-        channel_id = data.get('channel_id')
-        response_url = data.get('response_url')
-        
-        # Debug logging
-        logger.info(f"Received command: '{command}', text: '{text}', channel: '{channel_id}'")
-        logger.info(f"Response URL: '{response_url}'")
+        logger.info(f"Response URL: '{data.get('response_url')}'")
         logger.info(f"All form data: {dict(data)}")
         
-        # Handle different command formats
-        if command in ['/keyword-research', '/keyword']:
-            if not text:
-                return jsonify({
-                    'response_type': 'ephemeral',
-                    'text': 'Please provide a keyword to research. Usage: `/keyword-research digital marketing`'
-                })
-            
-            # Do keyword research immediately
-            try:
-                data = get_keyword_data_safe(text)
-                message = format_keyword_data(text, data)
-                return jsonify({
-                    'response_type': 'in_channel',
-                    'text': message
-                })
-            except Exception as e:
-                logger.error(f"Error researching keyword: {str(e)}")
-                return jsonify({
-                    'response_type': 'ephemeral',
-                    'text': f'❌ Error researching keyword "{text}": {str(e)}'
-                })
-        
-        return jsonify({'text': 'Unknown command'})
+        body, action = plan_command(data)
+        metrics.observe('slack_parse', time.perf_counter() - started)
+        if not perform(action):
+            return jsonify({'response_type': 'ephemeral', 'text': BUSY_MESSAGE})
+        return jsonify(body)
     
     except Exception as e:
         logger.error(f"Error handling slash command: {str(e)}")
         return jsonify({'text': 'Error processing command'}), 500
 
+def perform(action):
+    """Carry out a planned Action; returns False if the worker pool was full"""
+    if action is None:
+        return True
+    if action.kind == 'reply':
+        outbox.post(channel=action.channel, text=action.text)
+        return True
+    
+    # Queue on the worker pool; tell the user right away if it is full
+    acked = threading.Event()
+    job = research_pool.submit(run_research, action, acked, name=action.source,
+                               on_reject=lambda: post_busy(action))
+    if job is None:
+        if not action.is_command:
+            post_busy(action)
+        return False
+    
+    if not action.is_command:
+        # Queue initial response; the outbox sends it off the request thread
+        outbox.post(channel=action.channel, text=researching_message(action.keywords, action.kind),
+                    stage='ack_post')
+    acked.set()
+    return True
+
+def run_research(action, acked):
+    """Research an action's keywords and post the results back to Slack"""
+    with profiled(action.request_id, action.source, action.profile):
+        if action.kind == 'clusters':
+            message, response_type = cluster_reply(action.keywords, action.deadline)
+        else:
+            message, response_type = research_reply(action.keywords, action.deadline)
+    # The interim message is queued right after submit; keep it first
+    acked.wait()
+    if action.is_command:
+        post_command_response(action.response_url, action.channel, message, response_type)
+    else:
+        outbox.post(channel=action.channel, text=message)
+
+def post_busy(action):
+    """Tell the user their request was dropped because the bot is overloaded"""
+    if action.is_command:
+        post_command_response(action.response_url, action.channel, BUSY_MESSAGE, 'ephemeral')
+    else:
+        outbox.post(channel=action.channel, text=BUSY_MESSAGE)
+
+def post_command_response(response_url, channel_id, text, response_type):
+    """Reply to a slash command via its response_url, or the channel if absent"""
+    if response_url:
+        outbox.respond(response_url, text, response_type)
+    else:
+        outbox.post(channel_id, text)
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
     return jsonify({
         'status': 'healthy', 
         'service': 'keyword-research-slack-app',
-        'version': '1.0.0'
+        'version': '1.0.0',
+        'serving_mode': 'sync',
+        'google_ads_client': client_stats(),
+        'google_ads_quota': quota_stats(),
+        'google_ads_breaker': breaker_stats(),
+        'keyword_cache': cache_stats(),
+        'inflight_lookups': inflight_stats(),
+        'keyword_batches': batch_stats(),
+        'keyword_store': store_stats(),
+        'research_pool': research_pool.stats(),
+        'slack_event_dedupe': seen_events.stats(),
+        'slack_outbox': outbox.stats()
     })
 
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Prometheus metrics, summed over every worker sharing METRICS_DIR"""
+    return Response(metrics.metrics_text(), content_type=metrics.CONTENT_TYPE)
+
 @app.route('/', methods=['GET'])
 def home():
     """Home endpoint"""
@@ -244,6 +192,7 @@ def home():
         'message': 'Keyword Research Slack Bot is running!',
         'endpoints': {
             'health': '/health',
+            'metrics': '/metrics',
             'slack_events': '/slack/events',
             'slack_command': '/slack/command'
         }
@@ -265,4 +214,5 @@ if __name__ == '__main__':
     
     logger.info(f"PORT environment variable: {os.getenv('PORT')}")
     logger.info(f"Starting Keyword Research Slack Bot on port {port}")
+    warm_up_in_background()
     app.run(host='0.0.0.0', port=port, debug=debug)
@@ -0,0 +1,358 @@
+"""
+Slack request handling shared by the sync (Flask) and async (aiohttp) apps
+The functions here decide how to answer a Slack request and what work it
+asks for; each serving mode only carries out the resulting Action.
+"""
+
+import logging
+import re
+
+import metrics
+from config import (BATCH_MAX_SEEDS, CLUSTER_SLACK_TOP, DEADLINE_APP_MENTION, DEADLINE_DIRECT_MESSAGE,
+                    DEADLINE_SLASH_COMMAND, MAX_KEYWORDS_PER_REQUEST)
+from deadlines import deadline_after, wait_result
+from keyword_cache import normalize_keyword
+from keyword_research import get_keyword_data_future, iter_keyword_ideas
+from monthly_series import MONTH_NAMES
+from request_profiler import new_request_id
+
+logger = logging.getLogger(__name__)
+
+SLASH_COMMANDS = ('/keyword-research', '/keyword')
+
+MENTION_HELP = "👋 Hi! I can help you research keywords. Just mention me with a keyword like: `@keyword-research-bot digital marketing`"
+DM_HELP = "👋 Hi! I can help you research keywords. Just send me a keyword and I'll research it for you!"
+COMMAND_USAGE = ('Please provide a keyword to research. Usage: `/keyword-research digital marketing` '
+                 '(separate several with commas, or start with `cluster:` to group related ideas)')
+
+# Most recent months listed in a single-keyword reply
+SLACK_MONTHS_SHOWN = 12
+
+# Prefix that asks for clustered keyword ideas instead of metrics
+CLUSTER_PREFIX = 'cluster:'
+
+# Word anywhere in a request that profiles its research job (see request_profiler)
+PROFILE_FLAG = '--profile'
+
+OK_BODY = {'status': 'ok'}
+
+# How long each entry point may spend on a lookup; slash command users
+# are watching for the answer, DMs can wait longer
+DEADLINES = {
+    'slash_command': DEADLINE_SLASH_COMMAND,
+    'app_mention': DEADLINE_APP_MENTION,
+    'direct_message': DEADLINE_DIRECT_MESSAGE,
+}
+
+
+class Action:
+    """Work a Slack request asks for, carried out by the serving mode
+
+    ``kind`` is ``'reply'`` (post ``text`` to ``channel``), ``'research'``
+    (research ``keywords`` and answer in ``channel``, or via ``response_url``
+    for slash commands) or ``'clusters'`` (cluster the ideas generated for
+    ``keywords`` and answer the same way). ``keyword`` is the ask as typed.
+    ``deadline`` is fixed when the request arrives. ``request_id`` is the
+    correlation ID (Slack's event or trigger ID) and ``profile`` is set by
+    the ``--profile`` flag.
+    """
+
+    __slots__ = ('kind', 'source', 'channel', 'keyword', 'keywords', 'text', 'response_url', 'deadline',
+                 'request_id', 'profile')
+
+    def __init__(self, kind, source, channel, keyword=None, text=None, response_url=None,
+                 request_id=None, profile=False):
+        self.kind = kind
+        self.source = source
+        self.channel = channel
+        self.keyword = keyword
+        self.keywords = parse_keywords(keyword) if keyword else []
+        self.text = text
+        self.response_url = response_url
+        self.deadline = deadline_after(DEADLINES.get(source))
+        self.request_id = request_id or new_request_id()
+        self.profile = profile
+
+    @property
+    def is_command(self):
+        """Slash commands are acknowledged in the HTTP response itself"""
+        return self.source == 'slash_command'
+
+
+def plan_event(data, seen_events, retry_num=None):
+    """
+    Decide how to answer an Events API payload.
+    Returns ``(response_body, action)``; ``action`` may be None.
+    """
+    # Handle URL verification
+    if data.get('type') == 'url_verification':
+        challenge = data.get('challenge')
+        logger.info(f"Responding to challenge: {challenge}")
+        return {'challenge': challenge}, None
+
+    if data.get('type') != 'event_callback':
+        return OK_BODY, None
+
+    # Slack redelivers events it thinks timed out; handle each once
+    if not seen_events.first_delivery(data.get('event_id'), retry=retry_num is not None):
+        logger.info(f"Ignoring duplicate delivery of {data.get('event_id')} (retry {retry_num})")
+        return OK_BODY, None
+
+    event = data.get('event', {})
+    channel = event.get('channel')
+
+    # Our own replies in a DM come back as message events; never answer them
+    if event.get('bot_id') or event.get('subtype'):
+        return OK_BODY, None
+
+    if event.get('type') == 'app_mention':
+        # The bot user ID will be in the format <@U0XXXXXXXX>
+        text = re.sub(r'<@[A-Z0-9]+>', '', event.get('text', '')).strip()
+        return OK_BODY, _plan_message('app_mention', channel, text, MENTION_HELP, data.get('event_id'))
+
+    if event.get('type') == 'message' and event.get('channel_type') == 'im':
+        text = event.get('text', '').strip()
+        return OK_BODY, _plan_message('direct_message', channel, text, DM_HELP, data.get('event_id'))
+
+    return OK_BODY, None
+
+
+def _plan_message(source, channel, text, help_text, request_id=None):
+    """Action for a mention or DM: research, clusters, help or a refusal"""
+    profile, text = split_profile_flag(text)
+    kind, text = split_kind(text)
+    keywords = parse_keywords(text)
+    if not keywords:
+        return Action('reply', source, channel, text=help_text)
+    if len(keywords) > keyword_limit(kind):
+        return Action('reply', source, channel, text=too_many_message(kind))
+    return Action(kind, source, channel, keyword=text, request_id=request_id, profile=profile)
+
+
+def plan_command(form):
+    """
+    Decide how to answer a slash command form post.
+    Returns ``(response_body, action)``; ``action`` may be None.
+    """
+    command = form.get('command')
+    text = form.get('text', '').strip()
+    channel_id = form.get('channel_id')
+    response_url = form.get('response_url')
+
+    logger.info(f"Received command: '{command}', text: '{text}', channel: '{channel_id}'")
+
+    if command not in SLASH_COMMANDS:
+        return {'text': 'Unknown command'}, None
+    profile, text = split_profile_flag(text)
+    kind, text = split_kind(text)
+    keywords = parse_keywords(text)
+    if not keywords:
+        return {'response_type': 'ephemeral', 'text': COMMAND_USAGE}, None
+    if len(keywords) > keyword_limit(kind):
+        return {'response_type': 'ephemeral', 'text': too_many_message(kind)}, None
+
+    # Acknowledge within Slack's 3 second deadline; results follow later
+    body = {
+        'response_type': 'ephemeral',
+        'text': f"{_working_on(keywords, kind)}... Results will appear shortly."
+    }
+    return body, Action(kind, 'slash_command', channel_id, keyword=text, response_url=response_url,
+                        request_id=form.get('trigger_id'), profile=profile)
+
+
+def split_profile_flag(text):
+    """Remove the ``--profile`` flag; returns ``(flag given, rest of text)``"""
+    words = text.split(' ')
+    if PROFILE_FLAG not in words:
+        return False, text
+    return True, ' '.join(word for word in words if word != PROFILE_FLAG).strip()
+
+
+def split_kind(text):
+    """Split off the ``cluster:`` prefix; returns ``(kind, rest of text)``"""
+    if text[:len(CLUSTER_PREFIX)].casefold() == CLUSTER_PREFIX:
+        return 'clusters', text[len(CLUSTER_PREFIX):].strip()
+    return 'research', text
+
+
+def keyword_limit(kind):
+    """Most keywords one request may ask about"""
+    # Cluster seeds all go into one GenerateKeywordIdeas request
+    return min(BATCH_MAX_SEEDS, MAX_KEYWORDS_PER_REQUEST) if kind == 'clusters' else MAX_KEYWORDS_PER_REQUEST
+
+
+def too_many_message(kind):
+    return f"✋ I can handle up to {keyword_limit(kind)} keywords at a time. Please split your list."
+
+
+def parse_keywords(text):
+    """Split a comma- or newline-separated ask into distinct keywords, in order"""
+    keywords, seen = [], set()
+    for part in re.split(r'[,\n]', text):
+        keyword = part.strip()
+        normalized = normalize_keyword(keyword)
+        if normalized and normalized not in seen:
+            seen.add(normalized)
+            keywords.append(keyword)
+    return keywords
+
+
+def researching_message(keywords, kind='research'):
+    """Interim message posted while a mention or DM is being researched"""
+    return f"{_working_on(keywords, kind)}... This may take a few seconds."
+
+
+def _working_on(keywords, kind):
+    if kind == 'clusters':
+        return f"🧩 Clustering keyword ideas for: *{', '.join(keywords)}*"
+    label = f"{len(keywords)} keywords" if len(keywords) > 1 else "keyword"
+    return f"🔍 Researching {label}: *{', '.join(keywords)}*"
+
+
+def error_message(keyword, error):
+    """Message posted when researching ``keyword`` failed"""
+    return f"❌ Error researching keyword '{keyword}': {str(error)}"
+
+
+def format_keyword_data(keyword, data):
+    """Format keyword research data for Slack display"""
+    if not data:
+        return f"❌ No data found for keyword: *{keyword}*"
+
+    # Create the main message
+    message = f"🔍 *Keyword Research Results for: {keyword}*\n\n"
+
+    if not data.exact_match:
+        message += "No exact data for this keyword. Closest ideas by volume:\n"
+        for suggestion in data.suggestions:
+            message += f"• {suggestion.keyword}: {suggestion.avg_monthly_searches:,}\n"
+        return message
+
+    # Basic metrics
+    message += f"📊 *Average Monthly Searches:* {data.avg_monthly_searches:,}\n"
+    message += f"🏆 *Competition Level:* {data.competition}\n\n"
+
+    # Monthly breakdown
+    if data.monthly is not None:
+        message += "*📅 Monthly Search Volume Breakdown:*\n"
+        for year, month, searches in data.monthly.last(SLACK_MONTHS_SHOWN).months():
+            message += f"• {MONTH_NAMES[month - 1]} {year}: {searches:,}\n"
+
+    return message
+
+
+def format_comparison(outcomes):
+    """Format several lookups as one comparison table, highest volume first
+
+    ``outcomes`` is a list of ``(keyword, data, error)``.
+    """
+    rows, notes = [], []
+    for keyword, data, error in outcomes:
+        if error is not None:
+            notes.append(f"• *{keyword}*: ❌ {str(error)}")
+        elif not data:
+            notes.append(f"• *{keyword}*: no data found")
+        elif not data.exact_match:
+            if data.suggestions:
+                top = data.suggestions[0]
+                notes.append(f"• *{keyword}*: no exact data; top idea _{top.keyword}_ "
+                             f"({top.avg_monthly_searches:,})")
+            else:
+                notes.append(f"• *{keyword}*: no data found")
+        else:
+            rows.append((keyword, data.avg_monthly_searches, data.competition))
+    rows.sort(key=lambda row: row[1], reverse=True)
+
+    message = f"📊 *Keyword comparison ({len(outcomes)} keywords)*\n"
+    if rows:
+        width = min(40, max(len("Keyword"), *(len(row[0]) for row in rows)))
+        lines = [f"{'Keyword':<{width}}  {'Avg monthly':>11}  Competition"]
+        for keyword, searches, competition in rows:
+            if len(keyword) > width:
+                keyword = keyword[:width - 1] + "…"
+            lines.append(f"{keyword:<{width}}  {searches:>11,}  {competition}")
+        message += "```\n" + "\n".join(lines) + "\n```\n"
+    if notes:
+        message += "\n".join(notes) + "\n"
+    return message
+
+
+def research_reply(keywords, deadline=None):
+    """Research ``keywords`` concurrently and return the Slack message and response type
+
+    Every lookup is started before any is waited on, so they share one
+    batching window (and one API call) as well as the cache.
+    """
+    lookups = [(keyword, get_keyword_data_future(keyword)) for keyword in keywords]
+    outcomes = []
+    for keyword, future in lookups:
+        try:
+            outcomes.append((keyword, wait_result(future, deadline), None))
+        except Exception as e:
+            outcomes.append((keyword, None, e))
+    return reply_for_outcomes(outcomes)
+
+
+def format_cluster_summary(keywords, clusters, idea_count, top=CLUSTER_SLACK_TOP):
+    """Format the biggest clusters as a compact table"""
+    message = (f"🧩 *Keyword clusters for: {', '.join(keywords)}* "
+               f"({idea_count:,} ideas in {len(clusters):,} clusters)\n")
+    shown = clusters[:top]
+    width = min(40, max(len("Head term"), *(len(cluster['head']) for cluster in shown)))
+    lines = [f"{'Head term':<{width}}  {'Searches':>11}  Keywords"]
+    for cluster in shown:
+        head = cluster['head']
+        if len(head) > width:
+            head = head[:width - 1] + "…"
+        lines.append(f"{head:<{width}}  {cluster['total_searches']:>11,}  {cluster['size']:>8}")
+    message += "```\n" + "\n".join(lines) + "\n```\n"
+    if len(clusters) > top:
+        message += f"_…and {len(clusters) - top:,} smaller clusters_\n"
+    return message
+
+
+def cluster_reply(keywords, deadline=None):
+    """Cluster the ideas generated for ``keywords``; returns message and response type"""
+    # NumPy is only needed for this command
+    from keyword_clusters import cluster_keywords
+    label = ', '.join(keywords)
+    try:
+        ideas = [(text, searches) for text, searches, _ in iter_keyword_ideas(keywords, deadline)]
+        if not ideas:
+            return f"❌ No keyword ideas found for: *{label}*", 'ephemeral'
+        with metrics.timed('cluster'):
+            clusters = cluster_keywords(ideas)
+        with metrics.timed('format'):
+            return format_cluster_summary(keywords, clusters, len(ideas)), 'in_channel'
+    except Exception as e:
+        logger.error(f"Error clustering keyword ideas for '{label}': {str(e)}")
+        return error_message(label, e), 'ephemeral'
+
+
+def reply_for_outcomes(outcomes):
+    """Turn finished lookups into one message and response type"""
+    if len(outcomes) == 1:
+        return reply_for_result(*outcomes[0])
+    for keyword, _, error in outcomes:
+        if error is not None:
+            logger.error(f"Error getting keyword data for '{keyword}': {str(error)}")
+    try:
+        with metrics.timed('format'):
+            return format_comparison(outcomes), 'in_channel'
+    except Exception as e:
+        logger.error(f"Error formatting keyword comparison: {str(e)}")
+        return error_message(', '.join(keyword for keyword, _, _ in outcomes), e), 'ephemeral'
+
+
+def reply_for_result(keyword, data=None, error=None):
+    """Turn a finished lookup (result or exception) into message and response type"""
+    if error is not None:
+        # Quota and API failures are worth telling apart from "no data"
+        logger.error(f"Error getting keyword data for '{keyword}': {str(error)}")
+        return error_message(keyword, error), 'ephemeral'
+    try:
+        with metrics.timed('format'):
+            return format_keyword_data(keyword, data), 'in_channel'
+    except Exception as e:
+        logger.error(f"Error researching keyword: {str(e)}")
+        return error_message(keyword, e), 'ephemeral'
@@ -0,0 +1,211 @@
+"""
+Asynchronous outbox for Slack messages
+Handlers enqueue messages and return immediately; sender threads deliver
+them in order per channel, pace each channel to Slack's per-channel rate
+limit and wait out any Retry-After the API sends back.
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+from slack_sdk.errors import SlackApiError
+from slack_sdk.webhook import WebhookClient
+
+import metrics
+from config import (SLACK_CHANNEL_BURST, SLACK_CHANNEL_RATE, SLACK_OUTBOX_MAX_ATTEMPTS,
+                    SLACK_OUTBOX_WORKERS)
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimited(Exception):
+    """Raised by a send function when Slack asked us to slow down"""
+
+    def __init__(self, retry_after):
+        super().__init__(f"rate limited for {retry_after}s")
+        self.retry_after = retry_after
+
+
+class _Destination:
+    """Pending messages and pacing state for one channel or response_url"""
+
+    __slots__ = ('messages', 'tokens', 'refilled_at', 'not_before', 'busy')
+
+    def __init__(self, burst):
+        self.messages = deque()
+        self.tokens = burst
+        self.refilled_at = time.monotonic()
+        self.not_before = 0.0
+        self.busy = False
+
+
+class SlackOutbox:
+    """Ordered, rate-limit-aware delivery of outbound Slack messages"""
+
+    def __init__(self, client, workers=SLACK_OUTBOX_WORKERS, rate=SLACK_CHANNEL_RATE,
+                 burst=SLACK_CHANNEL_BURST, max_attempts=SLACK_OUTBOX_MAX_ATTEMPTS):
+        self.client = client
+        self.workers = workers
+        self.rate = rate
+        self.burst = burst
+        self.max_attempts = max_attempts
+        self._cond = threading.Condition()
+        self._destinations = {}
+        self._pid = None
+        self._stats = {
+            'queued': 0,
+            'sent': 0,
+            'failed': 0,
+            'rate_limited': 0,
+            'max_pending': 0,
+            'delivery_seconds_total': 0.0,
+        }
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def post(self, channel, text, stage='result_post', **kwargs):
+        """Queue a chat.postMessage to ``channel``
+
+        ``stage`` names the latency histogram the call is timed in
+        (``'ack_post'`` for interim "researching" messages).
+        """
+        def send():
+            if self.client is None:
+                raise RuntimeError("Slack client is not configured")
+            try:
+                with metrics.timed(stage):
+                    self.client.chat_postMessage(channel=channel, text=text, **kwargs)
+            except SlackApiError as e:
+                if e.response.status_code == 429:
+                    raise RateLimited(_retry_after(e.response.headers))
+                raise
+        self._enqueue(('channel', channel), send)
+
+    def respond(self, response_url, text, response_type='ephemeral', stage='result_post'):
+        """Queue a reply to a slash command's response_url"""
+        def send():
+            with metrics.timed(stage):
+                response = WebhookClient(response_url).send(text=text, response_type=response_type)
+            if response.status_code == 429:
+                raise RateLimited(_retry_after(response.headers))
+            if response.status_code != 200:
+                raise RuntimeError(f"response_url returned {response.status_code}: {response.body}")
+        self._enqueue(('response_url', response_url), send)
+
+    def _enqueue(self, key, send):
+        with self._cond:
+            self._ensure_started()
+            destination = self._destinations.get(key)
+            if destination is None:
+                destination = self._destinations[key] = _Destination(self.burst)
+            destination.messages.append((send, time.monotonic(), 1))
+            self._stats['queued'] += 1
+            self._stats['max_pending'] = max(self._stats['max_pending'], self._pending())
+            self._cond.notify()
+
+    def _pending(self):
+        return sum(len(d.messages) for d in self._destinations.values())
+
+    def _ensure_started(self):
+        """Start the sender threads in this process (again, after a fork)"""
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        self._pid = pid
+        for index in range(self.workers):
+            threading.Thread(target=self._send_loop, name=f"slack-outbox-{index}", daemon=True).start()
+
+    def _after_fork(self):
+        """Messages queued in the parent are the parent's to deliver"""
+        self._cond = threading.Condition()
+        self._destinations = {}
+
+    def _next_ready(self):
+        """Pick a destination allowed to send now, or how long to wait for one"""
+        now = time.monotonic()
+        wait = None
+        idle = []
+        for key, destination in self._destinations.items():
+            if destination.busy:
+                continue
+            # Refill the per-destination token bucket
+            destination.tokens = min(self.burst, destination.tokens + (now - destination.refilled_at) * self.rate)
+            destination.refilled_at = now
+            if not destination.messages:
+                # Forget destinations only once their pacing state is spent
+                if destination.tokens >= self.burst and destination.not_before <= now:
+                    idle.append(key)
+                continue
+            ready_at = max(destination.not_before,
+                           now if destination.tokens >= 1 else now + (1 - destination.tokens) / self.rate)
+            if ready_at <= now:
+                return key, destination, None
+            wait = ready_at - now if wait is None else min(wait, ready_at - now)
+        for key in idle:
+            del self._destinations[key]
+        return None, None, wait
+
+    def _send_loop(self):
+        while True:
+            with self._cond:
+                while True:
+                    key, destination, wait = self._next_ready()
+                    if destination is not None:
+                        break
+                    self._cond.wait(wait)
+                destination.busy = True
+                destination.tokens -= 1
+                send, queued_at, attempt = destination.messages.popleft()
+
+            requeue = False
+            try:
+                send()
+                sent = True
+            except RateLimited as e:
+                sent = False
+                requeue = attempt < self.max_attempts
+                logger.warning(f"Slack rate limited {key[0]} {key[1]}; retrying after {e.retry_after}s")
+                metrics.inc('slack_rate_limited')
+                with self._cond:
+                    self._stats['rate_limited'] += 1
+                    destination.not_before = time.monotonic() + e.retry_after
+            except Exception as e:
+                sent = False
+                logger.error(f"Error sending Slack message to {key[0]} {key[1]}: {str(e)}")
+
+            with self._cond:
+                if requeue:
+                    # Put it back at the head so order within the channel holds
+                    destination.messages.appendleft((send, queued_at, attempt + 1))
+                elif sent:
+                    metrics.inc('slack_messages_sent')
+                    self._stats['sent'] += 1
+                    self._stats['delivery_seconds_total'] += time.monotonic() - queued_at
+                else:
+                    metrics.inc('slack_messages_failed')
+                    self._stats['failed'] += 1
+                destination.busy = False
+                self._cond.notify_all()
+
+    def stats(self):
+        """Return queued/sent/rate-limited counters and the current backlog"""
+        with self._cond:
+            stats = dict(self._stats)
+            stats['pending'] = self._pending()
+            stats['destinations'] = len(self._destinations)
+        stats['avg_delivery_seconds'] = round(stats['delivery_seconds_total'] / stats['sent'], 4) if stats['sent'] else 0
+        return stats
+
+
+def _retry_after(headers):
+    """Read Slack's Retry-After header (seconds), defaulting to one second"""
+    for name, value in (headers or {}).items():
+        if name.lower() == 'retry-after':
+            try:
+                return float(value if not isinstance(value, list) else value[0])
+            except (TypeError, ValueError):
+                break
+    return 1.0
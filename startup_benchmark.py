@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Startup-time benchmark
+Starts fresh interpreters and measures what a cold worker pays before it
+can answer Slack: importing each app, the first /health, url_verification
+and slash-command ack, and (separately) importing the Google Ads stack that
+the background warm-up loads. Every run is appended to a history file with
+the git commit, so import cost can be followed over time.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from datetime import datetime, timezone
+
+# Runs in a fresh interpreter; prints one JSON line
+_PROBE = r'''
+import json, sys, time
+started = time.perf_counter()
+import {module} as app_module
+imported = time.perf_counter()
+result = {{'import_s': imported - started, 'modules': len(sys.modules)}}
+client = getattr(app_module.app, 'test_client', None)
+if client is not None:
+    client = client()
+    for name, call in [
+        ('health_ms', lambda: client.get('/health')),
+        ('url_verification_ms', lambda: client.post('/slack/events',
+                                                   json={{'type': 'url_verification', 'challenge': 'x'}})),
+        ('slash_ack_ms', lambda: client.post('/slack/command', data={{
+            'command': '/keyword-research', 'text': 'villa dubai', 'channel_id': 'C1',
+            'response_url': 'http://127.0.0.1:9/response'}})),
+    ]:
+        if name == 'slash_ack_ms':
+            result['google_ads_before_ack'] = 'google.ads.googleads' in sys.modules
+        began = time.perf_counter()
+        assert call().status_code == 200, name
+        result[name] = (time.perf_counter() - began) * 1000
+print(json.dumps(result))
+'''
+
+_GOOGLE_ADS_PROBE = r'''
+import json, sys, time
+import ads_client
+started = time.perf_counter()
+ads_client.import_google_ads()
+print(json.dumps({'import_s': time.perf_counter() - started, 'modules': len(sys.modules)}))
+'''
+
+APPS = {'manifest': 'slack_app_manifest', 'legacy': 'slack_app', 'async': 'slack_app_async'}
+
+
+def probe_environment():
+    """A quiet environment that never reaches the real Slack or Google Ads"""
+    env = dict(os.environ, SLACK_BOT_TOKEN='xoxb-startup', SLACK_API_BASE_URL='http://127.0.0.1:9/api/',
+               KEYWORD_STORE_PATH='', EVENT_DEDUPE_PATH='', METRICS_DIR='', ADS_WARMUP='off')
+    return env
+
+
+def measure(code, repeats):
+    """Run ``code`` in ``repeats`` fresh interpreters; the decoded JSON of each"""
+    runs = []
+    for _ in range(repeats):
+        output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True,
+                                env=probe_environment(), cwd=os.path.dirname(os.path.abspath(__file__)))
+        if output.returncode != 0:
+            raise RuntimeError(output.stderr.strip().splitlines()[-1])
+        runs.append(json.loads(output.stdout.strip().splitlines()[-1]))
+    return runs
+
+
+def summarize(runs):
+    """Median of every numeric field; other fields from the first run"""
+    summary = {}
+    for name, value in runs[0].items():
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            summary[name] = value
+        else:
+            summary[name] = round(statistics.median(run[name] for run in runs), 4)
+    return summary
+
+
+def heaviest_imports(module, top):
+    """The ``top`` slowest top-level imports of ``module`` by cumulative time (-X importtime)"""
+    output = subprocess.run([sys.executable, '-X', 'importtime', '-c', f"import {module}"],
+                            capture_output=True, text=True, env=probe_environment(),
+                            cwd=os.path.dirname(os.path.abspath(__file__)))
+    packages = {}
+    for line in output.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # Two spaces of indentation per nesting level; level 1 is imported by the app directly
+        if len(name) - len(name.lstrip(' ')) <= 3 and name.strip() != module:
+            package = name.strip().split('.')[0]
+            packages[package] = packages.get(package, 0) + int(cumulative)
+    ranked = sorted(packages.items(), key=lambda item: -item[1])[:top]
+    return {package: round(micros / 1e6, 3) for package, micros in ranked}
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run(args):
+    """Measure every requested app and the Google Ads import"""
+    result = {
+        'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'commit': git_commit(),
+        'python': sys.version.split()[0],
+        'repeats': args.repeats,
+        'apps': {},
+    }
+    for name in args.apps:
+        module = APPS[name]
+        result['apps'][name] = summarize(measure(_PROBE.format(module=module), args.repeats))
+        result['apps'][name]['heaviest_imports'] = heaviest_imports(module, args.top)
+    result['google_ads'] = summarize(measure(_GOOGLE_ADS_PROBE, args.repeats))
+    return result
+
+
+def load_history(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def print_report(result, previous=None):
+    """Per-app medians, with the previous history entry alongside when there is one"""
+    print(f"🚀 Cold start, median of {result['repeats']} fresh interpreters (commit {result['commit']})")
+    rows = [('import_s', "Import (s)"), ('modules', "Modules loaded"), ('health_ms', "First /health (ms)"),
+            ('url_verification_ms', "url_verification (ms)"), ('slash_ack_ms', "Slash ack (ms)")]
+    for name, app in result['apps'].items():
+        before = (previous or {}).get('apps', {}).get(name, {})
+        print(f"\n{name} app" + (f"  (previous: commit {previous['commit']})" if before else ""))
+        for key, title in rows:
+            if key in app:
+                print(f"  {title:<24}{_delta(app[key], before.get(key))}")
+        print(f"  {'Google Ads before ack':<24}{app.get('google_ads_before_ack', '-')}")
+        print("  Heaviest imports: " + ", ".join(f"{package} {seconds}s"
+                                               for package, seconds in app['heaviest_imports'].items()))
+    before = (previous or {}).get('google_ads', {})
+    print("\nGoogle Ads stack (background warm-up)")
+    print(f"  {'Import (s)':<24}{_delta(result['google_ads']['import_s'], before.get('import_s'))}")
+    print(f"  {'Modules loaded':<24}{_delta(result['google_ads']['modules'], before.get('modules'))}")
+
+
+def _delta(value, before):
+    text = f"{value:>10,.3f}" if isinstance(value, float) else f"{value:>10,}"
+    if isinstance(before, (int, float)) and before:
+        text += f"   {(value - before) / before:+.0%} vs {before:,}"
+    return text
+
+
+def main():
+    """Command line interface for the startup benchmark"""
+    parser = argparse.ArgumentParser(description="Measure cold-start import and first-response cost")
+    parser.add_argument('--apps', nargs='+', choices=sorted(APPS), default=['manifest', 'async'],
+                        help="apps to start")
+    parser.add_argument('-r', '--repeats', type=int, default=5, help="fresh interpreters per measurement")
+    parser.add_argument('--top', type=int, default=8, help="heaviest imports to list")
+    parser.add_argument('--history', default=os.path.join('benchmark_results', 'startup_history.jsonl'),
+                        help="file each run is appended to")
+    args = parser.parse_args()
+
+    history = load_history(args.history)
+    result = run(args)
+    print_report(result, history[-1] if history else None)
+    os.makedirs(os.path.dirname(args.history) or '.', exist_ok=True)
+    with open(args.history, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(result) + "\n")
+    print(f"\n💾 Appended to {args.history} ({len(history) + 1} runs)")
+
+
+if __name__ == "__main__":
+    main()
@@ -23,11 +23,12 @@ def test_keyword_research():
         try:
             data = get_keyword_data(keyword)
             if data:
-                print(f"✅ Success! Found data for '{data['keyword']}'")
-                print(f"   📊 Avg monthly searches: {data['avg_monthly_searches']:,}")
-                print(f"   🏆 Competition: {data['competition']}")
-                if data.get('monthly_breakdown'):
-                    print(f"   📅 Monthly data: {len(data['monthly_breakdown'])} months")
+                print(f"✅ Success! Found data for '{data.keyword}'")
+                if data.exact_match:
+                    print(f"   📊 Avg monthly searches: {data.avg_monthly_searches:,}")
+                    print(f"   🏆 Competition: {data.competition}")
+                if data.monthly is not None:
+                    print(f"   📅 Monthly data: {len(data.monthly)} months")
             else:
                 print(f"❌ No data found for '{keyword}'")
         except Exception as e:
@@ -39,19 +40,13 @@ def test_slack_app_imports():
     
     try:
         from slack_app import format_keyword_data
+        from keyword_result import KeywordResult
+        from monthly_series import MonthlySeries, month_index
         print("✅ Slack app imports successful")
         
         # Test formatting function
-        test_data = {
-            'keyword': 'test keyword',
-            'avg_monthly_searches': 10000,
-            'competition': 'MEDIUM',
-            'monthly_breakdown': {
-                'Jan': 8000,
-                'Feb': 12000,
-                'Mar': 10000
-            }
-        }
+        test_data = KeywordResult('test keyword', True, 10000, 'MEDIUM',
+                                  MonthlySeries(month_index(2025, 1), [8000, 12000, 10000]))
         
         formatted = format_keyword_data('test keyword', test_data)
         print("✅ Formatting function works")
@@ -60,6 +55,1152 @@ def test_slack_app_imports():
     except Exception as e:
         print(f"❌ Error testing Slack app imports: {str(e)}")
 
+def test_keyword_cache():
+    """Test cache key normalization, TTL expiry and LRU eviction"""
+    print("\n🧪 Testing keyword result cache...")
+    from keyword_cache import KeywordCache, cache_key
+
+    assert cache_key("  SEO   Services ") == cache_key("seo services")
+
+    now = [0.0]
+    cache = KeywordCache(max_entries=2, ttl=10, stale_ttl=0, clock=lambda: now[0])
+    calls = []
+
+    def loader(value):
+        calls.append(value)
+        return value
+
+    assert cache.get_or_load("a", lambda: loader(1)) == 1
+    assert cache.get_or_load("a", lambda: loader(2)) == 1
+    now[0] = 11
+    assert cache.get_or_load("a", lambda: loader(3)) == 3
+    cache.get_or_load("b", lambda: loader(4))
+    cache.get_or_load("c", lambda: loader(5))
+    assert cache.get("a") is None
+
+    stats = cache.stats()
+    assert stats['hits'] == 1 and stats['misses'] == 4 and stats['evictions'] == 1
+
+    # A stale hit is refreshed in the background with a single cache write
+    import time
+    import keyword_research
+    from keyword_batcher import KeywordBatcher
+    from keyword_cache import get_cache
+    writes = []
+
+    def count_writes(target):
+        target.set = lambda key, value: (writes.append(key), KeywordCache.set(target, key, value))
+
+    def wait_for_refresh(target, refreshes=0):
+        deadline = time.monotonic() + 5
+        while target.stats()['refreshes'] == refreshes and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    stale = KeywordCache(ttl=10, stale_ttl=100, clock=lambda: now[0])
+    stale.set("d", 1)
+    now[0] += 20
+    count_writes(stale)
+    assert stale.get_or_load("d", lambda: loader(6)) == 1
+    wait_for_refresh(stale)
+    assert writes == ["d"] and stale.get("d")[0] == 6
+
+    # ...also when the shared lookup behind get_keyword_data fills the cache
+    shared = get_cache()
+    key = cache_key("stale keyword")
+    saved = keyword_research._batcher, keyword_research._store
+    keyword_research._batcher = KeywordBatcher(lambda keywords, deadline: {'stale keyword': 'fresh'}, window=0)
+    keyword_research._store = None
+    shared.clear()
+    refreshes = shared.stats()['refreshes']
+    try:
+        with shared._lock:
+            shared._entries[key] = (time.monotonic() - shared.ttl - 1, 'old')
+        writes.clear()
+        count_writes(shared)
+        assert keyword_research.get_keyword_data("stale keyword") == 'old'
+        wait_for_refresh(shared, refreshes)
+        assert writes == [key] and shared.get(key)[0] == 'fresh'
+    finally:
+        del shared.set
+        keyword_research._batcher, keyword_research._store = saved
+        shared.clear()
+    print(f"✅ Cache works: {stats}")
+
+def test_singleflight():
+    """Test that concurrent identical calls share one execution"""
+    print("\n🧪 Testing single-flight coalescing...")
+    import threading
+    from singleflight import SingleFlight
+
+    flight = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def slow_lookup():
+        calls.append(1)
+        release.wait(5)
+        return "result"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flight.do("seo", slow_lookup)))
+               for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    while flight.stats()['coalesced'] < 4:
+        release.wait(0.01)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert results == ["result"] * 5
+    assert len(calls) == 1
+
+    # A slow start() for one key must not hold up other keys
+    from concurrent.futures import Future
+    started, unblock = threading.Event(), threading.Event()
+
+    def slow_start():
+        started.set()
+        unblock.wait(5)
+        future = Future()
+        future.set_result("slow")
+        return future
+
+    thread = threading.Thread(target=lambda: flight.do_future("slow", slow_start))
+    thread.start()
+    started.wait(5)
+    other = Future()
+    assert not flight.do_future("other", lambda: other).done()
+    joined = flight.do_future("slow", slow_start)
+    other.set_result("other")
+    unblock.set()
+    thread.join()
+    assert joined.result(1) == "slow" and flight.stats()['in_flight'] == 0
+    print(f"✅ Single-flight works: {flight.stats()}")
+
+def test_event_dedupe():
+    """Test that repeated Slack event IDs are suppressed in both backends"""
+    print("\n🧪 Testing Slack event de-duplication...")
+    import tempfile
+    import metrics
+    from event_dedupe import MemorySeenEvents, SeenEvents, SqliteSeenEvents
+
+    # Backends must say how they remember an event
+    try:
+        SeenEvents()
+        assert False, "SeenEvents is abstract"
+    except TypeError:
+        pass
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for store in (MemorySeenEvents(), SqliteSeenEvents(os.path.join(tmp, 'seen.db'))):
+            counted = metrics.totals()['counters'].get('slack_retries_suppressed', 0)
+            assert store.first_delivery('Ev1')
+            assert not store.first_delivery('Ev1', retry=True)
+            assert store.first_delivery('Ev2')
+            assert store.first_delivery(None)
+            stats = store.stats()
+            assert stats['suppressed'] == 1 and stats['retries_suppressed'] == 1
+            assert metrics.totals()['counters']['slack_retries_suppressed'] == counted + 1
+            print(f"✅ {stats['backend']} backend works: {stats}")
+
+def test_keyword_store():
+    """Test that stored keyword results survive a reopen and expire by TTL"""
+    print("\n🧪 Testing persistent keyword store...")
+    import tempfile
+    from keyword_result import KeywordResult
+    from keyword_store import KeywordStore
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'keywords.db')
+        key = ('123', '1000', '2840', 'GOOGLE_SEARCH', 'seo tools')
+        KeywordStore(path).set(key, KeywordResult('seo tools', True, 100, 'LOW'))
+
+        store = KeywordStore(path)
+        assert store.get(key).avg_monthly_searches == 100
+        assert store.get(key[:-1] + ('missing',)) is None
+        stats = store.stats()
+        assert stats['warm_start_hits'] == 1 and stats['misses'] == 1 and stats['entries'] == 1
+        assert KeywordStore(path, ttl=-1).get(key) is None
+
+        # Lookups read the store on a store thread, never the caller's (the event loop)
+        import threading
+        import keyword_research
+        from keyword_cache import cache_key
+
+        class RecordingStore(KeywordStore):
+            def get(self, key, ttl=None):
+                self.read_on = threading.current_thread().name
+                return super().get(key, ttl)
+
+        recording = RecordingStore(path)
+        recording.set(cache_key('seo tools'), KeywordResult('seo tools', True, 100, 'LOW'))
+        saved = keyword_research._store
+        keyword_research._store = recording
+        try:
+            keyword_research.get_cache().clear()
+            lookup = keyword_research.get_keyword_data_future('seo tools')
+            assert lookup.result(5).avg_monthly_searches == 100
+            assert recording.read_on.startswith('keyword-store')
+        finally:
+            keyword_research._store = saved
+            keyword_research.get_cache().clear()
+        print(f"✅ Keyword store works: {stats}")
+
+def test_quota_governor():
+    """Test the daily budget and retry of RESOURCE_EXHAUSTED answers"""
+    print("\n🧪 Testing Google Ads quota governor...")
+    from quota_governor import QuotaExhausted, QuotaGovernor
+
+    governor = QuotaGovernor(rate=1000, burst=5, daily_budget=3, max_wait=0, backoff_base=0.01)
+    for _ in range(3):
+        governor.acquire()
+    try:
+        governor.acquire()
+        assert False, "budget should be used up"
+    except QuotaExhausted:
+        pass
+    assert governor.remaining_today() == 0
+
+    class Exhausted(Exception):
+        class error:
+            @staticmethod
+            def code():
+                return type('Code', (), {'name': 'RESOURCE_EXHAUSTED'})()
+
+    answers = [Exhausted(), 'ok']
+    def flaky():
+        answer = answers.pop(0)
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+    governor = QuotaGovernor(rate=1000, burst=5, daily_budget=0, max_wait=1, backoff_base=0.01)
+    assert governor.call(flaky) == 'ok'
+    stats = governor.stats()
+    assert stats['quota_errors'] == 1 and stats['retries'] == 1 and stats['remaining_today'] is None
+
+    # call_timeout bounds the request only; waiting for quota may take longer
+    timeouts = []
+    governor = QuotaGovernor(rate=5, burst=1, daily_budget=0, max_wait=1)
+    for _ in range(2):
+        governor.call(lambda timeout: timeouts.append(timeout), call_timeout=0.05)
+    assert timeouts == [0.05, 0.05] and governor.stats()['wait_seconds_total'] > 0.1
+    print(f"✅ Quota governor works: {stats}")
+
+def test_circuit_breaker():
+    """Test that the breaker opens, fails fast and closes after a good probe"""
+    print("\n🧪 Testing Google Ads circuit breaker...")
+    from circuit_breaker import CircuitBreaker, CircuitOpen
+
+    class Unavailable(ConnectionError):
+        pass
+
+    def failing():
+        raise Unavailable("connection reset")
+
+    now = [0.0]
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10, clock=lambda: now[0])
+    for _ in range(2):
+        try:
+            breaker.call(failing)
+        except Unavailable:
+            pass
+    try:
+        breaker.call(lambda: 'ok')
+        assert False, "breaker should be open"
+    except CircuitOpen:
+        pass
+
+    now[0] = 11
+    assert breaker.call(lambda: 'ok') == 'ok'
+    stats = breaker.stats()
+    assert stats['state'] == 'closed' and stats['opened'] == 1 and stats['probes'] == 1
+    print(f"✅ Circuit breaker works: {stats}")
+
+def test_keyword_batcher():
+    """Test merging concurrent lookups into multi-seed batches"""
+    print("\n🧪 Testing keyword batcher...")
+    import threading
+    import time
+    from deadlines import DeadlineExceeded
+    from keyword_batcher import KeywordBatcher
+
+    calls = []
+    lock = threading.Lock()
+
+    def fetch_batch(keywords, deadline):
+        with lock:
+            calls.append(list(keywords))
+        return {keyword.lower(): f"result for {keyword}" for keyword in keywords}
+
+    # Lookups arriving within the window share one request
+    batcher = KeywordBatcher(fetch_batch, window=0.2, max_size=20, max_concurrency=2)
+    futures = {}
+    threads = [threading.Thread(target=lambda k=keyword: futures.__setitem__(k, batcher.submit(k)))
+               for keyword in ('seo', 'crm', 'SEO', 'ppc')]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    results = {keyword: future.result(5) for keyword, future in futures.items()}
+    assert len(calls) == 1 and sorted(calls[0]) == ['crm', 'ppc', 'seo']
+    assert results == {'seo': 'result for seo', 'crm': 'result for crm',
+                       'SEO': 'result for seo', 'ppc': 'result for ppc'}
+    assert batcher.stats()['api_calls_saved'] == 2
+
+    # More seeds than max_size are split, each caller still getting its own result
+    calls.clear()
+    batcher = KeywordBatcher(fetch_batch, window=0.2, max_size=3, max_concurrency=2)
+    keywords = [f"kw{index}" for index in range(7)]
+    futures = [batcher.submit(keyword) for keyword in keywords]
+    assert [future.result(5) for future in futures] == [f"result for {keyword}" for keyword in keywords]
+    assert sorted(len(batch) for batch in calls) == [1, 3, 3]
+    assert batcher.stats()['largest_batch'] == 3
+
+    # A caller already out of time fails at once and costs no request
+    calls.clear()
+    started = time.monotonic()
+    future = batcher.submit('late', deadline=time.monotonic() - 1)
+    assert isinstance(future.exception(0), DeadlineExceeded)
+    assert time.monotonic() - started < 0.1 and calls == []
+    print("✅ Keyword batcher merges, splits and fails fast")
+
+def test_shared_lookup_deadlines():
+    """Test that callers sharing a lookup each wait until their own deadline"""
+    print("\n🧪 Testing deadlines of shared lookups...")
+    import threading
+    import time
+    import keyword_research
+    from deadlines import DeadlineExceeded, deadline_after
+    from keyword_batcher import KeywordBatcher
+    from keyword_result import KeywordResult
+
+    batches = []
+
+    def slow_batch(keywords, deadline):
+        batches.append(deadline)
+        time.sleep(0.3)
+        return {keyword: KeywordResult(keyword, True, 10, 'LOW') for keyword in keywords}
+
+    saved = keyword_research._batcher, keyword_research._store
+    keyword_research._batcher, keyword_research._store = KeywordBatcher(slow_batch, window=0), None
+    keyword_research.get_cache().clear()
+    try:
+        outcomes = {}
+
+        def leader():
+            try:
+                keyword_research.get_keyword_data('villa dubai', deadline_after(0.1))
+            except DeadlineExceeded as e:
+                outcomes['leader'] = e
+        thread = threading.Thread(target=leader)
+        thread.start()
+        while not keyword_research.inflight_stats()['in_flight']:
+            time.sleep(0.01)
+        joined = keyword_research.get_keyword_data('villa dubai', deadline_after(5))
+        thread.join()
+        assert isinstance(outcomes['leader'], DeadlineExceeded)
+        assert joined.avg_monthly_searches == 10 and batches == [None]
+    finally:
+        keyword_research._batcher, keyword_research._store = saved
+        keyword_research.get_cache().clear()
+    print("✅ A long-deadline caller outlives a short-deadline leader")
+
+def test_multi_keyword_parsing():
+    """Test splitting keyword lists and the consolidated comparison reply"""
+    print("\n🧪 Testing multi-keyword requests...")
+    from keyword_result import KeywordResult
+    from slack_handlers import format_comparison, parse_keywords, plan_command
+    from worker_pool import BUSY_MESSAGE
+
+    assert parse_keywords("seo tools, best crm\nSEO  Tools,, ") == ['seo tools', 'best crm']
+    body, action = plan_command({'command': '/keyword-research', 'text': 'a, b', 'channel_id': 'C1'})
+    assert action.keywords == ['a', 'b'] and '2 keywords' in body['text']
+
+    message = format_comparison([
+        ('low', KeywordResult('low', True, 10, 'LOW'), None),
+        ('high', KeywordResult('high', True, 1000, 'HIGH'), None),
+        ('broken', None, Exception("quota")),
+    ])
+    assert message.index('high') < message.index('low') and 'quota' in message
+
+    # The legacy app plans its requests the same way
+    import slack_app
+
+    class Recorder:
+        def __init__(self, accept=True):
+            self.calls = []
+            self.accept = accept
+
+        def submit(self, fn, action, *args, **kwargs):
+            self.calls.append(action)
+            return self.accept or None
+
+        def post(self, **kwargs):
+            self.calls.append(kwargs)
+
+    saved = slack_app.research_pool, slack_app.outbox
+    slack_app.research_pool, slack_app.outbox = Recorder(), Recorder()
+    try:
+        client = slack_app.app.test_client()
+        response = client.post('/slack/command', data={'command': '/keyword-research', 'text': 'a, b',
+                                                       'channel_id': 'C1'})
+        assert '2 keywords' in response.get_json()['text']
+        # The HTTP response is the command's acknowledgement; nothing goes to the channel
+        assert slack_app.outbox.calls == []
+        client.post('/slack/events', json={'type': 'event_callback', 'event_id': 'EvLegacy', 'event': {
+            'type': 'app_mention', 'channel': 'C2', 'text': '<@U123> seo, sem, ppc'}})
+        assert [action.keywords for action in slack_app.research_pool.calls] == [['a', 'b'], ['seo', 'sem', 'ppc']]
+        assert [post['stage'] for post in slack_app.outbox.calls] == ['ack_post']
+
+        # A rejected mention gets the busy reply without a "Researching" message first
+        slack_app.research_pool, slack_app.outbox = Recorder(accept=False), Recorder()
+        client.post('/slack/events', json={'type': 'event_callback', 'event_id': 'EvBusy', 'event': {
+            'type': 'app_mention', 'channel': 'C2', 'text': '<@U123> seo'}})
+        assert [post['text'] for post in slack_app.outbox.calls] == [BUSY_MESSAGE]
+    finally:
+        slack_app.research_pool, slack_app.outbox = saved
+    print("✅ Multi-keyword parsing and comparison work")
+
+def test_slash_command_flow():
+    """Test that slash commands answer ephemerally and reply via response_url"""
+    print("\n🧪 Testing slash command flow...")
+    import slack_app_manifest
+    from slack_handlers import plan_command
+
+    form = {'command': '/keyword-research', 'text': 'seo tools', 'channel_id': 'C1',
+            'response_url': 'https://hooks.slack.com/commands/T1/1/abc', 'trigger_id': 'tr1'}
+    body, action = plan_command(form)
+    assert body['response_type'] == 'ephemeral' and 'seo tools' in body['text']
+    assert action.is_command and action.response_url == form['response_url']
+
+    class Pool:
+        def __init__(self):
+            self.jobs = []
+
+        def submit(self, fn, *args, **kwargs):
+            self.jobs.append((fn, args))
+            return True
+
+    class Outbox:
+        def __init__(self):
+            self.posts, self.responses = [], []
+
+        def post(self, *args, **kwargs):
+            self.posts.append((args, kwargs))
+
+        def respond(self, response_url, text, response_type='ephemeral', **kwargs):
+            self.responses.append((response_url, text, response_type))
+
+    saved = slack_app_manifest.research_pool, slack_app_manifest.outbox, slack_app_manifest.research_reply
+    slack_app_manifest.research_pool, slack_app_manifest.outbox = Pool(), Outbox()
+    slack_app_manifest.research_reply = lambda keywords, deadline: (f"results for {keywords[0]}", 'in_channel')
+    try:
+        response = slack_app_manifest.app.test_client().post('/slack/command', data=form)
+        assert response.get_json() == body
+        # The HTTP response is the only acknowledgement
+        assert slack_app_manifest.outbox.posts == []
+        for fn, args in slack_app_manifest.research_pool.jobs:
+            fn(*args)
+        # The result goes back through the response_url, never to the channel
+        assert slack_app_manifest.outbox.responses == [(form['response_url'], 'results for seo tools', 'in_channel')]
+        assert slack_app_manifest.outbox.posts == []
+    finally:
+        (slack_app_manifest.research_pool, slack_app_manifest.outbox,
+         slack_app_manifest.research_reply) = saved
+    print("✅ Slash commands reply via response_url")
+
+def test_async_app():
+    """Test that the aiohttp app plans and acks events like the Flask app"""
+    print("\n🧪 Testing async app against the Flask app...")
+    import asyncio
+    import uuid
+    from aiohttp.test_utils import TestClient, TestServer
+    import slack_app_async
+    import slack_app_manifest
+
+    run = uuid.uuid4().hex
+    mention = {'type': 'event_callback', 'event_id': f'EvMention{run}', 'event': {
+        'type': 'app_mention', 'channel': 'C1', 'text': '<@U123> seo tools, crm'}}
+    requests = [
+        ({'type': 'url_verification', 'challenge': 'challenge-token'}, {}),
+        (mention, {}),
+        # Slack's retry of the same event is acked without a second action
+        (mention, {'X-Slack-Retry-Num': '1'}),
+    ]
+
+    flask_actions, async_actions = [], []
+    saved = slack_app_manifest.perform, slack_app_async.start
+    slack_app_manifest.perform = lambda action: flask_actions.append(action) or True
+    slack_app_async.start = lambda action: async_actions.append(action) or True
+    try:
+        flask_client = slack_app_manifest.app.test_client()
+        flask_answers = [(response.status_code, response.get_json()) for response in
+                         (flask_client.post('/slack/events', json=body, headers=headers)
+                          for body, headers in requests)]
+
+        async def ask_async_app():
+            async with TestClient(TestServer(slack_app_async.app)) as client:
+                answers = []
+                for body, headers in requests:
+                    response = await client.post('/slack/events', json=body, headers=headers)
+                    answers.append((response.status, await response.json()))
+                return answers
+
+        async_answers = asyncio.run(ask_async_app())
+    finally:
+        slack_app_manifest.perform, slack_app_async.start = saved
+
+    assert async_answers == flask_answers
+    assert async_answers[0] == (200, {'challenge': 'challenge-token'})
+    # url_verification and the retry plan no action; the mention plans research
+    def planned(actions):
+        return [(action.kind, action.channel, action.keywords) if action else None for action in actions]
+    assert planned(async_actions) == planned(flask_actions)
+    assert [action for action in async_actions if action is not None][0].keywords == ['seo tools', 'crm']
+    assert planned(async_actions).count(None) == 2
+    print("✅ Async app plans and acks events like the Flask app")
+
+def test_worker_pool():
+    """Test the research pool's overload policies and queue stats"""
+    print("\n🧪 Testing research worker pool...")
+    import threading
+    import time
+    from worker_pool import WorkerPool
+
+    release = threading.Event()
+    started = threading.Event()
+
+    def block():
+        started.set()
+        release.wait(5)
+
+    # reject: a full queue turns the new job away; the caller replies itself
+    pool = WorkerPool(max_workers=1, queue_size=2, overload_policy='reject', name='test_reject')
+    rejected = []
+    try:
+        assert pool.submit(block) is not None
+        assert started.wait(5)
+        queued = [pool.submit(lambda: None, on_reject=lambda: rejected.append('queued')) for _ in range(2)]
+        assert all(job is not None for job in queued)
+        assert pool.submit(lambda: None, on_reject=lambda: rejected.append('new')) is None
+        stats = pool.stats()
+        assert stats['queue_depth'] == 2 and stats['running'] == 1
+        assert stats['rejected'] == 1 and stats['shed'] == 0 and stats['submitted'] == 3
+        assert rejected == []
+    finally:
+        release.set()
+
+    # shed_oldest: the oldest queued job makes room and hears about it
+    release.clear()
+    started.clear()
+    pool = WorkerPool(max_workers=1, queue_size=2, overload_policy='shed_oldest', name='test_shed')
+    ran, shed = [], []
+    try:
+        pool.submit(block)
+        assert started.wait(5)
+        for name in ('first', 'second', 'third'):
+            job = pool.submit(ran.append, name, on_reject=lambda name=name: shed.append(name))
+            assert job is not None
+        assert shed == ['first']
+        stats = pool.stats()
+        assert stats['queue_depth'] == 2 and stats['shed'] == 1 and stats['rejected'] == 0
+        assert stats['max_queue_depth'] == 2
+    finally:
+        release.set()
+    deadline = time.monotonic() + 5
+    while pool.stats()['completed'] < 3 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert ran == ['second', 'third'] and pool.stats()['queue_depth'] == 0
+    print("✅ Worker pool rejects, sheds and reports its queue")
+
+def test_slack_outbox():
+    """Test per-channel ordering and Retry-After handling in the outbox"""
+    print("\n🧪 Testing Slack outbox...")
+    import threading
+    import time
+    from slack_sdk.errors import SlackApiError
+    from slack_outbox import SlackOutbox
+
+    class Response:
+        status_code = 429
+        headers = {'Retry-After': '0.3'}
+
+    class FakeWebClient:
+        def __init__(self):
+            self.sent = []
+            self.limited = False
+            self.lock = threading.Lock()
+
+        def chat_postMessage(self, channel, text, **kwargs):
+            with self.lock:
+                if channel == 'C1' and not self.limited:
+                    self.limited = True
+                    raise SlackApiError("ratelimited", Response())
+                self.sent.append((channel, text, time.monotonic()))
+
+    client = FakeWebClient()
+    outbox = SlackOutbox(client, workers=2, rate=1000, burst=100, max_attempts=3)
+    started = time.monotonic()
+    for text in ('one', 'two', 'three'):
+        outbox.post(channel='C1', text=text)
+    outbox.post(channel='C2', text='other')
+
+    deadline = time.monotonic() + 5
+    while outbox.stats()['sent'] < 4 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    sent = {channel: [(text, at - started) for c, text, at in client.sent if c == channel]
+            for channel in ('C1', 'C2')}
+    # The 429'd message is retried first, so C1 keeps its order...
+    assert [text for text, _ in sent['C1']] == ['one', 'two', 'three']
+    # ...and only C1 waits out the Retry-After
+    assert all(at >= 0.3 for _, at in sent['C1'])
+    assert sent['C2'][0][1] < 0.2
+    stats = outbox.stats()
+    assert stats['rate_limited'] == 1 and stats['sent'] == 4 and stats['failed'] == 0
+    print("✅ Slack outbox keeps order and delays only the limited channel")
+
+def test_bulk_resume():
+    """Test that bulk runs skip keywords already answered in the output"""
+    print("\n🧪 Testing bulk research resume...")
+    import tempfile
+    from bulk_research import completed_keywords, read_keywords
+
+    assert list(read_keywords(["seo tools\n", "SEO Tools\n", "\n", "crm\n"])) == ['seo tools', 'crm']
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'results.jsonl')
+        with open(path, 'w') as f:
+            f.write('{"keyword":"SEO Tools","result":{},"error":null}\n')
+            f.write('{"keyword":"crm","result":null,"error":"quota"}\n')
+            f.write('{"keyword":"half writ')
+        assert completed_keywords(path, 'jsonl') == {'seo tools'}
+
+        # The shared quota governor gets its own wait limit back afterwards
+        import io
+        from bulk_research import run_bulk
+        from quota_governor import get_governor
+        max_wait = get_governor().max_wait
+        run_bulk(["seo tools\n"], path, 'jsonl', log=io.StringIO())
+        assert get_governor().max_wait == max_wait
+        with open(path) as f:
+            assert f.read().endswith('"error":"quota"}\n')
+
+        # Bulk keywords wait for quota past ADS_CALL_TIMEOUT instead of failing
+        import keyword_research
+        import quota_governor
+        from benchmark_fakes import FakeIdeaService, fake_google_ads, offline_client
+        from quota_governor import QuotaGovernor
+        saved = get_governor(), keyword_research.ADS_CALL_TIMEOUT, keyword_research._store
+        governor = QuotaGovernor(rate=2, burst=1, daily_budget=0, max_wait=0.05)
+        quota_governor.set_governor(governor)
+        keyword_research.ADS_CALL_TIMEOUT, keyword_research._store = 0.1, None
+        try:
+            with fake_google_ads(FakeIdeaService(offline_client(), latency=0, ideas=5)):
+                summary = run_bulk(["bulk one\n", "bulk two\n", "bulk three\n"],
+                                   os.path.join(tmp, 'quota.jsonl'), 'jsonl', workers=1, log=io.StringIO())
+            assert summary['failed'] == 0 and summary['succeeded'] == 3
+            # Two throttled calls, each waiting well past the 0.1s call timeout
+            stats = governor.stats()
+            assert stats['throttled'] == 2 and stats['wait_seconds_total'] > 0.5
+        finally:
+            quota_governor.set_governor(saved[0])
+            keyword_research.ADS_CALL_TIMEOUT, keyword_research._store = saved[1:]
+            keyword_research.get_cache().clear()
+    print("✅ Bulk resume works")
+
+def test_keyword_clusters():
+    """Test grouping near-duplicate keywords and the cluster: prefix"""
+    print("\n🧪 Testing keyword clustering...")
+    from keyword_clusters import cluster_keywords
+    from slack_handlers import plan_command
+
+    clusters = cluster_keywords([
+        ('seo dubai', 900), ('seo services dubai', 300), ('dubai seo services', 200),
+        ('best crm', 500), ('crm best', 50), ('pizza oven', 40),
+    ])
+    heads = {cluster['head']: cluster['size'] for cluster in clusters}
+    assert heads == {'seo dubai': 3, 'best crm': 2, 'pizza oven': 1}
+    assert clusters[0]['total_searches'] == 1400
+
+    body, action = plan_command({'command': '/keyword-research', 'text': 'Cluster: seo, crm', 'channel_id': 'C1'})
+    assert action.kind == 'clusters' and action.keywords == ['seo', 'crm']
+    print(f"✅ Keyword clustering works: {heads}")
+
+def test_keyword_expansion():
+    """Test the depth, keyword and time budgets of the expansion crawl"""
+    print("\n🧪 Testing keyword expansion...")
+    import time
+    import keyword_expansion
+    import keyword_research
+    from benchmark_fakes import FakeIdeaService, fake_google_ads, offline_client
+    from deadlines import deadline_after
+
+    calls = []
+
+    def fake_ideas(keywords, deadline=None, delay=0):
+        calls.append(deadline)
+        time.sleep(delay)
+        for keyword in keywords:
+            # Each seed comes back once more in another case, plus two new ideas
+            yield keyword.upper(), 500, 'LOW'
+            yield f"{keyword} a", 200, 'LOW'
+            yield f"{keyword} b", 100, 'LOW'
+
+    saved = keyword_expansion.iter_keyword_ideas
+    keyword_expansion.iter_keyword_ideas = fake_ideas
+    try:
+        graph, stats = keyword_expansion.expand(["seo"], max_depth=2, max_keywords=100, max_calls=100)
+        assert len(graph) == 7 and stats['stop_reason'] == 'max_depth' and stats['depth_reached'] == 2
+        assert graph.nodes['seo']['depth'] == 0 and graph.nodes['seo']['avg_monthly_searches'] == 500
+        assert graph.nodes['seo a b']['depth'] == 2
+
+        graph, stats = keyword_expansion.expand(["seo", "crm"], max_depth=5, max_keywords=5, batch_size=1)
+        assert len(graph) == 5 and stats['stop_reason'] == 'keyword_budget'
+
+        calls.clear()
+        keyword_expansion.iter_keyword_ideas = lambda keywords, deadline=None: fake_ideas(keywords, deadline, 0.1)
+        deadline = deadline_after(0.05)
+        graph, stats = keyword_expansion.expand(["seo", "crm"], max_depth=5, batch_size=1, deadline=deadline)
+        assert stats['stop_reason'] == 'deadline' and stats['api_calls'] == 1 and calls == [deadline]
+    finally:
+        keyword_expansion.iter_keyword_ideas = saved
+
+    # Without a deadline the request still gets ADS_CALL_TIMEOUT as its timeout
+    class Service(FakeIdeaService):
+        def generate_keyword_ideas(self, request=None, timeout=None, **kwargs):
+            self.timeout = timeout
+            return super().generate_keyword_ideas(request, timeout, **kwargs)
+
+    service = Service(offline_client(), latency=0, ideas=1)
+    with fake_google_ads(service):
+        list(keyword_research.iter_keyword_ideas(["seo"]))
+    assert service.timeout == keyword_research.ADS_CALL_TIMEOUT
+    print(f"✅ Keyword expansion works: {stats}")
+
+def test_monthly_series():
+    """Test year-month indexing of monthly volumes and the trend analytics"""
+    print("\n🧪 Testing monthly series...")
+    from types import SimpleNamespace
+    from monthly_series import MonthlySeries, calendar_month, month_index
+    from series_analytics import analyze
+
+    # MonthOfYearEnum numbers January as 2 and December as 13
+    assert calendar_month(2) == 1 and calendar_month(13) == 12 and calendar_month(1) is None
+    volumes = [SimpleNamespace(year=2024, month=13, monthly_searches=500),
+               SimpleNamespace(year=2025, month=2, monthly_searches=100),
+               SimpleNamespace(year=2025, month=2 + 11, monthly_searches=700)]
+    series = MonthlySeries.from_volumes(volumes)
+    assert series.to_dict() == {'start': '2024-12', 'counts': [500, 100] + [-1] * 10 + [700]}
+    assert MonthlySeries.from_dict(series.to_dict()) == series
+
+    # Two years with a December spike, 50% busier in the second year
+    counts = [(300 if i % 12 == 1 else 100) * (3 if i >= 12 else 2) for i in range(24)]
+    stats = analyze([MonthlySeries(month_index(2023, 11), counts), None])
+    assert abs(stats['yoy_growth'][0] - 0.5) < 1e-9 and stats['peak_month'][0] == 12
+    assert stats['trend_slope'][0] > 0 and stats['months'][1] == 0
+    print("✅ Monthly series and analytics work")
+
+def test_keyword_result():
+    """Test building results from metrics and their store and file encodings"""
+    print("\n🧪 Testing keyword result model...")
+    from types import SimpleNamespace
+    from keyword_result import KeywordResult, decode
+
+    volumes = [SimpleNamespace(year=2025, month=2, monthly_searches=90),
+               SimpleNamespace(year=2025, month=3, monthly_searches=110)]
+    metrics = SimpleNamespace(avg_monthly_searches=100, competition=3, monthly_search_volumes=volumes)
+    result = KeywordResult.from_metrics('seo tools', metrics)
+    assert result.competition == 'MEDIUM' and result.monthly.to_dict() == {'start': '2025-01', 'counts': [90, 110]}
+    assert decode(result.to_row()) == result and KeywordResult.from_dict(result.to_dict()) == result
+
+    related = KeywordResult.related('seo tolls', [('seo tools', 100)])
+    assert not related.exact_match and related.suggestions[0].keyword == 'seo tools'
+    assert decode(related.to_row()) == related
+    # Results written by older versions are plain dictionaries
+    legacy = decode({'keyword': 'crm', 'avg_monthly_searches': 5, 'competition': 'LOW',
+                     'monthly_breakdown': {'Jan': 5}})
+    assert legacy.exact_match and legacy.avg_monthly_searches == 5 and legacy.monthly is None
+    print("✅ Keyword result model works")
+
+def test_metrics():
+    """Test per-thread metric shards, cross-worker files and the text format"""
+    print("\n🧪 Testing metrics...")
+    import json
+    import tempfile
+    import threading
+    from metrics import DEAD_FILE, Metrics, render
+
+    with tempfile.TemporaryDirectory() as tmp:
+        worker = Metrics(directory=tmp)
+        threads = [threading.Thread(target=lambda: [worker.inc('cache_hits') for _ in range(100)])
+                   for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        worker.observe('api_call', 0.003)
+        worker.observe('api_call', 7)
+        worker.gauge('queue_depth', lambda: 2)
+        # A worker that has exited: its counters still count, its gauges do not
+        def exited_worker(started, hits):
+            with open(os.path.join(tmp, f'metrics-999999999-{started}.json'), 'w') as f:
+                json.dump({'pid': 999999999, 'buckets': worker.buckets, 'counters': {'cache_hits': hits},
+                           'histograms': {'api_call': [1] + [0] * len(worker.buckets) + [0.001]},
+                           'gauges': {'queue_depth': 9}}, f)
+        exited_worker(1, 5)
+        totals = worker.collect()
+        assert totals['counters']['cache_hits'] == 405 and totals['gauges'] == {'queue_depth': 2}
+        assert totals['processes'] == 1
+
+        # Once reaped, its file is folded into the dead-worker totals and removed
+        worker.mark_process_dead(999999999)
+        assert sorted(os.listdir(tmp)) == sorted([DEAD_FILE, f'metrics-{os.getpid()}-{worker._started}.json'])
+        assert worker.collect()['counters']['cache_hits'] == 405
+        # A file listed just before its removal is not counted twice
+        exited_worker(1, 5)
+        assert worker.collect()['counters']['cache_hits'] == 405
+        os.remove(os.path.join(tmp, 'metrics-999999999-1.json'))
+
+        # A later worker reusing the pid writes its own file; counters only grow
+        exited_worker(2, 3)
+        assert worker.collect()['counters']['cache_hits'] == 408
+        worker.mark_process_dead(999999999)
+        totals = worker.collect()
+        assert totals['counters']['cache_hits'] == 408 and totals['histograms']['api_call'][0] == 2
+
+        snapshot = worker.snapshot()
+        assert snapshot['counters']['cache_hits'] == 400 and snapshot['gauges'] == {'queue_depth': 2}
+        text = render(snapshot)
+        assert 'keyword_bot_stage_seconds_bucket{stage="api_call",le="0.005"} 1' in text
+        assert 'keyword_bot_stage_seconds_bucket{stage="api_call",le="+Inf"} 2' in text
+        assert 'keyword_bot_cache_hits_total 400' in text and 'keyword_bot_queue_depth 2' in text
+    print("✅ Metrics work")
+
+def test_benchmark_fakes():
+    """Test the fake Google Ads service and fake Slack server used by benchmark.py"""
+    print("\n🧪 Testing benchmark fakes...")
+    from slack_sdk import WebClient
+    from slack_sdk.webhook import WebhookClient
+    import keyword_research
+    from benchmark_fakes import FakeIdeaService, FakeSlackServer, fake_google_ads, offline_client
+
+    service = FakeIdeaService(offline_client(), latency=0, ideas=5)
+    real_service = keyword_research.get_service
+    with fake_google_ads(service):
+        results = keyword_research.fetch_keyword_batch(["Villa Dubai", "gym marina"])
+        assert results["villa dubai"].exact_match and len(results["gym marina"].monthly) == 24
+        ideas = list(keyword_research.iter_keyword_ideas(["villa dubai"]))
+        assert len(ideas) == 6 and "villa dubai" in [idea[0] for idea in ideas]
+    assert keyword_research.get_service is real_service and service.stats() == {'calls': 2, 'failures': 0}
+    failing = FakeIdeaService(offline_client(), latency=0, ideas=0, error_rate=1)
+    try:
+        failing.generate_keyword_ideas(service.client.get_type("GenerateKeywordIdeasRequest"))
+        assert False, "expected a fake outage"
+    except ConnectionError:
+        pass
+
+    slack = FakeSlackServer().start()
+    try:
+        client = WebClient(token="xoxb-test", base_url=slack.api_url)
+        client.chat_postMessage(channel="C1", text="🔍 Researching keyword: *villa*...")
+        assert slack.result_time("C1") is None
+        client.chat_postMessage(channel="C1", text="📊 results")
+        WebhookClient(slack.response_url("C2")).send(text="📊 command results")
+        assert slack.wait_for(["C1", "C2"], timeout=5) == []
+        assert slack.result_time("C2")[1] == "📊 command results"
+    finally:
+        slack.stop()
+    print("✅ Benchmark fakes work")
+
+def test_historical_metrics_mode():
+    """Test mapping historical-metrics rows back to their seeds, and the ideas fallback"""
+    print("\n🧪 Testing historical metrics lookups...")
+    import keyword_research
+    import quota_governor
+    from benchmark_fakes import FakeIdeaService, fake_google_ads, offline_client
+    from keyword_result import raw
+    from quota_governor import QuotaGovernor
+
+    class Service(FakeIdeaService):
+        def generate_keyword_historical_metrics(self, request=None, timeout=None, **kwargs):
+            self.methods.append('historical')
+            response = raw(self.client.get_type("GenerateKeywordHistoricalMetricsResponse"))
+            for text, variants, searches in [("seo service", ["seo services"], 700), ("gym marina", [], 300)]:
+                row = response.results.add()
+                row.text = text
+                row.close_variants.extend(variants)
+                self._fill_metrics(row.keyword_metrics, searches, 24)
+            return response
+
+        def generate_keyword_ideas(self, request=None, timeout=None, **kwargs):
+            self.methods.append('ideas')
+            return super().generate_keyword_ideas(request, timeout, **kwargs)
+
+    service = Service(offline_client(), latency=0, ideas=5)
+    service.methods = []
+    saved = quota_governor.get_governor(), keyword_research.KEYWORD_LOOKUP_MODE
+    quota_governor.set_governor(QuotaGovernor(rate=1000, burst=100, daily_budget=0))
+    try:
+        with fake_google_ads(service):
+            results = keyword_research.fetch_keyword_batch(["SEO Services", "gym marina", "villa dubai"])
+            # A close variant answers its seed; a seed without a row is found among the ideas
+            assert results["seo services"].avg_monthly_searches == 700
+            assert results["gym marina"].avg_monthly_searches == 300 and len(results["gym marina"].monthly) == 24
+            assert results["villa dubai"].exact_match and service.methods == ['historical', 'ideas']
+
+            service.methods.clear()
+            keyword_research.KEYWORD_LOOKUP_MODE = 'ideas'
+            results = keyword_research.fetch_keyword_batch(["gym marina"])
+            assert results["gym marina"].exact_match and service.methods == ['ideas']
+    finally:
+        quota_governor.set_governor(saved[0])
+        keyword_research.KEYWORD_LOOKUP_MODE = saved[1]
+    print("✅ Historical metrics lookups work")
+
+def test_keyword_idea_pages():
+    """Test that every page of keyword ideas is its own governed request"""
+    print("\n🧪 Testing paged keyword ideas...")
+    import keyword_research
+    import quota_governor
+    from benchmark_fakes import FakeIdeaService, fake_google_ads, offline_client
+    from quota_governor import QuotaGovernor
+
+    service = FakeIdeaService(offline_client(), latency=0, ideas=10)
+    governor = QuotaGovernor(rate=1000, burst=100, daily_budget=0)
+    saved = quota_governor.get_governor(), keyword_research.IDEAS_PAGE_SIZE
+    quota_governor.set_governor(governor)
+    keyword_research.IDEAS_PAGE_SIZE = 4
+    try:
+        with fake_google_ads(service):
+            ideas = list(keyword_research.iter_keyword_ideas(["villa dubai"]))
+            assert len(ideas) == 11 and governor.stats()['calls'] == service.stats()['calls'] == 3
+            # Pages past the scan limit are never requested
+            assert len(list(keyword_research.iter_keyword_ideas(["villa dubai"], limit=5))) == 5
+            assert governor.stats()['calls'] == service.stats()['calls'] == 5
+    finally:
+        quota_governor.set_governor(saved[0])
+        keyword_research.IDEAS_PAGE_SIZE = saved[1]
+    print("✅ Every page goes through the quota governor")
+
+def test_keyword_idea_scan():
+    """Test the bounded suggestion heap and the early stop while scanning ideas"""
+    print("\n🧪 Testing keyword idea scanning...")
+    import itertools
+    import keyword_research
+    import quota_governor
+    from benchmark_fakes import offline_client
+    from keyword_result import raw
+    from quota_governor import QuotaGovernor
+
+    top = keyword_research._TopIdeas(3)
+    for text, volume in [('a', 10), ('b', 50), ('c', 30), ('b', 50), ('d', 30), ('e', 5), ('f', 70)]:
+        top.push(text, volume)
+    # Highest volume first; equal volumes keep arrival order
+    assert top.items() == [('f', 70), ('b', 50), ('c', 30)]
+
+    client = offline_client()
+
+    def idea(text, searches):
+        row = raw(client.get_type("GenerateKeywordIdeaResult"))
+        row.text = text
+        row.keyword_idea_metrics.avg_monthly_searches = searches
+        return row
+
+    class Service:
+        def __init__(self, ideas):
+            self.read = 0
+            self.ideas = ideas
+
+        def generate_keyword_ideas(self, request=None, timeout=None):
+            page = type('Page', (), {'next_page_token': ''})()
+            page.results = (self.count(row) for row in self.ideas)
+            return page
+
+        def count(self, row):
+            self.read += 1
+            return row
+
+    endless = lambda: (idea(f"villa idea {i}", i) for i in itertools.count())
+    saved = quota_governor.get_governor(), keyword_research.IDEAS_SCAN_LIMIT
+    quota_governor.set_governor(QuotaGovernor(rate=1000, burst=100, daily_budget=0))
+    try:
+        # The exact match comes after more ideas than suggestions are kept
+        service = Service(itertools.chain((idea(f"villa idea {i}", i) for i in range(50)),
+                                          [idea("Villa Dubai", 900)], endless()))
+        results = keyword_research._fetch_keyword_ideas(client, service, {'villa dubai': 'Villa Dubai'})
+        assert results['villa dubai'].avg_monthly_searches == 900 and service.read == 51
+
+        # Without one, the scan stops at IDEAS_SCAN_LIMIT with the biggest ideas kept
+        keyword_research.IDEAS_SCAN_LIMIT = 20
+        service = Service(endless())
+        results = keyword_research._fetch_keyword_ideas(client, service, {'villa dubai': 'villa dubai'})
+        assert service.read == 20 and not results['villa dubai'].exact_match
+        assert [s.avg_monthly_searches for s in results['villa dubai'].suggestions] == \
+            list(range(19, 19 - keyword_research.SUGGESTION_COUNT, -1))
+    finally:
+        quota_governor.set_governor(saved[0])
+        keyword_research.IDEAS_SCAN_LIMIT = saved[1]
+    print("✅ Idea scanning keeps the top ideas and stops early")
+
+def test_replay_stream():
+    """Test anonymizing captured payloads and addressing replies to the fake Slack"""
+    print("\n🧪 Testing replay streams...")
+    from replay import addressed, anonymize, kind_of, synthesize
+
+    captured = [
+        {'ts': 1700000010.5, 'path': '/slack/events', 'body': {
+            'token': 'secret', 'team_id': 'T123', 'event_id': 'Ev1',
+            'event': {'type': 'app_mention', 'user': 'U42', 'channel': 'C9', 'text': '<@U0BOT> villa dubai'}}},
+        {'ts': 1700000012.0, 'path': '/slack/command', 'body': {
+            'token': 'secret', 'command': '/keyword-research', 'text': 'gym marina', 'user_id': 'U42',
+            'channel_id': 'C9', 'response_url': 'https://hooks.slack.com/commands/T123/1/abc'}},
+    ]
+    stream = list(anonymize(captured, salt='test'))
+    assert [item['offset'] for item in stream] == [0.0, 1.5]
+    mention, command = stream[0]['body'], stream[1]['body']
+    assert 'token' not in mention and 'response_url' not in command
+    assert mention['event']['user'] == command['user_id'] != 'U42'
+    assert mention['event']['text'].endswith('> villa dubai') and 'U0BOT' not in mention['event']['text']
+    assert [kind_of(item) for item in stream] == ['mention', 'slash']
+
+    body = addressed(stream[0], 'R0000001', 'http://127.0.0.1:9000/response/R0000001')
+    assert body['event']['channel'] == 'R0000001' and body['event_id'] == 'Ev1-R0000001'
+    assert stream[0]['body']['event']['channel'] != 'R0000001'
+    body = addressed(stream[1], 'R0000002', 'http://127.0.0.1:9000/response/R0000002')
+    assert body['channel_id'] == 'R0000002' and body['response_url'].endswith('/R0000002')
+
+    synthetic = list(synthesize(50, rate=10, mix={'slash': 1, 'dm': 1}, vocabulary_size=20, zipf=1.1, seed=3))
+    offsets = [item['offset'] for item in synthetic]
+    assert offsets == sorted(offsets) and {kind_of(item) for item in synthetic} == {'slash', 'dm'}
+    print("✅ Replay streams work")
+
+def test_request_profiler():
+    """Test the --profile flag, sampled profiles and slow-job stack samples"""
+    print("\n🧪 Testing request profiler...")
+    import pstats
+    import tempfile
+    import threading
+    import time
+    import request_profiler
+    from slack_handlers import plan_command, split_profile_flag
+
+    assert split_profile_flag("villa dubai --profile") == (True, "villa dubai")
+    assert split_profile_flag("--profile-free homes") == (False, "--profile-free homes")
+    _, action = plan_command({'command': '/keyword-research', 'text': '--profile villa dubai',
+                              'channel_id': 'C1', 'trigger_id': '123.456.abc'})
+    assert action.profile and action.request_id == '123.456.abc' and action.keywords == ['villa dubai']
+    _, action = plan_command({'command': '/keyword-research', 'text': 'villa dubai', 'channel_id': 'C1'})
+    assert not action.profile and len(action.request_id) == 12
+
+    saved = request_profiler.PROFILE_DIR, request_profiler.PROFILE_SLOW_SECONDS
+    with tempfile.TemporaryDirectory() as tmp:
+        request_profiler.PROFILE_DIR = tmp
+        try:
+            release = threading.Event()
+            helper = threading.Thread(target=release.wait, name="batcher-helper")
+            helper.start()
+            with request_profiler.profiled('Ev1', 'app_mention', requested=True):
+                sum(i * i for i in range(200000))
+                time.sleep(0.05)
+            release.set()
+            helper.join()
+            names = sorted(os.listdir(tmp))
+            assert [name.rsplit('.', 1)[1] for name in names] == ['folded', 'prof']
+            assert all('_app_mention_Ev1.' in name for name in names)
+            pstats.Stats(os.path.join(tmp, names[1]))
+            with open(os.path.join(tmp, names[0])) as f:
+                assert any(line.startswith("batcher-helper;") for line in f)
+
+            request_profiler.PROFILE_SLOW_SECONDS = 0.05
+            with request_profiler.profiled('fast', 'slash_command'):
+                pass
+            with request_profiler.profiled('slow', 'slash_command'):
+                time.sleep(0.2)
+            slow = [name for name in os.listdir(tmp) if '_slow.' in name or 'fast' in name]
+            assert slow and all(name.endswith('_slash_command_slow.folded') for name in slow)
+        finally:
+            request_profiler.PROFILE_DIR, request_profiler.PROFILE_SLOW_SECONDS = saved
+    print("✅ Request profiler works")
+
+def test_lazy_google_ads_import():
+    """Test that the apps start without importing google-ads"""
+    print("\n🧪 Testing lazy google-ads import...")
+    
+    import subprocess
+    import sys
+    code = ("import sys, slack_app_manifest; "
+            "print(any(name.startswith('google.ads') for name in sys.modules))")
+    env = dict(os.environ, SLACK_BOT_TOKEN='xoxb-test', KEYWORD_STORE_PATH='', EVENT_DEDUPE_PATH='',
+               METRICS_DIR='', ADS_WARMUP='off')
+    output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, env=env,
+                            cwd=os.path.dirname(os.path.abspath(__file__)))
+    assert output.returncode == 0, output.stderr
+    assert output.stdout.strip().splitlines()[-1] == 'False'
+
+    # Preloading imports the pinned API version's service module
+    import ads_client
+    from config import GOOGLE_ADS_API_VERSION
+    ads_client.import_google_ads()
+    assert f"google.ads.googleads.{GOOGLE_ADS_API_VERSION}.services.services.keyword_plan_idea_service" in sys.modules
+    print("✅ Apps start without google-ads")
+
+def test_ads_client_pool():
+    """Test token expiry caching and the client rebuild after a fork"""
+    print("\n🧪 Testing Google Ads client pool...")
+    import datetime
+    from google.ads.googleads.client import GoogleAdsClient
+    from ads_client import AdsClientPool
+
+    class Credentials:
+        def __init__(self):
+            self.token = 'token'
+            self.expiry = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None) + datetime.timedelta(hours=1)
+            self.refreshes = 0
+
+        def refresh(self, request):
+            self.refreshes += 1
+            self.token = f'token{self.refreshes}'
+            self.expiry = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None) + datetime.timedelta(hours=1)
+
+    class FakeClient:
+        def __init__(self):
+            self.credentials = Credentials()
+
+        def get_service(self, name):
+            return object()
+
+    built = []
+
+    def load_from_dict(config, version=None):
+        built.append(FakeClient())
+        return built[-1]
+
+    saved = GoogleAdsClient.__dict__['load_from_dict']
+    GoogleAdsClient.load_from_dict = load_from_dict
+    try:
+        pool = AdsClientPool(config={})
+        service = pool.get_service()
+        # Within the token's lifetime the expiry is not even looked at
+        built[0].credentials.token = None
+        assert pool.get_service() is service and pool.get_service() is service
+        assert built[0].credentials.refreshes == 0 and pool.stats()['token_reuses'] == 3
+
+        # Once the refresh margin is reached, the next call refreshes
+        pool._token_fresh_until = 0.0
+        pool.get_service()
+        assert built[0].credentials.refreshes == 1
+
+        # A new pid (a forked gunicorn worker) gets its own client and channel
+        pool._pid = -1
+        forked = pool.get_service()
+        assert forked is not service and len(built) == 2
+        assert pool.stats()['clients_built'] == 2 and pool.stats()['channels_built'] == 2
+        assert pool.get_service() is forked
+    finally:
+        GoogleAdsClient.load_from_dict = saved
+    print("✅ Google Ads client pool caches token checks and rebuilds after fork")
+
 def test_environment_setup():
     """Test environment setup"""
     print("\n🧪 Testing environment setup...")
@@ -89,6 +1230,33 @@ def main():
     
     test_environment_setup()
     test_slack_app_imports()
+    test_keyword_cache()
+    test_singleflight()
+    test_event_dedupe()
+    test_keyword_store()
+    test_quota_governor()
+    test_circuit_breaker()
+    test_keyword_batcher()
+    test_shared_lookup_deadlines()
+    test_multi_keyword_parsing()
+    test_slash_command_flow()
+    test_async_app()
+    test_worker_pool()
+    test_slack_outbox()
+    test_bulk_resume()
+    test_keyword_clusters()
+    test_keyword_expansion()
+    test_monthly_series()
+    test_keyword_result()
+    test_metrics()
+    test_benchmark_fakes()
+    test_historical_metrics_mode()
+    test_keyword_idea_pages()
+    test_keyword_idea_scan()
+    test_replay_stream()
+    test_request_profiler()
+    test_lazy_google_ads_import()
+    test_ads_client_pool()
     test_keyword_research()
     
     print("\n" + "=" * 50)
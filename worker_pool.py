@@ -0,0 +1,193 @@
+"""
+Bounded worker pool for keyword research jobs
+A fixed number of worker threads drain a bounded queue. When the queue is
+full the pool either rejects the new job (``submit`` returns None) or sheds
+the oldest queued one and calls that job's ``on_reject`` callback.
+"""
+
+import itertools
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+import metrics
+from config import RESEARCH_OVERLOAD_POLICY, RESEARCH_QUEUE_SIZE, RESEARCH_WORKERS
+
+logger = logging.getLogger(__name__)
+
+OVERLOAD_POLICIES = ("reject", "shed_oldest")
+
+BUSY_MESSAGE = "🚦 I'm handling a lot of keyword requests right now. Please try again in a minute."
+
+
+class Job:
+    """A queued unit of work plus its timing"""
+
+    __slots__ = ('job_id', 'name', 'fn', 'args', 'on_reject', 'enqueued_at',
+                 'queue_depth', 'started_at', 'finished_at')
+
+    def __init__(self, job_id, name, fn, args, on_reject):
+        self.job_id = job_id
+        self.name = name
+        self.fn = fn
+        self.args = args
+        self.on_reject = on_reject
+        self.enqueued_at = time.monotonic()
+        self.queue_depth = 0
+        self.started_at = None
+        self.finished_at = None
+
+    @property
+    def wait_time(self):
+        return (self.started_at or time.monotonic()) - self.enqueued_at
+
+    @property
+    def run_time(self):
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.monotonic()) - self.started_at
+
+
+class WorkerPool:
+    """Fixed-size thread pool with a bounded queue and an overload policy"""
+
+    def __init__(self, max_workers=RESEARCH_WORKERS, queue_size=RESEARCH_QUEUE_SIZE,
+                 overload_policy=RESEARCH_OVERLOAD_POLICY, name="research"):
+        if overload_policy not in OVERLOAD_POLICIES:
+            raise ValueError(f"Unknown overload policy {overload_policy!r}; expected one of {OVERLOAD_POLICIES}")
+        self.max_workers = max_workers
+        self.queue_size = queue_size
+        self.overload_policy = overload_policy
+        self.name = name
+        self._cond = threading.Condition()
+        self._queue = deque()
+        self._ids = itertools.count(1)
+        self._pid = None
+        self._running = 0
+        self._stats = {
+            'submitted': 0,
+            'completed': 0,
+            'failed': 0,
+            'rejected': 0,
+            'shed': 0,
+            'max_queue_depth': 0,
+            'wait_seconds_total': 0.0,
+            'wait_seconds_max': 0.0,
+            'run_seconds_total': 0.0,
+            'run_seconds_max': 0.0,
+        }
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def submit(self, fn, *args, on_reject=None, name=None):
+        """Queue ``fn(*args)``; returns the Job, or None if it was rejected
+
+        ``on_reject`` is called if the job is later shed from the queue.
+        """
+        job = Job(next(self._ids), name or getattr(fn, '__name__', 'job'), fn, args, on_reject)
+        shed = None
+        with self._cond:
+            self._ensure_started()
+            full = len(self._queue) >= self.queue_size
+            if full and self.overload_policy == "reject":
+                self._stats['rejected'] += 1
+                metrics.inc(f"{self.name}_jobs_rejected")
+                depth = len(self._queue)
+            else:
+                if full:
+                    shed = self._queue.popleft()
+                    self._stats['shed'] += 1
+                    metrics.inc(f"{self.name}_jobs_shed")
+                job.queue_depth = len(self._queue)
+                self._queue.append(job)
+                self._stats['submitted'] += 1
+                self._stats['max_queue_depth'] = max(self._stats['max_queue_depth'], len(self._queue))
+                self._cond.notify()
+
+        if full and shed is None:
+            logger.warning(f"{self.name} pool full ({depth} queued); rejecting job {job.job_id} ({job.name})")
+            return None
+        if shed is not None:
+            logger.warning(f"{self.name} pool full; shedding oldest job {shed.job_id} ({shed.name}) after {shed.wait_time:.2f}s")
+            self._notify_rejected(shed)
+        return job
+
+    def _notify_rejected(self, job):
+        if job.on_reject is None:
+            return
+        try:
+            job.on_reject()
+        except Exception as e:
+            logger.error(f"Error notifying rejected job {job.job_id}: {str(e)}")
+
+    def _ensure_started(self):
+        """Start the worker threads in this process (again, after a fork)"""
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        self._pid = pid
+        for index in range(self.max_workers):
+            threading.Thread(target=self._work, name=f"{self.name}-worker-{index}", daemon=True).start()
+
+    def _after_fork(self):
+        """Jobs queued in the parent belong to the parent; start clean"""
+        self._cond = threading.Condition()
+        self._queue = deque()
+        self._running = 0
+
+    def _work(self):
+        while True:
+            with self._cond:
+                while not self._queue:
+                    self._cond.wait()
+                job = self._queue.popleft()
+                self._running += 1
+            job.started_at = time.monotonic()
+            metrics.observe('queue_wait', job.wait_time)
+            failed = False
+            try:
+                job.fn(*job.args)
+            except Exception as e:
+                failed = True
+                logger.error(f"Job {job.job_id} ({job.name}) failed: {str(e)}")
+            finally:
+                job.finished_at = time.monotonic()
+                self._record(job, failed)
+
+    def _record(self, job, failed):
+        wait, run = job.wait_time, job.run_time
+        logger.info(f"Job {job.job_id} ({job.name}): queue depth {job.queue_depth}, "
+                    f"waited {wait:.3f}s, ran {run:.3f}s")
+        with self._cond:
+            self._running -= 1
+            self._stats['failed' if failed else 'completed'] += 1
+            self._stats['wait_seconds_total'] += wait
+            self._stats['wait_seconds_max'] = max(self._stats['wait_seconds_max'], wait)
+            self._stats['run_seconds_total'] += run
+            self._stats['run_seconds_max'] = max(self._stats['run_seconds_max'], run)
+
+    def stats(self):
+        """Return queue depth, wait time and run time counters"""
+        with self._cond:
+            stats = dict(self._stats)
+            stats['queue_depth'] = len(self._queue)
+            stats['running'] = self._running
+        stats['max_workers'] = self.max_workers
+        stats['queue_size'] = self.queue_size
+        stats['overload_policy'] = self.overload_policy
+        return stats
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_research_pool():
+    """Return the process-wide research worker pool"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = WorkerPool()
+        return _pool